@@ -5,6 +5,10 @@
 # - Se adjunta el estado de Gemini a 'app.gemini_is_ready'.
 # - [NUEVO] Se establece explícitamente 'app.secret_key' para asegurar
 #   que las sesiones Flask funcionen correctamente.
+# - [NUEVO] Se precargan los modelos Gemini del enrutador ('model_registry').
+# - [NUEVO] Se carga el catálogo al arrancar para construir el índice del FAQ.
+# - [NUEVO] Se monta la ruta asíncrona del chat ('async_chat') en 'app.asgi_app'
+#   (servir con un servidor ASGI, ver asgi.py). None si está deshabilitada.
 
 import os
 import google.generativeai as genai
@@ -65,5 +69,30 @@ def create_app():
         from . import routes
         print("✅ Rutas (routes.py) conectadas a la aplicación.")
 
-    # 7. Devolver la aplicación configurada
+        # 6b. Precargar los modelos Gemini (una vez por proceso)
+        if app.gemini_is_ready:
+            try:
+                from app.ai_logica import warm_models
+                warm_models()
+            except Exception as e:
+                print(f"⚠️ No se pudieron precargar los modelos Gemini: {e}")
+
+        # 6c. Índice BM25 del FAQ con los productos del catálogo
+        if app.config['FAQ_ENABLED']:
+            try:
+                from app.ai_logica import warm_faq_index
+                warm_faq_index()
+            except Exception as e:
+                print(f"⚠️ No se pudo precargar el índice del FAQ: {e}")
+
+    # 7. Ruta asíncrona del chat (ASGI) junto a la app Flask
+    app.asgi_app = None
+    if app.config['ASYNC_CHAT_ENABLED']:
+        try:
+            from app.async_chat import build_asgi_app
+            app.asgi_app = build_asgi_app(app)
+        except Exception as e:
+            print(f"⚠️ No se pudo montar la ruta asíncrona del chat: {e}")
+
+    # 8. Devolver la aplicación configurada
     return app
\ No newline at end of file
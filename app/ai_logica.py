@@ -5,15 +5,60 @@
 # 10. 'navigate_to_section' ahora devuelve la acción 'navigate_and_filter'
 #     cuando se detecta una categoría, incluyendo el nombre de la categoría.
 # 11. Se actualizó el system_prompt para reflejar este cambio.
+# - [NUEVO] 'get_ai_intent' clasifica primero con un clasificador local
+#   ('intent_classifier': reglas + modelo lineal) y solo consulta a Gemini si la
+#   confianza es baja. La respuesta del chat indica el camino ('intent_path').
+# - [NUEVO] Camino rápido: los comandos de navegación y carrito se reconocen con
+#   'command_matcher' y ejecutan la herramienta directamente (sin LLM ni red).
+# - [NUEVO] Los GenerativeModel se construyen una vez por proceso en
+#   'model_registry' (precargados en create_app con 'warm_models').
+# - [NUEVO] 'handle_chat_stream' (POST /api/chat/stream): respuesta por
+#   Server-Sent Events con tokens de Gemini (stream=True) o del LLM local
+#   (modo chunked) y eventos tipados para las acciones de herramientas.
+# - [NUEVO] Se ejecutan TODAS las llamadas a herramientas de un turno de Gemini,
+#   en paralelo (pool acotado, con timeout), y se devuelven en 'actions'.
+# - [NUEVO] 'handle_chat_request' usa 'hedged_router': clasifica y responde en
+#   paralelo, cubre al LLM local lento con Gemini y reporta camino y tiempos.
+# - [NUEVO] El LLM local se llama con 'local_llm_client' (keep-alive, métricas de
+#   salud y circuit breaker con sonda en segundo plano).
+# - [NUEVO] Caché de respuestas de preguntas frecuentes ('response_cache'): las
+#   'simple_question' repetidas (o parafraseadas) no vuelven a llamar a ningún LLM.
+#   Solo se consulta si el clasificador local confirma antes la intención.
+# - [NUEVO] 'faq_retriever' (BM25 sobre un FAQ curado + descripción/ingredientes
+#   del catálogo) responde las preguntas simples sin LLM cuando está seguro; si
+#   no, se sigue con el LLM local.
+# - [NUEVO] El historial vive en el servidor ('conversation_store', por
+#   'conversation_id'): el cliente envía solo el mensaje nuevo, el modelo recibe
+#   lo que cabe en un presupuesto de tokens y los turnos viejos se resumen una vez.
+#   Si el ID no existe en este worker se parte de la ventana corta de historial
+#   que envía el cliente y la respuesta lo indica ('conversation_reset').
+# - [NUEVO] Control de admisión por backend ('llm_gates'): concurrencia acotada
+#   hacia Gemini y el LLM local, cola con plazo y rechazo 429 con Retry-After.
+# - [NUEVO] Plazo total por petición ('deadline', CHAT_DEADLINE): el enrutador,
+#   las colas, el LLM local, Gemini y las herramientas usan solo lo que queda; al
+#   agotarse se responde con 'degraded_answer' en lugar de llegar al timeout del proxy.
+#   /api/chat/stream abre el mismo plazo dentro del generador SSE (que corre
+#   después de devolver la respuesta).
 
 import json
 import requests
-from flask import jsonify, current_app 
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import jsonify, current_app, Response, stream_with_context
 import google.generativeai as genai
 from google.api_core import exceptions as api_exceptions
 
 from app.config import Config
-from app.db_logic import get_product_info, list_products_by_category
+from app.db_logic import catalog, get_product_info, list_products_by_category
+from app.intent_classifier import IntentClassifier
+from app.command_matcher import CommandMatcher
+from app.model_registry import ModelRegistry
+from app.hedged_router import HedgedRouter, is_success
+from app.resilience import AdmissionGate, CircuitOpenError, LatencyTracker, OverloadedError
+from app.local_llm_client import get_local_llm_client, httpx
+from app.response_cache import ResponseCache
+from app.faq_retriever import FAQ_ENTRIES, FAQRetriever, load_faq_file
+from app.conversation_store import ConversationStore, SQLiteConversationBackend
+from app.deadline import Deadline, DeadlineExceeded, deadline_scope, stage_timeout, submit_in_context
 
 # ======================================================
 # 1. FUNCIONES HELPER (JSON)
@@ -28,14 +73,19 @@ def fail(message, code=400):
 # 2. DEFINICIÓN DE HERRAMIENTAS DE IA (NO-DB)
 # ======================================================
 
+# Secciones principales de la página
+VALID_SECTIONS = ["inicio", "productos", "sobre-nosotros", "contacto"]
+
+# Lista de categorías válidas (debe coincidir con los data-category de los botones HTML)
+VALID_CATEGORIES = ["jabones", "serums", "shampoos", "acondicionadores", "cremas", "aceites", "todos"]
+
 # --- [MODIFICADO] ---
 def navigate_to_section(section: str) -> str:
     """Navega a una sección O navega y filtra por categoría."""
-    valid_sections = ["inicio", "productos", "sobre-nosotros", "contacto"]
+    valid_sections = VALID_SECTIONS
     target_id_section = section.lower().replace(' ', '-')
     
-    # Lista de categorías válidas (debe coincidir con los data-category de los botones HTML)
-    valid_categories = ["jabones", "serums", "shampoos", "acondicionadores", "cremas", "aceites", "todos"] 
+    valid_categories = VALID_CATEGORIES
     target_id_category = section.lower().strip() # Usamos el nombre limpio para la categoría
     
     # Primero, verifica si es una sección principal
@@ -97,147 +147,667 @@ tool_config = [
 # 4. LÓGICA DEL ENRUTADOR DE IA
 # ======================================================
 
-def call_local_llm(prompt: str) -> dict:
-    # ... (sin cambios) ...
-    print(f"[AI Router] Delegando a LLM Local (FAQ)...")
+# Modelos Gemini construidos una vez por proceso (se reconstruyen si cambia la API key o el modelo)
+model_registry = ModelRegistry(lambda: (Config.GEMINI_API_KEY, Config.GEMINI_MODEL))
+
+# Control de admisión: llamadas simultáneas por backend y cola de espera con plazo
+llm_gates = {
+    'gemini': AdmissionGate('gemini', Config.GEMINI_MAX_CONCURRENT, Config.GEMINI_MAX_QUEUE,
+                            Config.GEMINI_QUEUE_TIMEOUT),
+    'local_llm': AdmissionGate('local_llm', Config.LOCAL_LLM_MAX_CONCURRENT, Config.LOCAL_LLM_MAX_QUEUE,
+                               Config.LOCAL_LLM_QUEUE_TIMEOUT),
+}
+
+def overloaded_response(error: OverloadedError) -> dict:
+    """Respuesta del chat cuando un backend rechaza la llamada por saturación."""
+    print(f"⚠️ {error}")
+    return {"success": False, "response": "Estoy atendiendo muchas consultas. Inténtalo de nuevo en unos segundos.",
+            "retry_after": error.retry_after}
+
+def gemini_request_options(stage: str):
+    """Timeout de una llamada a Gemini: lo que queda del plazo de la petición (sin plazo, el del SDK)."""
+    timeout = stage_timeout(None, stage)
+    return {'timeout': timeout} if timeout is not None else None
+
+CLASSIFIER_SYSTEM_PROMPT = (
+    "Eres un clasificador de intenciones de e-commerce. Tu única tarea es decidir si el prompt del usuario es una 'simple_question' o una 'complex_action'. "
+    "Responde ÚNICAMENTE con una palabra: 'simple_question' o 'complex_action'. "
+    "simple_question: Preguntas generales, FAQs, saludos, 'qué es', 'quién eres', 'información de la empresa', 'cómo se usa'. "
+    "complex_action: Pedidos, comandos, 'quiero', 'agregar', 'comprar', 'muéstrame', 'llévame a', 'cuánto cuesta', 'tienes stock', 'ver carrito', 'qué productos tienes', 'lista los jabones'." 
+)
+
+TOOLS_SYSTEM_PROMPT = (
+    "Eres herbIA, el asistente virtual experto en productos naturales de Bo's Beauty. "
+    "Tu rol es recomendar productos y ejecutar ACCIONES usando las herramientas disponibles. "
+    "HERRAMIENTAS DISPONIBLES:\n"
+    "- navigate_to_section: Navega a secciones (inicio, productos, sobre-nosotros, contacto) O filtra por categoría (jabones, serums, etc.).\n"
+    "- manipulate_cart: Maneja el carrito (show, clear, add).\n"
+    "- get_product_info: Consulta stock/precio de UN producto específico.\n"
+    "- list_products_by_category: Lista productos de una categoría o 'todos'.\n"
+    "INSTRUCCIONES:\n"
+    "- Si piden ir a una SECCIÓN PRINCIPAL (ej: 'llévame a contacto'), usa navigate_to_section con esa sección.\n"
+    "- Si piden ver una CATEGORÍA (ej: 'muéstrame los aceites'), usa navigate_to_section con esa categoría (la herramienta devolverá action='navigate_and_filter').\n"
+    "- Si preguntan por stock/precio de ALGO ESPECÍFICO, usa get_product_info.\n"
+    "- Si preguntan QUÉ PRODUCTOS TIENES o similar, usa list_products_by_category con categoría 'todos'. Si piden 'lista los jabones', usa list_products_by_category con 'jabones'.\n"
+    "- Sé conciso, amable y profesional."
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Resumes conversaciones entre un cliente y herbIA, el asistente de la tienda Bo's Beauty. "
+    "Escribe un resumen breve en español (máximo 4 frases) que conserve los productos mencionados, "
+    "las preferencias y datos que dio el cliente y lo que quedó pendiente. Sin saludos ni comentarios."
+)
+
+def warm_models():
+    """Precarga (en create_app) los modelos que usa el enrutador."""
+    model_registry.warm([
+        (Config.GEMINI_MODEL, CLASSIFIER_SYSTEM_PROMPT, None),
+        (Config.GEMINI_MODEL, TOOLS_SYSTEM_PROMPT, tool_config),
+        (Config.GEMINI_MODEL, SUMMARY_SYSTEM_PROMPT, None),
+    ])
+
+# Clasificador local de intención (se entrena una vez al importar el módulo)
+intent_classifier = IntentClassifier()
+
+# Gramática de comandos que no necesitan LLM (navegación y carrito)
+command_matcher = CommandMatcher(VALID_SECTIONS, [c for c in VALID_CATEGORIES if c != 'todos'])
+
+def tool_result_to_response(result_json_str: str) -> dict:
+    """Convierte el JSON que devuelve una herramienta en la respuesta del chat."""
+    result_data = json.loads(result_json_str)
+    return {
+        "success": True, 
+        "action": result_data.get("action"),
+        "target": result_data.get("target"),
+        "product_name": result_data.get("product_name"),
+        "category": result_data.get("category"),
+        "response": result_data.get("message")
+    }
+
+# Pool acotado para ejecutar en paralelo las herramientas de un mismo turno
+tool_executor = ThreadPoolExecutor(max_workers=Config.TOOL_MAX_WORKERS, thread_name_prefix='tool')
+
+def _run_tool(tool, deadline, function_args):
+    """
+    Ejecuta una herramienta con su propio plazo: sus llamadas a Supabase usan
+    'stage_timeout', así que la I/O termina a tiempo aunque nadie espere el resultado.
+    """
+    with deadline_scope(deadline):
+        return tool(**function_args)
+
+def run_tool_calls(function_calls: list) -> list:
+    """
+    Ejecuta [(nombre, args), ...] en paralelo y devuelve las respuestas en el mismo
+    orden. Una herramienta que falla o supera TOOL_TIMEOUT (o el plazo de la
+    petición) se reporta como 'error' sin afectar al resto. Un hilo en curso no se
+    puede interrumpir: lo que acota su trabajo es el plazo con el que corre.
+    """
     try:
-        response = requests.post(Config.LOCAL_LLM_URL, json={'prompt': prompt}, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if not data.get('response'): raise Exception("Respuesta vacía.")
-        return {"success": True, "response": data.get('response')}
-    except requests.exceptions.ConnectionError:
-        print(f"❌ ERROR: No se pudo conectar al LLM Local en {Config.LOCAL_LLM_URL}.")
-        return {"success": False, "response": "Error de conexión local."}
-    except requests.exceptions.Timeout:
+        timeout, expired = stage_timeout(Config.TOOL_TIMEOUT, 'tools'), False
+    except DeadlineExceeded:
+        timeout, expired = 0, True  # Plazo agotado: no se lanza ninguna
+    futures = []
+    tool_deadline = Deadline(timeout)  # Compartido: el tiempo en la cola del pool también cuenta
+    for function_name, function_args in function_calls:
+        if function_name in tools and not expired:
+            futures.append(submit_in_context(tool_executor, _run_tool, tools[function_name], tool_deadline,
+                                             function_args))
+        else:
+            futures.append(None)
+    done, _ = wait([f for f in futures if f is not None], timeout=timeout)
+
+    results = []
+    for (function_name, function_args), future in zip(function_calls, futures):
+        if future is None and expired and function_name in tools:
+            print(f"⚠️ Plazo agotado antes de la herramienta {function_name}({function_args})")
+            message = "La consulta tardó demasiado. Inténtalo de nuevo en un momento."
+        elif future is None:
+            message = f"Herramienta desconocida: {function_name}."
+        elif future not in done:
+            future.cancel()  # Solo evita que arranque si seguía en cola
+            print(f"⚠️ Timeout en herramienta {function_name}({function_args}): su resultado se descarta")
+            message = "La consulta tardó demasiado. Inténtalo de nuevo en un momento."
+        else:
+            try:
+                results.append(tool_result_to_response(future.result()))
+                continue
+            except Exception as e:
+                print(f"❌ Error en herramienta {function_name}: {e}")
+                message = "Tuve un problema al ejecutar la acción."
+        results.append({"success": True, "action": "error", "target": None, "product_name": None,
+                        "category": None, "response": message})
+    return results
+
+def merge_tool_responses(results: list, text: str = '') -> dict:
+    """
+    Une varias respuestas de herramientas en una sola: los campos de la primera
+    acción quedan arriba (compatibilidad) y todas van en 'actions'.
+    """
+    merged = dict(results[0])
+    messages = [text] if text else []
+    messages += [r['response'] for r in results if r.get('response')]
+    merged['response'] = "\n".join(messages)
+    merged['actions'] = results
+    return merged
+
+def try_fast_command(prompt: str):
+    """Ejecuta directamente la herramienta si el mensaje es un comando conocido; si no, None."""
+    command = command_matcher.match(prompt)
+    if command is None:
+        return None
+    function_name, function_args = command
+    print(f"[AI Router] Camino rápido: {function_name}({function_args})")
+    return tool_result_to_response(tools[function_name](**function_args))
+
+# Errores de transporte del LLM local: 'requests' (ruta síncrona) y 'httpx' (ruta ASGI)
+LOCAL_LLM_TIMEOUT_ERRORS = (requests.exceptions.Timeout,) + ((httpx.TimeoutException,) if httpx else ())
+LOCAL_LLM_CONNECTION_ERRORS = (requests.exceptions.ConnectionError,) + ((httpx.TransportError,) if httpx else ())
+
+def local_llm_error_response(error: Exception) -> dict:
+    """Respuesta del chat para un fallo del LLM local (la comparten 'call_local_llm' y 'acall_local_llm')."""
+    if isinstance(error, OverloadedError):
+        return overloaded_response(error)
+    if isinstance(error, DeadlineExceeded):
+        print(f"⚠️ {error}")
+        return {"success": False, "response": "Asistente local tardó."}
+    if isinstance(error, CircuitOpenError):
+        print(f"⚠️ LLM Local no disponible: {error}")
+        return {"success": False, "response": "Asistente local no disponible."}
+    if isinstance(error, LOCAL_LLM_TIMEOUT_ERRORS):
         print(f"❌ ERROR: Timeout al conectar con LLM Local en {Config.LOCAL_LLM_URL}.")
         return {"success": False, "response": "Asistente local tardó."}
+    if isinstance(error, LOCAL_LLM_CONNECTION_ERRORS):
+        print(f"❌ ERROR: No se pudo conectar al LLM Local en {Config.LOCAL_LLM_URL}.")
+        return {"success": False, "response": "Error de conexión local."}
+    print(f"❌ ERROR: Fallo en LLM Local: {error}")
+    return {"success": False, "response": f"Error local: {error}"}
+
+def call_local_llm(prompt: str) -> dict:
+    """Pregunta al LLM local (FAQ). Si su circuito está abierto, falla al instante."""
+    print(f"[AI Router] Delegando a LLM Local (FAQ)...")
+    try:
+        with llm_gates['local_llm'].admit(timeout=stage_timeout(Config.LOCAL_LLM_QUEUE_TIMEOUT, 'local_llm')):
+            timeout = stage_timeout(Config.LOCAL_LLM_TIMEOUT, 'local_llm')
+            return {"success": True, "response": get_local_llm_client().generate(prompt, timeout=timeout)}
     except Exception as e:
-        print(f"❌ ERROR: Fallo en LLM Local: {e}")
-        return {"success": False, "response": f"Error local: {e}"}
+        return local_llm_error_response(e)
+
 
+def classify_intent_with_gemini(user_prompt: str) -> str:
+    """Clasificación con Gemini (solo se usa cuando el clasificador local duda)."""
+    model = model_registry.get(Config.GEMINI_MODEL, CLASSIFIER_SYSTEM_PROMPT)
+    with llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'gemini_classify')):
+        response = model.generate_content(user_prompt, generation_config=genai.GenerationConfig(temperature=0.0),
+                                          request_options=gemini_request_options('gemini_classify'))
+    intent = response.text.strip().lower()
+    return "simple_question" if "simple_question" in intent else "complex_action"
+
+
+def get_ai_intent(user_prompt: str) -> tuple:
+    """
+    Decide entre 'simple_question' y 'complex_action'.
+    Devuelve (intención, camino): 'rules' / 'model' (local), 'gemini' (escalado)
+    o 'model_low_confidence' (local dudoso y Gemini no disponible, con error o
+    sin tiempo dentro del plazo de la petición).
+    """
+    intent, confidence, path = intent_classifier.classify(user_prompt)
+    print(f"[AI Router] Clasificador local: {intent} (confianza {confidence:.2f}, {path}) para: '{user_prompt}'")
+    if confidence >= Config.INTENT_CONFIDENCE_THRESHOLD:
+        return intent, path
 
-def get_ai_intent(user_prompt: str) -> str:
-    # ... (sin cambios) ...
     if not current_app.gemini_is_ready:
-        print("Advertencia: Gemini no inicializado, clasificando como 'complex_action'.")
-        return "complex_action"
-    print(f"[AI Router] Clasificando intención para: '{user_prompt}'")
+        print("Advertencia: Gemini no inicializado, se usa la clasificación local.")
+        return intent, "model_low_confidence"
     try:
-        # ... (prompt clasificador sin cambios) ...
-        system_prompt_classifier = (
-            "Eres un clasificador de intenciones de e-commerce. Tu única tarea es decidir si el prompt del usuario es una 'simple_question' o una 'complex_action'. "
-            "Responde ÚNICAMENTE con una palabra: 'simple_question' o 'complex_action'. "
-            "simple_question: Preguntas generales, FAQs, saludos, 'qué es', 'quién eres', 'información de la empresa', 'cómo se usa'. "
-            "complex_action: Pedidos, comandos, 'quiero', 'agregar', 'comprar', 'muéstrame', 'llévame a', 'cuánto cuesta', 'tienes stock', 'ver carrito', 'qué productos tienes', 'lista los jabones'." 
-        )
-        model = genai.GenerativeModel("gemini-2.5-flash", system_instruction=system_prompt_classifier)
-        response = model.generate_content(user_prompt, generation_config=genai.GenerationConfig(temperature=0.0))
-        intent = response.text.strip().lower()
-        if "simple_question" in intent:
-            print("[AI Router] Intención detectada: simple_question")
-            return "simple_question"
-        else:
-            print("[AI Router] Intención detectada: complex_action")
-            return "complex_action"
+        intent = classify_intent_with_gemini(user_prompt)
+        print(f"[AI Router] Intención detectada (Gemini): {intent}")
+        return intent, "gemini"
     except Exception as e:
-        print(f"Error en get_ai_intent: {e}. Asumiendo 'complex_action'.")
-        return "complex_action"
+        print(f"Error en get_ai_intent: {e}. Se usa la clasificación local.")
+        return intent, "model_low_confidence"
 
 
+def build_gemini_contents(prompt: str, history_raw: list) -> list:
+    """Historial del chat (ya recortado por 'conversation_store') + prompt, en el formato de Gemini."""
+    contents = []
+    for msg in history_raw:
+        if 'text' in msg:
+            contents.append({"role": "user" if msg['sender'] == 'user' else "model", "parts": [msg['text']]})
+    contents.append({"role": "user", "parts": [prompt]})
+    return contents
+
+
+def gemini_function_calls(response):
+    """
+    Llamadas a herramientas de una respuesta de Gemini: ([(nombre, args), ...], texto
+    que las acompaña). Lista vacía si la respuesta es solo texto.
+    """
+    if not (response.candidates and response.candidates[0].content.parts):
+        return [], ''
+    parts = response.candidates[0].content.parts
+    function_calls = [(part.function_call.name, dict(part.function_call.args))
+                      for part in parts if part.function_call]
+    if not function_calls:
+        return [], ''
+    text = "".join(part.text for part in parts if not part.function_call and part.text).strip()
+    print(f"[AI Router] {len(function_calls)} llamada(s) a herramientas: {[name for name, _ in function_calls]}")
+    return function_calls, text
+
+def gemini_text_response(response) -> dict:
+    """Respuesta del chat para una respuesta de Gemini sin llamadas a herramientas."""
+    if response.text:
+        return {"success": True, "response": response.text}
+    print(f"🚨 ADVERTENCIA GEMINI: Respuesta vacía. Razón: {response.prompt_feedback}")
+    return {"success": True, "response": "No pude generar una respuesta."}
+
+def gemini_error_response(error: Exception, where: str) -> tuple:
+    """(respuesta, código HTTP) para un fallo al llamar a Gemini (rutas síncrona, ASGI y SSE)."""
+    if isinstance(error, OverloadedError):
+        return overloaded_response(error), 429
+    if isinstance(error, (DeadlineExceeded, api_exceptions.DeadlineExceeded)):
+        print(f"⚠️ Gemini sin tiempo dentro del plazo de la petición: {error}")
+        return {"success": False, "response": "La consulta tardó demasiado."}, 504
+    if isinstance(error, api_exceptions.PermissionDenied):
+        print(f"🚨 ERROR FATAL GEMINI: Permiso denegado: {error}")
+        return {"success": False, "response": "Error de autenticación API Key."}, 403
+    if isinstance(error, api_exceptions.GoogleAPIError):
+        print(f"🚨 ERROR FATAL GEMINI: API Error: {error}")
+        return {"success": False, "response": f"Error API Google: {error}"}, 500
+    print(f"🚨 ERROR (NO-GEMINI) en {where}: {error}")
+    return {"success": False, "response": "Error interno del servidor."}, 500
+
 def call_gemini_with_tools(prompt: str, history_raw: list) -> dict:
     """Llama a Gemini con el set completo de herramientas (Cloud LLM)."""
     print(f"[AI Router] Delegando a Gemini (Acción Compleja)...")
     try:
-        # --- [MODIFICADO] ---
-        # Actualizamos las instrucciones del prompt del sistema
-        system_prompt = (
-            "Eres herbIA, el asistente virtual experto en productos naturales de Bo's Beauty. "
-            "Tu rol es recomendar productos y ejecutar ACCIONES usando las herramientas disponibles. "
-            "HERRAMIENTAS DISPONIBLES:\n"
-            "- navigate_to_section: Navega a secciones (inicio, productos, sobre-nosotros, contacto) O filtra por categoría (jabones, serums, etc.).\n" # <-- Cambio aquí
-            "- manipulate_cart: Maneja el carrito (show, clear, add).\n"
-            "- get_product_info: Consulta stock/precio de UN producto específico.\n"
-            "- list_products_by_category: Lista productos de una categoría o 'todos'.\n"
-            "INSTRUCCIONES:\n"
-            "- Si piden ir a una SECCIÓN PRINCIPAL (ej: 'llévame a contacto'), usa navigate_to_section con esa sección.\n" # <-- Cambio aquí
-            "- Si piden ver una CATEGORÍA (ej: 'muéstrame los aceites'), usa navigate_to_section con esa categoría (la herramienta devolverá action='navigate_and_filter').\n" # <-- Cambio aquí
-            "- Si preguntan por stock/precio de ALGO ESPECÍFICO, usa get_product_info.\n"
-            "- Si preguntan QUÉ PRODUCTOS TIENES o similar, usa list_products_by_category con categoría 'todos'. Si piden 'lista los jabones', usa list_products_by_category con 'jabones'.\n"
-            "- Sé conciso, amable y profesional."
-        )
-
-        contents = []
-        for msg in history_raw[-10:]:
-            if 'text' in msg:
-                contents.append({"role": "user" if msg['sender'] == 'user' else "model", "parts": [msg['text']]})
-        contents.append({"role": "user", "parts": [prompt]})
+        contents = build_gemini_contents(prompt, history_raw)
+        model = model_registry.get(Config.GEMINI_MODEL, TOOLS_SYSTEM_PROMPT, tool_config)
+        with llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'gemini')):
+            response = model.generate_content(contents, generation_config=genai.GenerationConfig(temperature=0.3),
+                                              request_options=gemini_request_options('gemini'))
         
-        model = genai.GenerativeModel("gemini-2.5-flash", system_instruction=system_prompt, tools=tool_config)
-        response = model.generate_content(contents, generation_config=genai.GenerationConfig(temperature=0.3))
-        
-        # Procesar llamada a herramienta
-        if response.candidates and response.candidates[0].content.parts:
-            part = response.candidates[0].content.parts[0]
-            if part.function_call:
-                tool_call = part.function_call
-                function_name = tool_call.name
-                function_args = dict(tool_call.args)
-                
-                if function_name in tools:
-                    result_json_str = tools[function_name](**function_args)
-                    result_data = json.loads(result_json_str)
-                    
-                    # --- [MODIFICADO] ---
-                    # Asegurarse de devolver la nueva propiedad 'category' si existe
-                    return {
-                        "success": True, 
-                        "action": result_data.get("action"),
-                        "target": result_data.get("target"),
-                        "product_name": result_data.get("product_name"),
-                        "category": result_data.get("category"), # <-- NUEVO
-                        "response": result_data.get("message")
-                    }
-
-        # Procesar respuesta de texto simple
-        if response.text:
-            return {"success": True, "response": response.text}
-        else:
-            print(f"🚨 ADVERTENCIA GEMINI: Respuesta vacía. Razón: {response.prompt_feedback}")
-            return {"success": True, "response": "No pude generar una respuesta."}
-
-    except api_exceptions.PermissionDenied as e:
-        print(f"🚨 ERROR FATAL GEMINI: Permiso denegado: {e}")
-        return {"success": False, "response": "Error de autenticación API Key."}, 403
-    except api_exceptions.GoogleAPIError as e:
-        print(f"🚨 ERROR FATAL GEMINI: API Error: {e}")
-        return {"success": False, "response": f"Error API Google: {e}"}, 500
+        # Procesar llamadas a herramientas (todas las del turno, en paralelo)
+        function_calls, text = gemini_function_calls(response)
+        if function_calls:
+            return merge_tool_responses(run_tool_calls(function_calls), text)
+        return gemini_text_response(response)
     except Exception as e:
-        print(f"🚨 ERROR (NO-GEMINI) en call_gemini_with_tools: {e}")
-        return {"success": False, "response": "Error interno del servidor."}, 500
+        return gemini_error_response(e, 'call_gemini_with_tools')
 
 # ======================================================
 # 5. FUNCIÓN PRINCIPAL DE MANEJO (Handler)
 # ======================================================
 
+# Enrutador concurrente: LLM local con cobertura (hedge) a Gemini
+# FAQ curado + catálogo en un índice BM25 (el catálogo se mantiene por listener)
+faq_retriever = FAQRetriever(FAQ_ENTRIES + load_faq_file(Config.FAQ_PATH), threshold=Config.FAQ_CONFIDENCE_THRESHOLD)
+catalog.subscribe(faq_retriever.on_catalog_change)
+
+def warm_faq_index():
+    """Carga el catálogo para que sus productos entren en el índice del FAQ."""
+    catalog.get_products()
+    print("✅ Índice FAQ (BM25) listo.")
+
+def answer_from_faq(prompt: str):
+    """Respuesta del FAQ si la recuperación está segura; None para seguir con el LLM local."""
+    if not Config.FAQ_ENABLED:
+        return None
+    try:
+        catalog.get_products()  # Asegura que los productos estén indexados
+    except Exception as e:
+        print(f"⚠️ FAQ sin catálogo (solo entradas curadas): {e}")
+    match = faq_retriever.answer(prompt)
+    if match is None:
+        return None
+    print(f"[AI Router] Respuesta del FAQ: {match['id']} (confianza {match['confidence']:.2f})")
+    return {"success": True, "response": match['response'],
+            "faq": {'id': match['id'], 'confidence': match['confidence']}}
+
+# Con el plazo agotado se acepta un pasaje del FAQ menos seguro que el habitual
+DEGRADED_FAQ_THRESHOLD = 0.3
+
+def degraded_answer(prompt: str, intent: str) -> dict:
+    """
+    Respuesta cuando se agota el plazo de la petición: el pasaje del FAQ más
+    cercano (preguntas simples) o un aviso para reintentar. Nunca se cachea.
+    """
+    match = None
+    if intent == 'simple_question' and Config.FAQ_ENABLED:
+        match = faq_retriever.answer(prompt, threshold=DEGRADED_FAQ_THRESHOLD)
+    if match is not None:
+        return {"success": True, "degraded": True,
+                "response": f"No pude completar la respuesta a tiempo, pero esto puede ayudarte: {match['response']}"}
+    return {"success": True, "degraded": True,
+            "response": "Estoy tardando más de lo normal en responder. ¿Puedes intentarlo de nuevo en unos segundos?"}
+
+local_llm_latency = LatencyTracker(window=200)
+chat_router = HedgedRouter(
+    classify_local=intent_classifier.classify,
+    classify_remote=classify_intent_with_gemini,
+    answer_local=call_local_llm,
+    answer_remote=call_gemini_with_tools,
+    latency_tracker=local_llm_latency,
+    confidence_threshold=Config.INTENT_CONFIDENCE_THRESHOLD,
+    hedge_percentile=Config.ROUTER_HEDGE_PERCENTILE,
+    hedge_default=Config.ROUTER_HEDGE_DEFAULT,
+    hedge_min=Config.ROUTER_HEDGE_MIN,
+    hedge_max=Config.ROUTER_HEDGE_MAX,
+    max_workers=Config.ROUTER_MAX_WORKERS,
+    answer_instant=answer_from_faq,
+    answer_degraded=degraded_answer,
+)
+
+# Respuestas a preguntas frecuentes ya contestadas (LRU + TTL + similitud)
+faq_cache = ResponseCache(
+    max_entries=Config.CHAT_CACHE_SIZE,
+    ttl=Config.CHAT_CACHE_TTL,
+    similarity=Config.CHAT_CACHE_SIMILARITY,
+    history_window=Config.CHAT_CACHE_HISTORY_WINDOW,
+)
+
+def cacheable_answer(result):
+    """Solo se guardan respuestas de texto exitosas (sin acciones que ejecutar en el cliente)."""
+    if (not is_success(result) or result.get('degraded') or result.get('action') or result.get('actions')
+            or not result.get('response')):
+        return None
+    return {'success': True, 'response': result['response']}
+
+def cached_answer(prompt: str, history_raw: list) -> tuple:
+    """
+    (respuesta, 'exact'|'similar') de la caché o (None, None). La intención se
+    comprueba antes con el clasificador local (sin I/O): si duda o dice
+    'complex_action' no se consulta, para no contestar con texto una acción.
+    """
+    intent, confidence, _ = intent_classifier.classify(prompt)
+    if intent != 'simple_question' or confidence < Config.INTENT_CONFIDENCE_THRESHOLD:
+        return None, None
+    return faq_cache.get(prompt, history_raw, intent=intent)
+
+# ======================================================
+# 5b. HISTORIAL EN EL SERVIDOR (conversaciones)
+# ======================================================
+
+def summarize_conversation(previous_summary: str, messages: list) -> str:
+    """
+    Resume los turnos que ya no caben en el presupuesto, sobre el resumen previo.
+    Usa Gemini si está configurado; si no (o si falla), un resumen extractivo acotado.
+    """
+    transcript = "\n".join(f"{'Cliente' if m['sender'] == 'user' else 'herbIA'}: {m['text']}" for m in messages)
+    if Config.GEMINI_API_KEY:
+        try:
+            model = model_registry.get(Config.GEMINI_MODEL, SUMMARY_SYSTEM_PROMPT)
+            request_text = (f"Resumen previo: {previous_summary}\n\n" if previous_summary else "") + \
+                           f"Nuevos turnos:\n{transcript}"
+            # Plazo propio: el resumidor es un solo hilo y una llamada colgada frenaría a los demás
+            with deadline_scope(Deadline(Config.CONVERSATION_SUMMARY_TIMEOUT)):
+                with llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'summary')):
+                    response = model.generate_content(request_text,
+                                                      generation_config=genai.GenerationConfig(temperature=0.0),
+                                                      request_options=gemini_request_options('summary'))
+            if response.text.strip():
+                return response.text.strip()
+        except Exception as e:
+            print(f"⚠️ No se pudo resumir con Gemini, se usa el resumen extractivo: {e}")
+    # Extractivo: solo lo que pidió el cliente, acotado a CONVERSATION_SUMMARY_CHARS
+    asked = "; ".join(m['text'] for m in messages if m['sender'] == 'user')
+    summary = f"{previous_summary} El cliente preguntó: {asked}." if previous_summary else f"El cliente preguntó: {asked}."
+    limit = Config.CONVERSATION_SUMMARY_CHARS
+    return summary if len(summary) <= limit else "…" + summary[-(limit - 1):]
+
+conversation_store = ConversationStore(
+    max_conversations=Config.CONVERSATION_MAX,
+    token_budget=Config.CONVERSATION_TOKEN_BUDGET,
+    backend=(SQLiteConversationBackend(Config.CONVERSATION_DB_PATH, ttl=Config.CONVERSATION_TTL)
+             if Config.CONVERSATION_DB_PATH else None),
+    summarize=summarize_conversation,
+)
+
+# Los resúmenes se generan fuera de la petición (un hilo basta)
+conversation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='conversation')
+
+def open_conversation(data: dict) -> tuple:
+    """
+    Devuelve (conversation_id, historial para el modelo, reiniciada) a partir del
+    cuerpo de la petición. Si el ID no existe en este proceso se parte del
+    historial que envía el cliente y 'reiniciada' es True.
+    """
+    conversation_id, reset = conversation_store.open(data.get('conversation_id'), seed_history=data.get('history'))
+    if reset:
+        print("⚠️ [Chat] Conversación desconocida en este worker; se usa el historial del cliente.")
+    return conversation_id, conversation_store.history(conversation_id), reset
+
+def _compact_conversation(conversation_id: str):
+    try:
+        if conversation_store.compact(conversation_id):
+            print(f"[Chat] Conversación {conversation_id[:8]} resumida.")
+    except Exception as e:
+        print(f"⚠️ Error al resumir la conversación {conversation_id[:8]}: {e}")
+
+def record_turn(conversation_id: str, prompt: str, response_text: str):
+    """Guarda el turno (pregunta + respuesta) y, si ya no cabe, programa el resumen."""
+    conversation_store.append(conversation_id, 'user', prompt)
+    conversation_store.append(conversation_id, 'bot', response_text or '')
+    if conversation_store.needs_compaction(conversation_id):
+        conversation_executor.submit(_compact_conversation, conversation_id)
+
+def shortcut_response(prompt: str, history_raw: list):
+    """
+    Respuesta sin enrutador, ya con 'intent' / 'intent_path': comando de navegación
+    o carrito (sin clasificador ni LLM) o pregunta frecuente ya contestada. None si no hay.
+    """
+    result = try_fast_command(prompt)
+    if result is not None:
+        result.update({'intent': 'complex_action', 'intent_path': 'fast_path'})
+        return result
+    # Pregunta frecuente ya contestada (intención confirmada en local): sin LLM
+    cached, match = cached_answer(prompt, history_raw)
+    if cached is not None:
+        print(f"[AI Router] Caché de respuestas ({match}) para: '{prompt}'")
+        cached.update({'intent': 'simple_question', 'intent_path': 'cache',
+                       'routing': {'path': 'cache', 'match': match}})
+    return cached
+
+def settle_deadline(prompt: str, result, routing: dict, deadline: Deadline):
+    """Tras enrutar: si el plazo se agotó sin respuesta válida, la degradada; anota el plazo sobrante."""
+    if not is_success(result) and deadline.expired():
+        routing['deadline_exceeded'] = True
+        result = degraded_answer(prompt, routing['intent'])
+    routing['budget_left_ms'] = round(deadline.remaining() * 1000, 1)
+    return result
+
+def routed_response(prompt: str, history_raw: list, result, routing: dict) -> tuple:
+    """
+    (cuerpo, código, cabeceras) de una respuesta enrutada: la cachea si es una
+    pregunta simple y traduce el código del backend (429 con Retry-After).
+    """
+    answer = cacheable_answer(result) if routing['intent'] == 'simple_question' else None
+    if answer is not None:
+        faq_cache.put(prompt, history_raw, answer, intent=routing['intent'])
+    code = 500
+    if isinstance(result, tuple):
+        result, code = result
+    if not result.get('success') and result.get('retry_after'):
+        code = 429
+    result.update({'intent': routing['intent'], 'intent_path': routing['intent_path'], 'routing': routing})
+    if result.get('success'):
+        return result, 200, {}
+    headers = {'Retry-After': str(result['retry_after'])} if code == 429 else {}
+    return result, code, headers
+
 def handle_chat_request(request):
-    # ... (sin cambios en esta función - el fallback sigue igual) ...
     if not current_app.gemini_is_ready and not Config.LOCAL_LLM_URL:
         return fail("Asistente IA no configurado.", 500)
     try:
         data = request.json
         prompt = data.get('prompt', '').strip()
-        history_raw = data.get('history', [])
         if not prompt: return fail("Prompt vacío.", 400)
-        intent = get_ai_intent(prompt)
-        if intent == 'simple_question':
-            result = call_local_llm(prompt)
-            if not result.get('success'):
-                print("⚠️ Fallback a Gemini Cloud...")
-                result = call_gemini_with_tools(prompt, history_raw)
-        else:
-            result = call_gemini_with_tools(prompt, history_raw)
-        return jsonify(result) if result.get('success') else (jsonify(result), 500)
+        conversation_id, history_raw, reset = open_conversation(data)
+        conversation = {'conversation_id': conversation_id, 'conversation_reset': reset}
+        result = shortcut_response(prompt, history_raw)
+        if result is not None:
+            record_turn(conversation_id, prompt, result.get('response'))
+            result.update(conversation)
+            return jsonify(result)
+        # Plazo total de la petición: cada etapa (y cada herramienta) usa lo que queda
+        with deadline_scope(Deadline(Config.CHAT_DEADLINE)) as deadline:
+            result, routing = chat_router.route(prompt, history_raw, remote_ready=current_app.gemini_is_ready,
+                                                deadline=deadline)
+            result = settle_deadline(prompt, result, routing, deadline)
+        print(f"[AI Router] Camino: {routing['path']} ({routing['intent_path']}), tiempos: {routing['timings_ms']}")
+        body, code, headers = routed_response(prompt, history_raw, result, routing)
+        if code == 200:
+            record_turn(conversation_id, prompt, body.get('response'))
+        body.update(conversation)
+        return jsonify(body), code, headers
     except Exception as e:
         print(f"🚨 ERROR FATAL en handle_chat_request: {e}")
-        return fail("Error crítico en enrutador chat.", 500)
\ No newline at end of file
+        return fail("Error crítico en enrutador chat.", 500)
+
+# ======================================================
+# 6. STREAMING (Server-Sent Events)
+# ======================================================
+
+def sse_event(event: str, data: dict) -> str:
+    """Formatea un evento SSE con datos JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_local_llm(prompt: str):
+    """Genera los fragmentos de texto del LLM local (ver LocalLLMClient.stream)."""
+    print("[AI Router] Delegando a LLM Local (FAQ, streaming)...")
+    with llm_gates['local_llm'].admit(timeout=stage_timeout(Config.LOCAL_LLM_QUEUE_TIMEOUT, 'local_llm')):
+        timeout = stage_timeout(Config.LOCAL_LLM_TIMEOUT, 'local_llm')
+        yield from get_local_llm_client().stream(prompt, timeout=timeout)
+
+
+def stream_gemini_with_tools(prompt: str, history_raw: list):
+    """
+    Genera ('token', texto) y ('action', respuesta) a partir de la respuesta de
+    Gemini en streaming. Las llamadas a herramientas se ejecutan al recibirlas.
+    """
+    print("[AI Router] Delegando a Gemini (Acción Compleja, streaming)...")
+    model = model_registry.get(Config.GEMINI_MODEL, TOOLS_SYSTEM_PROMPT, tool_config)
+    # El hueco se ocupa mientras dura el stream (la conexión sigue abierta)
+    with llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'gemini')):
+        response = model.generate_content(build_gemini_contents(prompt, history_raw), stream=True,
+                                          generation_config=genai.GenerationConfig(temperature=0.3),
+                                          request_options=gemini_request_options('gemini'))
+        for chunk in response:
+            if not chunk.candidates or not chunk.candidates[0].content.parts:
+                continue
+            parts = chunk.candidates[0].content.parts
+            for part in parts:
+                if not part.function_call and part.text:
+                    yield 'token', part.text
+            function_calls = [(part.function_call.name, dict(part.function_call.args))
+                              for part in parts if part.function_call]
+            if function_calls:
+                for result in run_tool_calls(function_calls):
+                    yield 'action', result
+
+
+def handle_chat_stream(request):
+    """
+    POST /api/chat/stream: mismo enrutado que /api/chat pero respondiendo por SSE.
+    Eventos: 'meta' (intención, camino, 'conversation_id' y 'conversation_reset'), 'token' (texto),
+    'action' (misma forma que la respuesta de /api/chat), 'error' y 'done' (texto completo).
+    """
+    if not current_app.gemini_is_ready and not Config.LOCAL_LLM_URL:
+        return fail("Asistente IA no configurado.", 500)
+    data = request.get_json(silent=True) or {}
+    prompt = data.get('prompt', '').strip()
+    if not prompt: return fail("Prompt vacío.", 400)
+    conversation_id, history_raw, reset = open_conversation(data)
+
+    def meta(intent, intent_path):
+        return sse_event('meta', {'intent': intent, 'intent_path': intent_path, 'conversation_id': conversation_id,
+                                  'conversation_reset': reset})
+
+    def done(result):
+        record_turn(conversation_id, prompt, result.get('response'))
+        return sse_event('done', result)
+
+    def events():
+        text_parts = []
+        intent = None
+        try:
+            fast_result = try_fast_command(prompt)
+            if fast_result is not None:
+                yield meta('complex_action', 'fast_path')
+                yield sse_event('action', fast_result)
+                yield done({'success': True, 'response': fast_result.get('response')})
+                return
+
+            cached, match = cached_answer(prompt, history_raw)
+            if cached is not None:
+                yield meta('simple_question', 'cache')
+                yield sse_event('token', {'text': cached['response']})
+                yield done(cached)
+                return
+
+            intent, intent_path = get_ai_intent(prompt)
+            yield meta(intent, intent_path)
+
+            faq_result = answer_from_faq(prompt) if intent == 'simple_question' else None
+            if faq_result is not None:
+                yield sse_event('token', {'text': faq_result['response']})
+                yield done(faq_result)
+                return
+
+            if intent == 'simple_question':
+                try:
+                    for piece in stream_local_llm(prompt):
+                        text_parts.append(piece)
+                        yield sse_event('token', {'text': piece})
+                except Exception as e:
+                    print(f"❌ ERROR: Fallo en LLM Local (streaming): {e}")
+                    if text_parts:
+                        # Ya se envió parte de la respuesta: se cierra con lo que hay
+                        raise
+                    print("⚠️ Fallback a Gemini Cloud...")
+                    intent = 'complex_action'
+                else:
+                    answer = cacheable_answer({'success': True, 'response': ''.join(text_parts)})
+                    if answer is not None:
+                        faq_cache.put(prompt, history_raw, answer, intent=intent)
+
+            if intent == 'complex_action':
+                for kind, payload in stream_gemini_with_tools(prompt, history_raw):
+                    if kind == 'token':
+                        text_parts.append(payload)
+                        yield sse_event('token', {'text': payload})
+                    else:
+                        yield sse_event('action', payload)
+
+            yield done({'success': True, 'response': ''.join(text_parts)})
+        except (DeadlineExceeded, api_exceptions.DeadlineExceeded) as e:
+            print(f"⚠️ Plazo de la petición agotado (streaming): {e}")
+            if text_parts:
+                yield sse_event('error', {'success': False, 'response': "La respuesta tardó demasiado."})
+            else:
+                result = degraded_answer(prompt, intent)
+                yield sse_event('token', {'text': result['response']})
+                yield done(result)
+        except Exception as e:
+            # Mismo mensaje que /api/chat (saturación, permisos, API de Google o error interno)
+            yield sse_event('error', gemini_error_response(e, 'handle_chat_stream')[0])
+
+    def generate():
+        # El generador corre después de devolver la Response: el plazo se abre aquí dentro
+        with deadline_scope(Deadline(Config.CHAT_DEADLINE)):
+            yield from events()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+
+def handle_chat_cache_delete(request):
+    """
+    DELETE /api/chat/cache: invalida la caché de respuestas. Con {"prompt": ...}
+    (y opcionalmente "history") borra solo esa pregunta; sin cuerpo, todas.
+    """
+    data = request.get_json(silent=True) or {}
+    prompt = (data.get('prompt') or '').strip()
+    removed = faq_cache.invalidate(prompt or None, data.get('history', []))
+    print(f"🧹 Caché de respuestas: {removed} entradas invalidadas.")
+    return jsonify({'success': True, 'removed': removed, 'stats': faq_cache.stats()})
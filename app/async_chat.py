@@ -0,0 +1,289 @@
+# /home/genichurro/Documentos/v2/IA/app/async_chat.py
+# --- RESPONSABILIDAD ---
+# 1. Versión asyncio de POST /api/chat: mientras espera a Gemini o al LLM local
+#    la petición no ocupa un hilo, así que un proceso puede tener miles de
+#    conversaciones en vuelo (el límite pasa a ser el de los backends).
+# 2. Backends asíncronos: LLM local con httpx ('LocalLLMClient.agenerate') y
+#    Gemini con 'generate_content_async'; enrutado con 'AsyncHedgedRouter' y
+#    control de admisión con 'AsyncAdmissionGate'.
+# 3. 'ChatASGIApp': app ASGI que atiende /api/chat con asyncio y pasa el resto
+#    de rutas a la app Flask (WsgiToAsgi). 'create_app' la deja en 'app.asgi_app'.
+# --- NOTA ---
+# Reutiliza la lógica de 'ai_logica' (caché, FAQ, conversaciones, respuesta
+# degradada...). Las herramientas (catálogo en memoria, Supabase) siguen siendo
+# síncronas: se ejecutan en un hilo con 'asyncio.to_thread' (con el plazo de la
+# petición). Requiere 'httpx' y 'asgiref'; sin ellos solo se sirve WSGI.
+
+import asyncio
+import json
+
+import google.generativeai as genai
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie
+
+from app.config import Config
+from app.ai_logica import (CLASSIFIER_SYSTEM_PROMPT, TOOLS_SYSTEM_PROMPT, answer_from_faq, build_gemini_contents,
+                           degraded_answer, gemini_error_response, gemini_function_calls, gemini_request_options,
+                           gemini_text_response, intent_classifier, local_llm_error_response, local_llm_latency,
+                           merge_tool_responses, model_registry, open_conversation, record_turn, routed_response,
+                           run_tool_calls, settle_deadline, shortcut_response, tool_config)
+from app.deadline import Deadline, deadline_scope, stage_timeout
+from app.hedged_router import AsyncHedgedRouter
+from app.local_llm_client import get_local_llm_client, httpx
+from app.rate_limiter import client_key_for, get_rate_limiter
+from app.resilience import AsyncAdmissionGate
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # asgiref es opcional (sin él no se monta la ruta ASGI)
+    WsgiToAsgi = None
+
+# Ruta que se atiende con asyncio (el resto va a Flask)
+ASYNC_CHAT_PATH = '/api/chat'
+# Tamaño máximo del cuerpo de una petición del chat
+MAX_CHAT_BODY = 256 * 1024
+
+# Control de admisión propio de la ruta asíncrona: más llamadas a Gemini en vuelo
+# (no ocupan hilos); el LLM local mantiene su capacidad real.
+async_llm_gates = {
+    'gemini': AsyncAdmissionGate('gemini_async', Config.ASYNC_GEMINI_MAX_CONCURRENT, Config.ASYNC_MAX_QUEUE,
+                                 Config.GEMINI_QUEUE_TIMEOUT),
+    'local_llm': AsyncAdmissionGate('local_llm_async', Config.LOCAL_LLM_MAX_CONCURRENT, Config.ASYNC_MAX_QUEUE,
+                                    Config.LOCAL_LLM_QUEUE_TIMEOUT),
+}
+
+# ======================================================
+# 1. BACKENDS ASÍNCRONOS
+# ======================================================
+
+async def acall_local_llm(prompt: str) -> dict:
+    """Versión asyncio de 'ai_logica.call_local_llm'."""
+    print("[AI Router] Delegando a LLM Local (FAQ, async)...")
+    try:
+        async with async_llm_gates['local_llm'].admit(timeout=stage_timeout(Config.LOCAL_LLM_QUEUE_TIMEOUT, 'local_llm')):
+            timeout = stage_timeout(Config.LOCAL_LLM_TIMEOUT, 'local_llm')
+            return {"success": True, "response": await get_local_llm_client().agenerate(prompt, timeout=timeout)}
+    except Exception as e:
+        return local_llm_error_response(e)
+
+
+async def aclassify_intent_with_gemini(user_prompt: str) -> str:
+    """Versión asyncio de 'ai_logica.classify_intent_with_gemini'."""
+    model = model_registry.get(Config.GEMINI_MODEL, CLASSIFIER_SYSTEM_PROMPT)
+    async with async_llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'gemini_classify')):
+        response = await model.generate_content_async(
+            user_prompt, generation_config=genai.GenerationConfig(temperature=0.0),
+            request_options=gemini_request_options('gemini_classify'))
+    intent = response.text.strip().lower()
+    return "simple_question" if "simple_question" in intent else "complex_action"
+
+
+async def acall_gemini_with_tools(prompt: str, history_raw: list) -> dict:
+    """Versión asyncio de 'ai_logica.call_gemini_with_tools' (herramientas en un hilo)."""
+    print("[AI Router] Delegando a Gemini (Acción Compleja, async)...")
+    try:
+        contents = build_gemini_contents(prompt, history_raw)
+        model = model_registry.get(Config.GEMINI_MODEL, TOOLS_SYSTEM_PROMPT, tool_config)
+        async with async_llm_gates['gemini'].admit(timeout=stage_timeout(Config.GEMINI_QUEUE_TIMEOUT, 'gemini')):
+            response = await model.generate_content_async(
+                contents, generation_config=genai.GenerationConfig(temperature=0.3),
+                request_options=gemini_request_options('gemini'))
+
+        function_calls, text = gemini_function_calls(response)
+        if function_calls:
+            # to_thread copia el contexto: las herramientas ven el plazo de la petición
+            return merge_tool_responses(await asyncio.to_thread(run_tool_calls, function_calls), text)
+        return gemini_text_response(response)
+    except Exception as e:
+        return gemini_error_response(e, 'acall_gemini_with_tools')
+
+
+async def aanswer_from_faq(prompt: str):
+    """'answer_from_faq' fuera del event loop (puede recargar el catálogo desde Supabase)."""
+    return await asyncio.to_thread(answer_from_faq, prompt)
+
+
+# Mismo enrutado y mismas latencias del LLM local que la ruta síncrona
+async_chat_router = AsyncHedgedRouter(
+    classify_local=intent_classifier.classify,
+    classify_remote=aclassify_intent_with_gemini,
+    answer_local=acall_local_llm,
+    answer_remote=acall_gemini_with_tools,
+    latency_tracker=local_llm_latency,
+    confidence_threshold=Config.INTENT_CONFIDENCE_THRESHOLD,
+    hedge_percentile=Config.ROUTER_HEDGE_PERCENTILE,
+    hedge_default=Config.ROUTER_HEDGE_DEFAULT,
+    hedge_min=Config.ROUTER_HEDGE_MIN,
+    hedge_max=Config.ROUTER_HEDGE_MAX,
+    answer_instant=aanswer_from_faq,
+    answer_degraded=degraded_answer,
+)
+
+# ======================================================
+# 2. HANDLER ASÍNCRONO DEL CHAT
+# ======================================================
+
+def fail(message, code=400):
+    """Misma forma de error que 'ai_logica.fail': (cuerpo, código, cabeceras)."""
+    print(f"API Error [{code}]: {message}")
+    return {'success': False, 'message': message}, code, {}
+
+
+async def handle_chat_request_async(data, gemini_ready):
+    """Versión asyncio de 'ai_logica.handle_chat_request'. Devuelve (cuerpo, código, cabeceras)."""
+    if not gemini_ready and not Config.LOCAL_LLM_URL:
+        return fail("Asistente IA no configurado.", 500)
+    try:
+        prompt = str(data.get('prompt', '')).strip()
+        if not prompt: return fail("Prompt vacío.", 400)
+        conversation_id, history_raw, reset = await asyncio.to_thread(open_conversation, data)
+        conversation = {'conversation_id': conversation_id, 'conversation_reset': reset}
+        # Los comandos rápidos ejecutan herramientas síncronas: fuera del event loop
+        result = await asyncio.to_thread(shortcut_response, prompt, history_raw)
+        if result is not None:
+            await asyncio.to_thread(record_turn, conversation_id, prompt, result.get('response'))
+            result.update(conversation)
+            return result, 200, {}
+        with deadline_scope(Deadline(Config.CHAT_DEADLINE)) as deadline:
+            result, routing = await async_chat_router.route(prompt, history_raw, remote_ready=gemini_ready,
+                                                            deadline=deadline)
+            result = settle_deadline(prompt, result, routing, deadline)
+        print(f"[AI Router] Camino (async): {routing['path']} ({routing['intent_path']}), tiempos: {routing['timings_ms']}")
+        body, code, headers = routed_response(prompt, history_raw, result, routing)
+        if code == 200:
+            await asyncio.to_thread(record_turn, conversation_id, prompt, body.get('response'))
+        body.update(conversation)
+        return body, code, headers
+    except Exception as e:
+        print(f"🚨 ERROR FATAL en handle_chat_request_async: {e}")
+        return fail("Error crítico en enrutador chat.", 500)
+
+# ======================================================
+# 3. APP ASGI (chat asíncrono + Flask para el resto)
+# ======================================================
+
+def client_ip(scope):
+    """IP del cliente con la misma regla que ProxyFix(x_for=1): el último salto de X-Forwarded-For."""
+    for name, value in scope.get('headers', []):
+        if name == b'x-forwarded-for':
+            forwarded = [ip.strip() for ip in value.decode('latin-1').split(',') if ip.strip()]
+            if forwarded:
+                return forwarded[-1]
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+
+class ChatASGIApp:
+    """App ASGI: POST /api/chat con asyncio; el resto de rutas (y OPTIONS) las atiende Flask."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self._wsgi = WsgiToAsgi(flask_app)
+        self.in_flight = 0
+        self.served = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == ASYNC_CHAT_PATH:
+            self.in_flight += 1
+            try:
+                await self._chat(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+                self.served += 1
+        else:
+            await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await get_local_llm_client().aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        """Cuerpo completo de la petición, o None si supera MAX_CHAT_BODY."""
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_CHAT_BODY:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _send_json(self, scope, send, body, status, headers):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+        # Mismo CORS que Flask para /api/* (origins='*' con credenciales: se refleja el Origin)
+        for name, value in scope.get('headers', []):
+            if name == b'origin':
+                raw_headers += [(b'access-control-allow-origin', value), (b'access-control-allow-credentials', b'true'),
+                                (b'vary', b'Origin')]
+        raw_headers += [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in headers.items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    def _session(self, scope):
+        """Datos de la cookie de sesión de Flask (firmada), o {} si falta o no es válida."""
+        app = self.flask_app
+        cookies = '; '.join(value.decode('latin-1') for name, value in scope.get('headers', []) if name == b'cookie')
+        value = parse_cookie(cookies).get(app.config['SESSION_COOKIE_NAME'])
+        serializer = app.session_interface.get_signing_serializer(app)
+        if not value or serializer is None:
+            return {}
+        try:
+            return serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    async def _chat(self, scope, receive, send):
+        limit_headers = {}
+        limiter = get_rate_limiter()
+        if limiter.enabled:
+            # Misma identidad que la ruta Flask: el admin de la sesión o la IP
+            key = client_key_for(self._session(scope), client_ip(scope))
+            limit = await asyncio.to_thread(limiter.hit, 'chat', key)
+            limit_headers = limit.headers()
+            if not limit.allowed:
+                body = {'success': False, 'message': 'Demasiadas peticiones. Inténtalo de nuevo en unos segundos.',
+                        'retry_after': limit.retry_after}
+                return await self._send_json(scope, send, body, 429, limit_headers)
+
+        raw = await self._read_body(receive)
+        if raw is None:
+            body, status, headers = fail("Petición demasiado grande.", 413)
+        else:
+            try:
+                data = json.loads(raw or b'{}')
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                body, status, headers = fail("JSON inválido.", 400)
+            else:
+                body, status, headers = await handle_chat_request_async(data, self.flask_app.gemini_is_ready)
+        await self._send_json(scope, send, body, status, {**limit_headers, **headers})
+
+    def stats(self):
+        """Peticiones en vuelo y admisión de la ruta asíncrona (para /api/health)."""
+        return {
+            'in_flight': self.in_flight,
+            'served': self.served,
+            'admission': {name: gate.snapshot() for name, gate in async_llm_gates.items()},
+        }
+
+
+def build_asgi_app(flask_app):
+    """Monta la ruta asíncrona del chat junto a la app Flask. None si faltan httpx o asgiref."""
+    missing = [name for name, module in (('httpx', httpx), ('asgiref', WsgiToAsgi)) if module is None]
+    if missing:
+        print(f"⚠️ Ruta asíncrona del chat deshabilitada (faltan: {', '.join(missing)}).")
+        return None
+    print("✅ Ruta asíncrona del chat (ASGI) montada en /api/chat.")
+    return ChatASGIApp(flask_app)
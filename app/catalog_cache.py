@@ -0,0 +1,201 @@
+# /home/genichurro/Documentos/v2/IA/app/catalog_cache.py
+# --- RESPONSABILIDAD ---
+# 1. Mantener en memoria el catálogo de productos ya procesado (ingredients en lista, etc.).
+# 2. Servir GET /api/products como bytes JSON pre-serializados, sin ir a Supabase.
+# 3. Caducar por TTL y llevar un contador de versión que sube con cada cambio.
+# 4. Permitir que las acciones del admin (create/update/delete/import) parcheen
+#    o invaliden el catálogo en el acto (write-through).
+# 5. Calcular un ETag (hash del contenido) y una fecha de última modificación
+#    para responder GET condicionales (304 Not Modified).
+# 6. Avisar a los índices derivados (búsqueda, categorías...) de cada cambio
+#    mediante listeners, para que se actualicen de forma incremental.
+# 7. Aplicar un 'enrich' opcional a cada producto procesado (ej. 'image_srcset').
+# --- NOTA ---
+# La caché es por proceso: con varios workers, los cambios hechos en otro worker
+# se verán como máximo 'ttl' segundos después.
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+
+
+def process_product(row):
+    """Convierte una fila cruda de Supabase al formato que consume el frontend."""
+    product = dict(row)
+    ingredients = product.get('ingredients')
+    if isinstance(ingredients, str):
+        product['ingredients'] = ingredients.split(',') if ingredients else []
+    elif not ingredients:
+        product['ingredients'] = []
+    product['featured'] = bool(product.get('featured', False))
+    return product
+
+
+def product_sort_key(product):
+    """Orden canónico del catálogo: nombre (sin distinguir mayúsculas) y luego id."""
+    return (str(product.get('name') or '').casefold(), str(product.get('id')))
+
+
+class CatalogCache:
+    """Catálogo en memoria con TTL, versión y parcheo in-place."""
+
+    def __init__(self, loader, ttl=60, enrich=None):
+        self._loader = loader          # Callable que devuelve las filas crudas de Supabase
+        self._enrich = enrich          # Callable(producto) -> producto, tras process_product
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._products = None          # dict id -> producto procesado
+        self._ordered = None           # lista ordenada (se reconstruye si hay cambios)
+        self._payload = None           # bytes JSON de la respuesta completa
+        self._etag = None              # hash del payload (estable entre procesos)
+        self._last_modified = None     # momento en que cambió el ETag
+        self._orderings = {}           # nombre -> (productos, claves) ordenados ascendentemente
+        self._listeners = []           # callables (event, payload)
+        self._version = 0
+        self._loaded_at = 0.0
+
+    def subscribe(self, listener):
+        """
+        Registra 'listener(event, payload)', llamado con el lock tomado tras cada cambio:
+        'replace' (todos los productos), 'upsert' (productos cambiados) o 'remove' (ids).
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event, payload):
+        for listener in self._listeners:
+            try:
+                listener(event, payload)
+            except Exception as e:
+                print(f"⚠️ Error en listener del catálogo ({event}): {e}")
+
+    def _process(self, row):
+        product = process_product(row)
+        return self._enrich(product) if self._enrich else product
+
+    # --- Lectura ---
+
+    @property
+    def version(self):
+        return self._version
+
+    def _is_fresh(self):
+        return self._products is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        # Solo un hilo recarga; el resto espera y reutiliza el resultado.
+        with self._load_lock:
+            if self._is_fresh():
+                return
+            try:
+                rows = self._loader()
+            except Exception as e:
+                if self._products is not None:
+                    print(f"⚠️ No se pudo refrescar el catálogo, sirviendo versión anterior: {e}")
+                    with self._lock:
+                        self._loaded_at = time.monotonic()
+                    return
+                raise
+            self.replace(rows)
+
+    def _ordered_products(self):
+        # Debe llamarse con el lock tomado.
+        if self._ordered is None:
+            self._ordered = sorted(self._products.values(), key=product_sort_key)
+        return self._ordered
+
+    def get_products(self):
+        """Lista de productos procesados, ordenados por nombre (no modificar)."""
+        self._ensure_loaded()
+        with self._lock:
+            return self._ordered_products()
+
+    def get_sorted(self, name, key_func):
+        """
+        Productos ordenados ascendentemente por 'key_func' junto con sus claves
+        (para búsquedas con bisect). Se calcula una vez por versión del catálogo.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            ordering = self._orderings.get(name)
+            if ordering is None:
+                pairs = sorted(((key_func(p), p) for p in self._products.values()), key=lambda kp: kp[0])
+                ordering = ([p for _, p in pairs], [k for k, _ in pairs])
+                self._orderings[name] = ordering
+            return ordering
+
+    def get_product(self, product_id):
+        self._ensure_loaded()
+        with self._lock:
+            return self._products.get(str(product_id))
+
+    def get_payload(self):
+        """Respuesta completa de GET /api/products ya serializada."""
+        return self.get_snapshot()[0]
+
+    def get_snapshot(self):
+        """Devuelve (payload, etag, last_modified) de forma consistente."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._payload is None:
+                # Lista y payload en la misma sección crítica: un upsert/remove no
+                # puede colarse entre ambos (el payload viejo quedaría con ETag nuevo)
+                products = self._ordered_products()
+                self._payload = json.dumps({'success': True, 'products': products},
+                                           ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                etag = hashlib.sha256(self._payload).hexdigest()[:32]
+                # Una recarga con el mismo contenido conserva ETag y fecha.
+                if etag != self._etag:
+                    self._etag = etag
+                    self._last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+            return self._payload, self._etag, self._last_modified
+
+    # --- Escritura (write-through) ---
+
+    def _touch(self):
+        # Debe llamarse con el lock tomado.
+        self._ordered = None
+        self._payload = None
+        self._orderings = {}
+        self._version += 1
+
+    def replace(self, rows):
+        """Sustituye el catálogo completo por las filas recibidas."""
+        with self._lock:
+            self._products = {str(row['id']): self._process(row) for row in rows}
+            self._loaded_at = time.monotonic()
+            self._touch()
+            self._notify('replace', list(self._products.values()))
+
+    def upsert(self, rows):
+        """Inserta o actualiza productos a partir de filas devueltas por Supabase."""
+        with self._lock:
+            if self._products is None:
+                return
+            changed = []
+            for row in rows:
+                product_id = str(row['id'])
+                current = self._products.get(product_id, {})
+                self._products[product_id] = self._process({**current, **row})
+                changed.append(self._products[product_id])
+            self._touch()
+            self._notify('upsert', changed)
+
+    def remove(self, product_ids):
+        with self._lock:
+            if self._products is None:
+                return
+            for product_id in product_ids:
+                self._products.pop(str(product_id), None)
+            self._touch()
+            self._notify('remove', [str(product_id) for product_id in product_ids])
+
+    def invalidate(self):
+        """Fuerza una recarga completa en la próxima lectura (los datos actuales quedan como respaldo)."""
+        with self._lock:
+            self._loaded_at = float('-inf')
+            self._touch()
@@ -0,0 +1,69 @@
+# /home/genichurro/Documentos/v2/IA/app/catalog_diff.py
+# --- RESPONSABILIDAD ---
+# 1. Comparar una importación contra el catálogo actual usando un hash por fila.
+# 2. Clasificar los productos en insertados, cambiados, sin cambios y eliminados,
+#    para enviar a Supabase solo lo que realmente cambió.
+
+import hashlib
+import json
+
+# Campos que se comparan (los mismos que escribe la importación)
+DIFF_FIELDS = ('id', 'name', 'price', 'category', 'stock', 'featured',
+               'description', 'ingredients', 'image')
+
+
+def canonical_ingredients(value):
+    """'a, b,,c' o ['a ', 'b', '', 'c'] -> 'a,b,c' (mismo texto venga de donde venga)."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return ','.join(str(i).strip() for i in (value or []) if str(i).strip())
+
+
+def canonical_row(row):
+    """Normaliza una fila (de la importación o de Supabase) para compararla."""
+    canonical = {
+        'id': str(row.get('id')),
+        'name': row.get('name'),
+        'price': round(float(row.get('price') or 0), 2),
+        'category': row.get('category'),
+        'stock': int(row.get('stock') or 0),
+        'featured': bool(row.get('featured')),
+        'description': row.get('description'),
+        'ingredients': canonical_ingredients(row.get('ingredients')),
+        'image': row.get('image'),
+    }
+    return canonical
+
+
+def row_hash(row):
+    encoded = json.dumps(canonical_row(row), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def diff_catalog(incoming, current):
+    """
+    Compara los payloads a importar con los productos actuales.
+    Devuelve un dict con las listas de ids 'inserted', 'changed', 'unchanged',
+    'removed' y las filas a enviar en 'rows_to_upsert'.
+    """
+    current_hashes = {str(p.get('id')): row_hash(p) for p in current}
+    result = {'inserted': [], 'changed': [], 'unchanged': [], 'removed': [], 'rows_to_upsert': []}
+    # Si el id se repite, cuenta la última aparición (como en la importación por lotes,
+    # donde el upsert posterior sobrescribe al anterior)
+    latest = {}
+    for payload in incoming:
+        latest[str(payload.get('id'))] = payload
+
+    for product_id, payload in latest.items():
+        existing_hash = current_hashes.get(product_id)
+        if existing_hash is None:
+            result['inserted'].append(payload['id'])
+            result['rows_to_upsert'].append(payload)
+        elif existing_hash != row_hash(payload):
+            result['changed'].append(payload['id'])
+            result['rows_to_upsert'].append(payload)
+        else:
+            result['unchanged'].append(payload['id'])
+
+    result['removed'] = [p.get('id') for p in current if str(p.get('id')) not in latest]
+    return result
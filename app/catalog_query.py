@@ -0,0 +1,178 @@
+# /home/genichurro/Documentos/v2/IA/app/catalog_query.py
+# --- RESPONSABILIDAD ---
+# 1. Interpretar los parámetros de consulta de GET /api/products
+#    (limit, cursor, fields, category, min_price, max_price, sort, q).
+# 2. Resolverlos sobre el catálogo en memoria usando órdenes precalculados
+#    y paginación por cursor (keyset), sin ir a Supabase.
+# 3. Devolver la página pedida y el 'next_cursor' para cargar la siguiente.
+
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from app.catalog_cache import product_sort_key
+from app.config import Config
+from app.category_index import category_key
+
+# Parámetros que activan el modo paginado de /api/products
+QUERY_PARAMS = {'limit', 'cursor', 'fields', 'category', 'min_price', 'max_price', 'sort', 'q'}
+
+# Campos que se pueden pedir con 'fields=' ('id' se incluye siempre)
+ALLOWED_FIELDS = {'id', 'name', 'price', 'category', 'stock', 'featured',
+                  'description', 'ingredients', 'image', 'image_srcset'}
+
+# Mismos valores que el <select id="sortSelect"> del frontend: sort -> (clave, descendente)
+SORTS = {
+    'name-asc': ('name', False),
+    'name-desc': ('name', True),
+    'price-asc': ('price', False),
+    'price-desc': ('price', True),
+}
+
+
+def _price(product):
+    try:
+        return float(product.get('price'))
+    except (TypeError, ValueError):
+        return float('inf')
+
+
+def _name_key(product):
+    return product_sort_key(product)
+
+
+def _price_key(product):
+    return (_price(product),) + product_sort_key(product)
+
+
+SORT_KEYS = {'name': _name_key, 'price': _price_key}
+
+# Tipos de cada elemento de la clave de orden (lo que viaja en el cursor)
+SORT_KEY_TYPES = {'name': (str, str), 'price': ((int, float), str, str)}
+
+
+def encode_cursor(sort, key):
+    raw = json.dumps({'s': sort, 'k': list(key)}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        key = tuple(data['k'])
+    except Exception:
+        raise ValueError("Cursor inválido.")
+    if data.get('s') != sort:
+        raise ValueError("El cursor no corresponde al orden solicitado.")
+    # La clave se compara con bisect contra las del catálogo: tipos distintos darían TypeError
+    types = SORT_KEY_TYPES[SORTS[sort][0]]
+    if len(key) != len(types) or any(isinstance(value, bool) or not isinstance(value, expected)
+                                     for value, expected in zip(key, types)):
+        raise ValueError("Cursor inválido.")
+    return key
+
+
+def is_paged_request(args):
+    """Indica si la petición usa alguno de los parámetros de consulta."""
+    return any(name in args for name in QUERY_PARAMS)
+
+
+def parse_query(args):
+    """Valida los parámetros de la query string. Lanza ValueError con un mensaje legible."""
+    query = {}
+
+    try:
+        limit = int(args.get('limit', Config.PRODUCTS_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("'limit' debe ser un número entero.")
+    query['limit'] = max(1, min(limit, Config.PRODUCTS_PAGE_MAX))
+
+    sort = args.get('sort', 'name-asc')
+    if sort not in SORTS:
+        raise ValueError(f"'sort' no válido. Opciones: {', '.join(SORTS)}.")
+    query['sort'] = sort
+
+    query['cursor'] = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+
+    fields = None
+    if args.get('fields'):
+        fields = ['id']
+        for field in (f.strip() for f in args['fields'].split(',')):
+            if field and field not in fields:
+                fields.append(field)
+        unknown = set(fields) - ALLOWED_FIELDS
+        if unknown:
+            raise ValueError(f"Campos no válidos en 'fields': {', '.join(sorted(unknown))}.")
+    query['fields'] = fields
+
+    category = category_key(args.get('category'))
+    query['category'] = None if category in ('', 'all', 'todos') else category
+
+    for name in ('min_price', 'max_price'):
+        value = args.get(name)
+        try:
+            query[name] = float(value) if value not in (None, '') else None
+        except ValueError:
+            raise ValueError(f"'{name}' debe ser numérico.")
+
+    query['q'] = (args.get('q') or '').strip().casefold() or None
+    return query
+
+
+def _matches(product, query):
+    if query['category'] and category_key(product.get('category')) != query['category']:
+        return False
+    if query['min_price'] is not None or query['max_price'] is not None:
+        price = _price(product)
+        if price == float('inf'):
+            return False
+        if query['min_price'] is not None and price < query['min_price']:
+            return False
+        if query['max_price'] is not None and price > query['max_price']:
+            return False
+    if query['q']:
+        # Misma semántica que el filtro de búsqueda de products.js
+        needle = query['q']
+        haystack = [product.get('name') or '', product.get('description') or '']
+        haystack.extend(product.get('ingredients') or [])
+        if not any(needle in str(text).casefold() for text in haystack):
+            return False
+    return True
+
+
+def query_products(catalog, query):
+    """
+    Devuelve (productos_de_la_página, next_cursor) recorriendo el orden
+    precalculado desde la posición del cursor hasta llenar 'limit'.
+    """
+    key_name, descending = SORTS[query['sort']]
+    products, keys = catalog.get_sorted(key_name, SORT_KEYS[key_name])
+
+    cursor = query['cursor']
+    if descending:
+        start = (bisect_left(keys, cursor) - 1) if cursor is not None else len(products) - 1
+        indices = range(start, -1, -1)
+    else:
+        start = bisect_right(keys, cursor) if cursor is not None else 0
+        indices = range(start, len(products))
+
+    limit = query['limit']
+    page = []
+    last_index = None
+    has_more = False
+    for index in indices:
+        product = products[index]
+        if not _matches(product, query):
+            continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(product)
+        last_index = index
+
+    next_cursor = encode_cursor(query['sort'], keys[last_index]) if has_more else None
+
+    if query['fields']:
+        page = [{f: p.get(f) for f in query['fields'] if f in p} for p in page]
+    return page, next_cursor
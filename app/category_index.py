@@ -0,0 +1,112 @@
+# /home/genichurro/Documentos/v2/IA/app/category_index.py
+# --- RESPONSABILIDAD ---
+# 1. Precalcular, a partir del catálogo, las tablas categoría -> nombres
+#    (ordenados) y categoría -> cantidad de productos.
+# 2. Resolver el nombre de categoría que escribe el usuario o la IA
+#    ("Jabón", "jabones", "CREMA") a la categoría real del catálogo.
+# 3. Mantenerse al día con los cambios del catálogo (listener de CatalogCache).
+
+import threading
+from collections import defaultdict
+
+from app.catalog_cache import product_sort_key
+from app.search_index import fold, stem
+
+# Palabras que significan "todas las categorías"
+ALL_CATEGORY_ALIASES = {'all', 'todos', 'todas', 'todo'}
+
+
+def category_key(value):
+    """' Té ' -> 'te': clave de categoría (también la usa el filtro de GET /api/products)."""
+    return fold(value).strip()
+
+
+def normalize_category(value):
+    """'  Jabón ' -> 'jabon' ; 'Jabones' -> 'jabon' (forma comparable)."""
+    return stem(fold(value).strip())
+
+
+class CategoryIndex:
+    """Tablas de categorías derivadas del catálogo, consultables sin I/O."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._members = defaultdict(dict)   # categoría -> {id: producto}
+        self._product_category = {}         # id -> categoría
+        self._aliases = {}                  # forma normalizada -> categoría
+        self._names = {}                    # categoría -> [nombres ordenados] (perezoso)
+
+    # --- Mantenimiento ---
+
+    def _remove(self, product_id):
+        category = self._product_category.pop(product_id, None)
+        if category is None:
+            return
+        members = self._members.get(category)
+        if members is not None:
+            members.pop(product_id, None)
+            if not members:
+                del self._members[category]
+                self._aliases.pop(normalize_category(category), None)
+        self._names.pop(category, None)
+        self._names.pop('all', None)
+
+    def _add(self, product):
+        product_id = str(product.get('id'))
+        category = category_key(product.get('category'))
+        self._remove(product_id)
+        if not category:
+            return
+        self._members[category][product_id] = product
+        self._product_category[product_id] = category
+        self._aliases[normalize_category(category)] = category
+        self._names.pop(category, None)
+        self._names.pop('all', None)  # 'all' también incluye este producto
+
+    def on_catalog_change(self, event, payload):
+        """Listener de CatalogCache: 'replace' (lista), 'upsert' (lista) o 'remove' (ids)."""
+        with self._lock:
+            if event == 'replace':
+                self._members.clear()
+                self._product_category.clear()
+                self._aliases.clear()
+                self._names.clear()
+                for product in payload:
+                    self._add(product)
+            elif event == 'upsert':
+                for product in payload:
+                    self._add(product)
+            elif event == 'remove':
+                for product_id in payload:
+                    self._remove(str(product_id))
+
+    # --- Consultas ---
+
+    def resolve(self, value):
+        """
+        Devuelve la categoría del catálogo que corresponde a 'value',
+        'all' si se piden todas, o None si no existe.
+        """
+        folded = fold(value).strip()
+        if folded in ALL_CATEGORY_ALIASES:
+            return 'all'
+        with self._lock:
+            return self._aliases.get(normalize_category(folded))
+
+    def names(self, category):
+        """Nombres de productos de la categoría (o de todas con 'all'), ordenados."""
+        with self._lock:
+            names = self._names.get(category)
+            if names is None:
+                if category == 'all':
+                    products = [p for members in self._members.values() for p in members.values()]
+                else:
+                    products = list(self._members.get(category, {}).values())
+                names = [p.get('name') for p in sorted(products, key=product_sort_key)]
+                self._names[category] = names
+            return names
+
+    def counts(self):
+        """{categoría: cantidad} de todas las categorías con productos."""
+        with self._lock:
+            return {category: len(members) for category, members in sorted(self._members.items())}
@@ -0,0 +1,94 @@
+# /home/genichurro/Documentos/v2/IA/app/command_matcher.py
+# --- RESPONSABILIDAD ---
+# 1. Reconocer, sin LLM, los comandos de navegación y carrito más comunes del
+#    chat ("ver carrito", "vaciar carrito", "llévame a contacto",
+#    "muéstrame los jabones", "agrega el jabón de miel al carrito").
+# 2. Devolver la herramienta a ejecutar y sus argumentos, con los mismos
+#    nombres que usa Gemini (navigate_to_section / manipulate_cart).
+# Solo se aceptan mensajes que son ENTEROS un comando: cualquier otra cosa
+# (preguntas, frases compuestas) sigue el camino normal del enrutador.
+
+import re
+
+from app.search_index import fold, stem
+
+# Fórmulas de cortesía que se ignoran al principio o al final del mensaje
+_POLITE_PREFIX = re.compile(r'^(hola|oye|porfa|por favor|herbia)\b[\s,]*')
+_POLITE_SUFFIX = re.compile(r'[\s,]*\b(por favor|porfa|gracias)$')
+_PUNCTUATION = re.compile(r'[¡!¿?.,;:]+')
+_SPACES = re.compile(r'\s+')
+
+_CART = r'(el |mi |la )?(carrito|carro|cesta)( de compras?)?'
+
+_CART_SHOW = re.compile(rf'^((ver|mostrar|muestrame|muestra|ensename|abre|abrir|abreme|ir al|llevame al) )?{_CART}$'
+                        rf'|^que (hay|tengo) en {_CART}$')
+_CART_CLEAR = re.compile(rf'^(vaciar|vacia|vaciame|limpiar|limpia|borrar|borra|eliminar|elimina) {_CART}$')
+_CART_ADD = re.compile(rf'^(agrega|agregar|agregame|anade|anadir|anademe|pon|ponme|mete|meteme) '
+                       rf'((el|la|los|las|un|una|unos|unas) )?(?P<product>.+?) (al|a mi|en el|en mi) (carrito|carro|cesta)$')
+
+_NAVIGATE = re.compile(r'^((llevame|llevarme|ir|ve|vamos|navega|navegar|quiero ir|quiero ver|ver|mostrar|muestrame|muestra|ensename)'
+                       r'( a la| a los| a las| a| al| hacia| los| las| la| el)? )?'
+                       r'(seccion (de )?)?(?P<target>[a-z ]+)$')
+
+# Alias de las secciones principales -> nombre que entiende 'navigate_to_section'
+SECTION_ALIASES = {
+    'inicio': 'inicio', 'home': 'inicio', 'principio': 'inicio', 'portada': 'inicio',
+    'productos': 'productos', 'tienda': 'productos', 'catalogo': 'productos', 'todos los productos': 'productos',
+    'sobre nosotros': 'sobre nosotros', 'nosotros': 'sobre nosotros', 'quienes somos': 'sobre nosotros',
+    'contacto': 'contacto', 'contactos': 'contacto',
+}
+
+
+def normalize_message(text):
+    """Minúsculas, sin acentos, sin signos ni cortesías: 'Hola, ¡Ver carrito!' -> 'ver carrito'."""
+    text = _PUNCTUATION.sub(' ', fold(text))
+    text = _SPACES.sub(' ', text).strip()
+    text = _POLITE_PREFIX.sub('', text)
+    return _POLITE_SUFFIX.sub('', text).strip()
+
+
+class CommandMatcher:
+    """Gramática de comandos de navegación y carrito (sin red, sin LLM)."""
+
+    def __init__(self, sections=(), categories=()):
+        self.sections = dict(SECTION_ALIASES)
+        for section in sections:
+            self.sections.setdefault(section.replace('-', ' '), section.replace('-', ' '))
+        # Forma comparable ('jabon', 'serum') -> categoría tal cual la espera la herramienta
+        self.categories = {stem(fold(c)): c for c in categories}
+
+    def _category(self, target):
+        words = target.split()
+        if len(words) == 1:
+            return self.categories.get(stem(words[0]))
+        return None
+
+    def match(self, text):
+        """Devuelve (nombre_de_herramienta, argumentos) o None si el mensaje no es un comando."""
+        message = normalize_message(text)
+        if not message:
+            return None
+
+        if _CART_SHOW.match(message):
+            return 'manipulate_cart', {'action': 'show'}
+        if _CART_CLEAR.match(message):
+            return 'manipulate_cart', {'action': 'clear'}
+        match = _CART_ADD.match(message)
+        if match:
+            # El nombre se toma del mensaje original (con acentos) si se puede
+            product = match.group('product')
+            folded = fold(text)
+            original = re.search(r'\W+'.join(map(re.escape, product.split())), folded)
+            if original and len(folded) == len(text):
+                product = text[original.start():original.end()]
+            return 'manipulate_cart', {'action': 'add', 'product_name': product.strip()}
+
+        match = _NAVIGATE.match(message)
+        if match:
+            target = match.group('target').strip()
+            if target in self.sections:
+                return 'navigate_to_section', {'section': self.sections[target]}
+            category = self._category(target)
+            if category:
+                return 'navigate_to_section', {'section': category}
+        return None
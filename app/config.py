@@ -5,6 +5,29 @@
 # 3. Almacenar todas las configuraciones en una clase 'Config' para fácil acceso.
 # --- [MEJORA] ---
 # - Se añadieron las credenciales DEMO_EMAIL y DEMO_PASSWORD a la clase Config.
+# - [NUEVO] Parámetros del pool de conexiones / reintentos / circuit breaker de Supabase.
+# - [NUEVO] TTL de la caché del catálogo (CATALOG_CACHE_TTL).
+# - [NUEVO] Tamaño de página por defecto / máximo de /api/products.
+# - [NUEVO] Tamaño de lote, lotes en vuelo y tamaño máximo de la importación en streaming.
+#   Estado de los jobs compartido entre workers (IMPORT_JOBS_DB_PATH, SQLite opcional).
+# - [NUEVO] MEDIA_MAX_AGE para las imágenes guardadas por hash.
+# - [NUEVO] Pipeline de derivados de imagen (IMAGE_PIPELINE_ENABLED, IMAGE_WORKERS).
+# - [NUEVO] Umbral de confianza del clasificador local de intención.
+# - [NUEVO] GEMINI_MODEL (nombre del modelo usado por el enrutador).
+# - [NUEVO] Pool y timeout de las herramientas de IA ejecutadas en paralelo.
+# - [NUEVO] Parámetros del enrutador con cobertura (hedge) LLM local -> Gemini.
+# - [NUEVO] Cliente del LLM local: timeouts, pool, circuit breaker y URL de salud.
+# - [NUEVO] Caché de respuestas a preguntas frecuentes del chat (CHAT_CACHE_*).
+# - [NUEVO] Recuperación BM25 del FAQ (FAQ_ENABLED, FAQ_CONFIDENCE_THRESHOLD, FAQ_PATH).
+# - [NUEVO] Caché de resultados de herramientas (TOOL_CACHE_TTL, TOOL_CACHE_SIZE).
+# - [NUEVO] Historial del chat en el servidor (CONVERSATION_*: LRU, SQLite opcional,
+#   presupuesto de tokens y tamaño del resumen extractivo).
+# - [NUEVO] Control de admisión de las llamadas a Gemini y al LLM local
+#   (*_MAX_CONCURRENT, *_MAX_QUEUE, *_QUEUE_TIMEOUT).
+# - [NUEVO] Límite de peticiones por cliente (RATE_LIMIT_*: cupo del chat y de
+#   las modificaciones del admin, Redis opcional para varios workers).
+# - [NUEVO] Plazo total de cada petición de /api/chat (CHAT_DEADLINE).
+# - [NUEVO] Ruta asíncrona (ASGI) del chat (ASYNC_CHAT_ENABLED y su control de admisión).
 
 import os
 from dotenv import load_dotenv
@@ -27,14 +50,114 @@ class Config:
     SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY')
     SUPABASE_TABLE = os.getenv('SUPABASE_TABLE', 'products')
 
+    # --- [NUEVO] Pool de conexiones y resiliencia de Supabase ---
+    SUPABASE_POOL_CONNECTIONS = int(os.getenv('SUPABASE_POOL_CONNECTIONS', '4'))
+    SUPABASE_POOL_MAXSIZE = int(os.getenv('SUPABASE_POOL_MAXSIZE', '16'))
+    SUPABASE_MAX_RETRIES = int(os.getenv('SUPABASE_MAX_RETRIES', '2'))   # Solo GET/HEAD
+    SUPABASE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '3.05'))
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '15'))
+    SUPABASE_BREAKER_THRESHOLD = int(os.getenv('SUPABASE_BREAKER_THRESHOLD', '5'))
+    SUPABASE_BREAKER_RESET = float(os.getenv('SUPABASE_BREAKER_RESET', '30'))  # Segundos
+
+    # --- [NUEVO] Caché del catálogo en memoria ---
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', '60'))  # Segundos
+
+    # --- [NUEVO] Paginación de /api/products ---
+    PRODUCTS_PAGE_SIZE = int(os.getenv('PRODUCTS_PAGE_SIZE', '24'))
+    PRODUCTS_PAGE_MAX = int(os.getenv('PRODUCTS_PAGE_MAX', '100'))
+
+    # --- [NUEVO] Importación en streaming (NDJSON / CSV) ---
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+    IMPORT_MAX_IN_FLIGHT = int(os.getenv('IMPORT_MAX_IN_FLIGHT', '3'))
+    IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', str(50 * 1024 * 1024)))
+    # Estado de los jobs en SQLite; vacío = solo en el worker que importa. Con varios
+    # workers todos deben usar el mismo archivo para consultar el progreso.
+    IMPORT_JOBS_DB_PATH = os.getenv('IMPORT_JOBS_DB_PATH', '')
+
     # --- Configuración de IA (Nube) ---
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
     
     # --- Configuración de IA (Local) ---
     LOCAL_LLM_URL = os.getenv('LOCAL_LLM_URL', 'http://127.0.0.1:5001/generate')
+    LOCAL_LLM_HEALTH_URL = os.getenv('LOCAL_LLM_HEALTH_URL')  # Por defecto se sondea LOCAL_LLM_URL
+    LOCAL_LLM_CONNECT_TIMEOUT = float(os.getenv('LOCAL_LLM_CONNECT_TIMEOUT', '2'))
+    LOCAL_LLM_TIMEOUT = float(os.getenv('LOCAL_LLM_TIMEOUT', '10'))
+    LOCAL_LLM_POOL_MAXSIZE = int(os.getenv('LOCAL_LLM_POOL_MAXSIZE', '8'))
+    LOCAL_LLM_BREAKER_THRESHOLD = int(os.getenv('LOCAL_LLM_BREAKER_THRESHOLD', '3'))
+    LOCAL_LLM_BREAKER_RESET = float(os.getenv('LOCAL_LLM_BREAKER_RESET', '15'))  # Segundos
+
+    # --- [NUEVO] Control de admisión (llamadas simultáneas y cola con plazo por backend) ---
+    GEMINI_MAX_CONCURRENT = int(os.getenv('GEMINI_MAX_CONCURRENT', '8'))
+    GEMINI_MAX_QUEUE = int(os.getenv('GEMINI_MAX_QUEUE', '32'))
+    GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '3'))  # Segundos esperando turno
+    LOCAL_LLM_MAX_CONCURRENT = int(os.getenv('LOCAL_LLM_MAX_CONCURRENT', '4'))
+    LOCAL_LLM_MAX_QUEUE = int(os.getenv('LOCAL_LLM_MAX_QUEUE', '16'))
+    LOCAL_LLM_QUEUE_TIMEOUT = float(os.getenv('LOCAL_LLM_QUEUE_TIMEOUT', '1'))  # Corto: después se pasa a Gemini
+
+    # --- [NUEVO] Límite de peticiones por cliente (token bucket) ---
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    RATE_LIMIT_CHAT = int(os.getenv('RATE_LIMIT_CHAT', '20'))  # Ráfaga máxima de mensajes por IP
+    RATE_LIMIT_CHAT_WINDOW = float(os.getenv('RATE_LIMIT_CHAT_WINDOW', '60'))  # Segundos en rellenar el cupo
+    RATE_LIMIT_ADMIN = int(os.getenv('RATE_LIMIT_ADMIN', '30'))  # Modificaciones de productos por admin
+    RATE_LIMIT_ADMIN_WINDOW = float(os.getenv('RATE_LIMIT_ADMIN_WINDOW', '60'))
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', '')  # Vacío = cupos en memoria de cada worker
+
+    # --- [NUEVO] Plazo total de /api/chat: las etapas usan lo que queda (menor que el timeout del proxy) ---
+    CHAT_DEADLINE = float(os.getenv('CHAT_DEADLINE', '20'))  # Segundos
+
+    # --- [NUEVO] Ruta asíncrona (ASGI) del chat: las esperas no ocupan hilos ---
+    ASYNC_CHAT_ENABLED = os.getenv('ASYNC_CHAT_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    ASYNC_GEMINI_MAX_CONCURRENT = int(os.getenv('ASYNC_GEMINI_MAX_CONCURRENT', '256'))  # Llamadas a Gemini en vuelo
+    ASYNC_MAX_QUEUE = int(os.getenv('ASYNC_MAX_QUEUE', '1024'))  # Cola por backend de la ruta asíncrona
+
+    # --- [NUEVO] Enrutador: por debajo de este umbral se consulta a Gemini ---
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', '0.75'))
+
+    # --- [NUEVO] Herramientas de IA (varias llamadas por turno, en paralelo) ---
+    TOOL_MAX_WORKERS = int(os.getenv('TOOL_MAX_WORKERS', '4'))
+    TOOL_TIMEOUT = float(os.getenv('TOOL_TIMEOUT', '5'))  # Segundos
+    TOOL_CACHE_TTL = float(os.getenv('TOOL_CACHE_TTL', '10'))  # Segundos que se reutiliza un resultado
+    TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', '512'))
+
+    # --- [NUEVO] Enrutador concurrente: cobertura a Gemini si el LLM local va lento ---
+    ROUTER_HEDGE_PERCENTILE = float(os.getenv('ROUTER_HEDGE_PERCENTILE', '0.9'))  # Percentil de latencia local
+    ROUTER_HEDGE_DEFAULT = float(os.getenv('ROUTER_HEDGE_DEFAULT', '1.5'))  # Segundos, sin historial suficiente
+    ROUTER_HEDGE_MIN = float(os.getenv('ROUTER_HEDGE_MIN', '0.3'))
+    ROUTER_HEDGE_MAX = float(os.getenv('ROUTER_HEDGE_MAX', '5'))
+    # Una rama por llamada admitida o en cola en cada backend: así la espera ocurre en
+    # la cola de admisión (con su plazo) y no en la del pool, que no tiene ninguno
+    ROUTER_MAX_WORKERS = int(os.getenv('ROUTER_MAX_WORKERS', str(
+        GEMINI_MAX_CONCURRENT + GEMINI_MAX_QUEUE + LOCAL_LLM_MAX_CONCURRENT + LOCAL_LLM_MAX_QUEUE)))
+
+    # --- [NUEVO] Caché de respuestas 'simple_question' del chat ---
+    CHAT_CACHE_SIZE = int(os.getenv('CHAT_CACHE_SIZE', '256'))
+    CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', '600'))  # Segundos
+    CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', '0.8'))  # Jaccard; > 1 desactiva la similitud
+    CHAT_CACHE_HISTORY_WINDOW = int(os.getenv('CHAT_CACHE_HISTORY_WINDOW', '2'))  # Mensajes que forman la clave
+
+    # --- [NUEVO] FAQ local (BM25): responde preguntas simples sin LLM ---
+    FAQ_ENABLED = os.getenv('FAQ_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    FAQ_CONFIDENCE_THRESHOLD = float(os.getenv('FAQ_CONFIDENCE_THRESHOLD', '0.6'))
+    FAQ_PATH = os.getenv('FAQ_PATH', os.path.join(basedir, 'faq.json'))  # Entradas extra (opcional)
+
+    # --- [NUEVO] Conversaciones del chat guardadas en el servidor ---
+    # Sin CONVERSATION_DB_PATH cada proceso tiene su propio historial: con varios
+    # workers (gunicorn -w N) todos deben apuntar al MISMO archivo SQLite (mismo
+    # host/volumen). Si no, una petición que cae en otro worker empieza desde la
+    # ventana de historial que envía el cliente ('conversation_reset': true).
+    CONVERSATION_MAX = int(os.getenv('CONVERSATION_MAX', '1000'))  # Conversaciones en memoria (LRU)
+    CONVERSATION_DB_PATH = os.getenv('CONVERSATION_DB_PATH', '')  # Ruta SQLite; vacío = solo memoria
+    CONVERSATION_TTL = float(os.getenv('CONVERSATION_TTL', str(7 * 24 * 3600)))  # Segundos (SQLite)
+    CONVERSATION_TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', '1200'))  # Tokens estimados de historial
+    CONVERSATION_SUMMARY_CHARS = int(os.getenv('CONVERSATION_SUMMARY_CHARS', '800'))
+    CONVERSATION_SUMMARY_TIMEOUT = float(os.getenv('CONVERSATION_SUMMARY_TIMEOUT', '10'))  # Segundos (Gemini)
 
     # --- Configuración de Archivos ---
     UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
+    MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', str(365 * 24 * 3600)))  # URLs /media/ inmutables
+    IMAGE_PIPELINE_ENABLED = os.getenv('IMAGE_PIPELINE_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))  # Hilos que generan derivados AVIF/WebP
 
     # --- [NUEVO] Credenciales de Demo ---
     # Coinciden con las usadas en el config.js original
@@ -0,0 +1,265 @@
+# /home/genichurro/Documentos/v2/IA/app/conversation_store.py
+# --- RESPONSABILIDAD ---
+# 1. Guardar el historial del chat en el servidor, por ID de conversación: el
+#    cliente solo envía el mensaje nuevo (no todo el transcript en cada turno).
+# 2. Mantener las conversaciones activas en memoria (LRU acotado) y, si se
+#    configura una ruta, persistirlas en SQLite (sobreviven a reinicios y a la
+#    expulsión de la LRU). Con SQLite, el archivo es la fuente de verdad: cada
+#    lectura lo consulta y cada escritura es optimista (columna 'version'), para
+#    que varios workers sobre el mismo archivo no se pisen los turnos.
+# 3. Entregar al modelo solo lo que cabe en un presupuesto de tokens (estimado):
+#    los mensajes más recientes + un resumen de los anteriores.
+# 4. Resumir UNA vez los turnos que ya no caben ('compact'), acumulando sobre el
+#    resumen previo, para que el tamaño del prompt se mantenga plano.
+# --- NOTA ---
+# El resumidor se inyecta (callable) para no depender de Gemini desde aquí.
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Estimación barata: ~4 caracteres por token (suficiente para un presupuesto)
+CHARS_PER_TOKEN = 4
+# Tokens fijos por mensaje (rol, separadores)
+MESSAGE_OVERHEAD = 4
+# Reintentos de una escritura que otro worker ganó (se relee y se vuelve a aplicar)
+SAVE_RETRIES = 5
+
+
+def estimate_tokens(text):
+    return len(text or '') // CHARS_PER_TOKEN + MESSAGE_OVERHEAD
+
+
+def new_conversation(conversation_id):
+    return {'id': conversation_id, 'summary': '', 'messages': [], 'updated_at': time.time()}
+
+
+class SQLiteConversationBackend:
+    """Persistencia opcional de conversaciones (una fila JSON por conversación)."""
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS conversations "
+                               "(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+                               "version INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+            if 'version' not in columns:  # Archivo creado antes de la escritura optimista
+                self._conn.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - ttl,))
+
+    def load(self, conversation_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data, updated_at, version FROM conversations WHERE id = ?",
+                                     (conversation_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        conversation = json.loads(row[0])
+        conversation['version'] = row[2]
+        return conversation
+
+    def save(self, conversation):
+        """
+        Escritura optimista: solo se guarda si la fila sigue en la 'version' que se
+        leyó (sin 'version' = conversación nueva). Devuelve False si otro worker la
+        cambió antes; si no, sube la versión del dict.
+        """
+        version = conversation.get('version')
+        data = json.dumps({k: v for k, v in conversation.items() if k != 'version'}, ensure_ascii=False)
+        with self._lock, self._conn:
+            if version is None:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO conversations (id, data, updated_at, version) "
+                                            "VALUES (?, ?, ?, 1)",
+                                            (conversation['id'], data, conversation['updated_at']))
+            else:
+                cursor = self._conn.execute("UPDATE conversations SET data = ?, updated_at = ?, version = version + 1 "
+                                            "WHERE id = ? AND version = ?",
+                                            (data, conversation['updated_at'], conversation['id'], version))
+        if cursor.rowcount != 1:
+            return False
+        conversation['version'] = (version or 0) + 1
+        return True
+
+    def delete(self, conversation_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+
+class ConversationStore:
+    """Historial del chat por conversación: LRU en memoria + backend opcional + resumen."""
+
+    def __init__(self, max_conversations=1000, token_budget=1200, backend=None, summarize=None,
+                 min_recent=2):
+        self.max_conversations = max(1, max_conversations)
+        self.token_budget = token_budget
+        self.min_recent = min_recent          # Mensajes recientes que nunca se resumen
+        self._backend = backend
+        self._summarize = summarize           # (resumen_previo, mensajes) -> nuevo resumen
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()   # id -> conversación
+        self.summaries = 0
+
+    # --- Acceso ---
+
+    def _get(self, conversation_id):
+        # Debe llamarse con el lock tomado.
+        if self._backend is not None:
+            # Otros workers escriben en el mismo archivo: la copia en memoria puede ser vieja
+            conversation = self._backend.load(conversation_id)
+            if conversation is None:
+                self._conversations.pop(conversation_id, None)
+                return None
+            self._put(conversation)
+            return conversation
+        conversation = self._conversations.get(conversation_id)
+        if conversation is not None:
+            self._conversations.move_to_end(conversation_id)
+        return conversation
+
+    def _put(self, conversation):
+        # Debe llamarse con el lock tomado.
+        self._conversations[conversation['id']] = conversation
+        self._conversations.move_to_end(conversation['id'])
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+    def _save(self, conversation):
+        # Debe llamarse con el lock tomado. False = otro worker la cambió (hay que releer).
+        conversation['updated_at'] = time.time()
+        if self._backend is not None:
+            try:
+                return self._backend.save(conversation)
+            except Exception as e:
+                print(f"⚠️ No se pudo persistir la conversación {conversation['id'][:8]}: {e}")
+        return True
+
+    def _update(self, conversation_id, change):
+        """
+        Aplica 'change(conversación)' sobre la versión más reciente y la guarda; si
+        otro worker la escribió entre medias, relee y vuelve a aplicar. 'change'
+        puede devolver False para no guardar. Devuelve True si se guardó.
+        """
+        # Debe llamarse con el lock tomado.
+        for _ in range(SAVE_RETRIES):
+            conversation = self._get(conversation_id)
+            if conversation is None or change(conversation) is False:
+                return False
+            if self._save(conversation):
+                return True
+        print(f"⚠️ Conversación {conversation_id[:8]}: demasiados conflictos de escritura, se descarta el cambio.")
+        return False
+
+    def open(self, conversation_id=None, seed_history=None):
+        """
+        Devuelve (id, reiniciada): el ID de una conversación existente o de una nueva
+        creada con 'seed_history' ([{'sender', 'text'}], el historial que envía el
+        cliente). 'reiniciada' es True si el cliente pidió un ID que aquí no existe
+        (caducado, expulsado de la LRU o guardado por otro worker).
+        """
+        with self._lock:
+            if conversation_id and self._get(conversation_id) is not None:
+                return conversation_id, False
+            conversation = new_conversation(uuid.uuid4().hex)
+            for msg in seed_history or []:
+                if isinstance(msg, dict) and msg.get('text'):
+                    conversation['messages'].append({'sender': 'user' if msg.get('sender') == 'user' else 'bot',
+                                                     'text': str(msg['text'])})
+            self._put(conversation)
+            self._save(conversation)
+            return conversation['id'], bool(conversation_id)
+
+    def append(self, conversation_id, sender, text):
+        with self._lock:
+            self._update(conversation_id, lambda c: c['messages'].append({'sender': sender, 'text': text}))
+
+    def delete(self, conversation_id):
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+            if self._backend is not None:
+                self._backend.delete(conversation_id)
+
+    # --- Presupuesto de tokens ---
+
+    def _split(self, messages, budget):
+        """Índice desde el que los mensajes (los más recientes) caben en 'budget'."""
+        used = 0
+        start = len(messages)
+        for index in range(len(messages) - 1, -1, -1):
+            used += estimate_tokens(messages[index]['text'])
+            if used > budget and len(messages) - index > self.min_recent:
+                break
+            start = index
+        return start
+
+    def history(self, conversation_id):
+        """
+        Historial para el modelo ([{'sender', 'text'}]): el resumen (si hay) como
+        primer mensaje y después los mensajes recientes que caben en el presupuesto.
+        """
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                return []
+            summary = conversation['summary']
+            messages = list(conversation['messages'])
+        budget = self.token_budget
+        history = []
+        if summary:
+            history.append({'sender': 'bot', 'text': f"Resumen de la conversación anterior: {summary}"})
+            budget -= estimate_tokens(history[0]['text'])
+        return history + messages[self._split(messages, max(0, budget)):]
+
+    def needs_compaction(self, conversation_id):
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is None:
+                return False
+            tokens = estimate_tokens(conversation['summary']) + sum(estimate_tokens(m['text'])
+                                                                    for m in conversation['messages'])
+            return tokens > self.token_budget and len(conversation['messages']) > self.min_recent
+
+    def compact(self, conversation_id):
+        """
+        Resume los mensajes que ya no caben en la mitad del presupuesto y los quita
+        del historial (cada mensaje se resume una sola vez). Devuelve True si resumió.
+        """
+        if self._summarize is None:
+            return False
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                return False
+            messages = conversation['messages']
+            # Se deja margen (mitad del presupuesto) para no resumir en cada turno
+            cut = self._split(messages, self.token_budget // 2)
+            if cut == 0:
+                return False
+            old_messages = messages[:cut]
+            previous_summary = conversation['summary']
+
+        summary = self._summarize(previous_summary, old_messages)
+
+        def apply(conversation):
+            if conversation['summary'] != previous_summary or conversation['messages'][:cut] != old_messages:
+                return False  # Cambió mientras se resumía: se reintentará en otro turno
+            conversation['summary'] = summary
+            conversation['messages'] = conversation['messages'][cut:]
+
+        with self._lock:
+            if not self._update(conversation_id, apply):
+                return False
+            self.summaries += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_memory': len(self._conversations),
+                'persistent': self._backend is not None,
+                'summaries': self.summaries,
+            }
@@ -4,18 +4,49 @@
 # 2. Manejar la lógica de las rutas de /api/products (GET, POST).
 # 3. Proveer la función 'get_product_info' como herramienta para la IA.
 # --- [MEJORA] ---
-# - 'get_product_info' usa Full-Text Search (fts).
+# - 'get_product_info' busca en un índice invertido en memoria ('search_index'):
+#   sin acentos, con stemming y tolerante a errores de tipeo.
 # - [NUEVO] Se añadió la herramienta 'list_products_by_category'
 #   para que la IA pueda responder a "¿Qué productos tienes?".
+# - [NUEVO] 'supabase_request' reutiliza conexiones a través de 'supabase_client'
+#   (pool keep-alive por clave, reintentos con jitter y circuit breaker).
+# - [NUEVO] GET /api/products se sirve desde 'catalog' (caché en memoria) y las
+#   acciones del admin la parchean o invalidan al escribir.
+# - [NUEVO] GET /api/products soporta ETag / If-None-Match (304 Not Modified).
+# - [NUEVO] GET /api/products acepta paginación por cursor, proyección ('fields')
+#   y filtros (categoría, precio, orden, búsqueda), resueltos en 'catalog_query'.
+# - [NUEVO] 'list_products_by_category' y GET /api/categories leen las tablas
+#   precalculadas de 'category_index' (sin I/O, categoría normalizada).
+# - [NUEVO] Importación en streaming (NDJSON/CSV) por lotes en segundo plano,
+#   con progreso consultable en /api/products/import/<job_id>.
+# - [NUEVO] Importación 'delta' (mode='delta'): envía solo las filas nuevas o
+#   cambiadas, devuelve el diff y admite 'dry_run' para previsualizar.
+# - [NUEVO] Las imágenes subidas se guardan por hash de contenido ('media_storage'),
+#   deduplicadas y servidas como URLs inmutables en /media/.
+# - [NUEVO] Derivados AVIF/WebP de cada imagen ('image_pipeline') generados en
+#   segundo plano; GET /api/products incluye 'image_srcset' cuando están listos.
+# - [NUEVO] 'get_product_info' guarda sus resultados unos segundos ('tool_cache')
+#   y agrupa las consultas idénticas simultáneas (single-flight). La caché se
+#   invalida desde los listeners del catálogo, así que cualquier cambio (admin,
+#   importación, recarga) la alcanza sin llamadas manuales.
 
-import os
 import json
+import hashlib
 import requests
-from flask import jsonify, url_for
-from werkzeug.utils import secure_filename
+from flask import jsonify, url_for, current_app
 
 # Importamos la configuración (SUPABASE_URL, KEYS, etc.)
 from app.config import Config
+from app.supabase_client import get_supabase_client
+from app.catalog_cache import CatalogCache
+from app import catalog_query
+from app.search_index import ProductSearchIndex, tokenize
+from app.category_index import CategoryIndex
+from app.import_jobs import ImportJobRunner, SQLiteImportJobBackend, detect_format, spool_upload
+from app.catalog_diff import diff_catalog
+from app.media_storage import store_upload
+from app.image_pipeline import ImagePipeline
+from app.tool_cache import ToolResultCache
 
 # ======================================================
 # 1. FUNCIONES HELPER (SUPABASE Y JSON)
@@ -28,28 +59,19 @@ def fail(message, code=400):
     return jsonify({'success': False, 'message': message}), code
 
 def supabase_request(method, endpoint, body=None, use_service_key=False, custom_headers=None):
-    """Función centralizada para realizar peticiones a la API REST de Supabase."""
+    """
+    Función centralizada para realizar peticiones a la API REST de Supabase.
+    Usa el cliente compartido (pool keep-alive, reintentos y circuit breaker).
+    """
     
     key = Config.SUPABASE_SERVICE_KEY if use_service_key else Config.SUPABASE_ANON_KEY
     if not key:
         raise Exception("Clave de Supabase (SERVICE o ANON) no disponible.")
 
-    url = f"{Config.SUPABASE_URL}/rest/v1/{Config.SUPABASE_TABLE}{endpoint}"
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'apikey': key,
-        'Authorization': f'Bearer {key}'
-    }
-
-    if custom_headers:
-        headers.update(custom_headers)
-
     try:
-        if body and method != 'GET':
-            response = requests.request(method, url, headers=headers, json=body, timeout=15)
-        else:
-            response = requests.request(method, url, headers=headers, timeout=15)
+        response = get_supabase_client().request(method, endpoint, body=body,
+                                                 use_service_key=use_service_key,
+                                                 custom_headers=custom_headers)
         
         response.raise_for_status()
         
@@ -75,33 +97,266 @@ def supabase_request(method, endpoint, body=None, use_service_key=False, custom_
 # 2. LÓGICA DE RUTAS (/api/products)
 # ======================================================
 
-def handle_products_get():
-    """Maneja la lógica para peticiones GET a /api/products."""
+def _load_catalog_rows():
+    """Carga el catálogo completo desde Supabase (usado por la caché)."""
+    return supabase_request('GET', '?select=*&order=name.asc')
+
+# Derivados de imagen (miniatura / detalle / 2x) generados por un pool de workers
+image_pipeline = ImagePipeline(Config.UPLOAD_FOLDER, max_workers=Config.IMAGE_WORKERS,
+                               enabled=Config.IMAGE_PIPELINE_ENABLED)
+
+# Catálogo en memoria compartido por las rutas y las herramientas de IA
+catalog = CatalogCache(_load_catalog_rows, ttl=Config.CATALOG_CACHE_TTL, enrich=image_pipeline.enrich)
+
+def _on_image_derivatives_ready(digest):
+    """Re-procesa los productos que usan la imagen para que publiquen su 'image_srcset'."""
+    affected = []
+    for product in catalog.get_products():
+        path = image_pipeline.local_path_for_url(product.get('image'))
+        if path and image_pipeline.content_hash(path) == digest:
+            affected.append({'id': product['id']})
+    if affected:
+        catalog.upsert(affected)
+
+image_pipeline.subscribe(_on_image_derivatives_ready)
+
+# Índice de búsqueda derivado del catálogo (se actualiza con cada cambio)
+search_index = ProductSearchIndex()
+catalog.subscribe(search_index.on_catalog_change)
+
+# Tablas categoría -> nombres / cantidad, también derivadas del catálogo
+category_index = CategoryIndex()
+catalog.subscribe(category_index.on_catalog_change)
+
+# Resultados recientes de 'get_product_info' (clave = nombre normalizado)
+product_info_cache = ToolResultCache(ttl=Config.TOOL_CACHE_TTL, max_entries=Config.TOOL_CACHE_SIZE)
+
+def _invalidate_tool_cache(event, payload):
+    """
+    Listener del catálogo (corre con su lock tomado). Un producto eliminado solo
+    afecta a los resultados que lo mostraban; uno nuevo o cambiado puede coincidir
+    con cualquier búsqueda, así que se borra todo.
+    """
+    if event == 'remove':
+        for product_id in payload:
+            product_info_cache.invalidate(product_id)
+    else:
+        product_info_cache.invalidate()
+
+catalog.subscribe(_invalidate_tool_cache)
+
+def generate_image_derivatives():
+    """Genera los derivados de todas las imágenes locales del catálogo y espera a que terminen."""
+    if not image_pipeline.enabled:
+        print("⚠️ El pipeline de imágenes está deshabilitado.")
+        return
+    digests = image_pipeline.process_all(p.get('image') for p in catalog.get_products())
+    print(f"[Media] Procesando {len(set(digests))} imágenes locales...")
+    image_pipeline.wait()
+    print("✅ Derivados de imagen al día.")
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'si', 'sí', 'yes')
+    return bool(value)
+
+def build_import_payload(product):
+    """Valida un producto a importar (JSON, NDJSON o CSV) y lo convierte a fila de Supabase."""
+    missing = [f for f in ('id', 'name', 'price', 'category', 'description', 'image') if product.get(f) in (None, '')]
+    if missing:
+        raise ValueError(f"Faltan campos obligatorios: {', '.join(missing)}.")
+    ingredients = product.get('ingredients') or []
+    if isinstance(ingredients, str):
+        # En CSV los ingredientes pueden venir separados por '|' o por ','
+        ingredients = ingredients.replace('|', ',').split(',')
     try:
-        endpoint = '?select=*&order=name.asc'
-        products = supabase_request('GET', endpoint)
-        processed_products = []
-        for product in products:
-            product['ingredients'] = product.get('ingredients', '').split(',') if product.get('ingredients') else []
-            product['featured'] = bool(product.get('featured', False)) 
-            processed_products.append(product)
-        return jsonify({'success': True, 'products': processed_products})
+        return {
+            'id': int(product['id']) if str(product['id']).isdigit() else product['id'],
+            'name': product['name'],
+            'price': float(product['price']),
+            'category': product['category'],
+            'stock': int(product['stock']) if product.get('stock') not in (None, '') else 10,
+            'featured': _parse_bool(product.get('featured', False)),
+            'description': product['description'],
+            'ingredients': ','.join(str(i).strip() for i in ingredients if str(i).strip()),
+            'image': product['image']
+        }
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Valor inválido: {e}")
+
+def _upsert_import_batch(payloads):
+    """Envía un lote de la importación en streaming (sin devolver las filas)."""
+    custom_headers = {'Prefer': 'resolution=merge-duplicates,return=minimal'}
+    supabase_request('POST', '?on_conflict=id', payloads, use_service_key=True, custom_headers=custom_headers)
+
+# Importaciones en streaming (NDJSON / CSV) ejecutadas en segundo plano
+import_runner = ImportJobRunner(
+    build_import_payload,
+    _upsert_import_batch,
+    on_finished=lambda job: catalog.invalidate(),
+    batch_size=Config.IMPORT_BATCH_SIZE,
+    max_in_flight=Config.IMPORT_MAX_IN_FLIGHT,
+    backend=SQLiteImportJobBackend(Config.IMPORT_JOBS_DB_PATH) if Config.IMPORT_JOBS_DB_PATH else None
+)
+
+def _sync_catalog(result):
+    """Parchea la caché con las filas devueltas por Supabase (o la invalida si no hay)."""
+    if isinstance(result, list) and all(isinstance(row, dict) and 'id' in row for row in result):
+        catalog.upsert(result)
+    else:
+        catalog.invalidate()
+
+def handle_products_get(request):
+    """
+    Maneja la lógica para peticiones GET a /api/products (servido desde memoria).
+    Envía ETag/Last-Modified y responde 304 si el cliente ya tiene la versión actual.
+    Con parámetros (limit, cursor, fields, category, min_price, max_price, sort, q)
+    devuelve solo una página y el 'next_cursor' para pedir la siguiente.
+    """
+    try:
+        payload, etag, last_modified = catalog.get_snapshot()
+
+        if catalog_query.is_paged_request(request.args):
+            try:
+                query = catalog_query.parse_query(request.args)
+            except ValueError as e:
+                return fail(str(e), 400)
+            products, next_cursor = catalog_query.query_products(catalog, query)
+            payload = json.dumps({'success': True, 'products': products, 'next_cursor': next_cursor},
+                                 ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            # El ETag de una página depende del catálogo y de la query exacta
+            canonical_query = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+            etag = hashlib.sha256(f"{etag}?{canonical_query}".encode('utf-8')).hexdigest()[:32]
+
+        response = current_app.response_class(payload, mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        # El navegador puede guardar la respuesta, pero debe revalidarla siempre.
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         print(f"Error GET products: {e}")
         return fail(f"Error al cargar productos: {e}", 500)
 
+def handle_categories_get(request):
+    """Maneja GET /api/categories: cantidad de productos por categoría (desde memoria)."""
+    try:
+        products = catalog.get_products()
+        _, etag, last_modified = catalog.get_snapshot()
+        counts = category_index.counts()
+        response = jsonify({
+            'success': True,
+            'categories': [{'category': c, 'count': n} for c, n in counts.items()],
+            'total': len(products)
+        })
+        response.set_etag(hashlib.sha256(f"{etag}:categories".encode('utf-8')).hexdigest()[:32])
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except Exception as e:
+        print(f"Error GET categories: {e}")
+        return fail(f"Error al cargar categorías: {e}", 500)
+
+def handle_streaming_import(stream, fmt):
+    """Vuelca la subida a disco, lanza el job de importación y responde 202 con su ID."""
+    try:
+        path = spool_upload(stream, Config.IMPORT_MAX_BYTES)
+    except Exception as e:
+        return fail(str(e), 400)
+    job = import_runner.start(path, fmt)
+    print(f"[Import] Job {job.id[:8]} creado ({fmt}).")
+    response = jsonify({
+        'success': True,
+        'message': 'Importación en curso.',
+        'job_id': job.id,
+        'status_url': url_for('import_status_handler', job_id=job.id)
+    })
+    return response, 202
+
+def handle_import_status(job_id):
+    """Devuelve el progreso y los errores de una importación en streaming."""
+    status = import_runner.status(job_id)
+    if not status:
+        return fail("Importación no encontrada.", 404)
+    return jsonify({'success': True, **status})
+
+def handle_delta_import(payloads, dry_run=False, prune=False):
+    """
+    Importación 'delta': compara contra el catálogo actual y envía a Supabase solo
+    las filas nuevas o cambiadas. Con 'dry_run' solo devuelve el diff; con 'prune'
+    también elimina los productos que no vienen en la importación.
+    """
+    # El diff se calcula contra el estado real de Supabase (no contra la caché, que
+    # puede servir una versión anterior si la recarga falla): sin él no se importa
+    try:
+        current = _load_catalog_rows()
+    except Exception as e:
+        print(f"Error al leer el catálogo para la importación delta: {e}")
+        return fail(f"No se pudo leer el catálogo actual; importación cancelada: {e}", 503)
+    if not isinstance(current, list):
+        return fail("Respuesta inesperada de Supabase al leer el catálogo; importación cancelada.", 502)
+    diff = diff_catalog(payloads, current)
+    summary = {k: len(diff[k]) for k in ('inserted', 'changed', 'unchanged', 'removed')}
+    response = {
+        'success': True,
+        'mode': 'delta',
+        'dry_run': dry_run,
+        'prune': prune,
+        'summary': summary,
+        'inserted': diff['inserted'],
+        'changed': diff['changed'],
+        'removed': diff['removed'],
+    }
+
+    if dry_run:
+        response['message'] = (f"Vista previa: {summary['inserted']} nuevos, {summary['changed']} cambiados, "
+                               f"{summary['unchanged']} sin cambios, {summary['removed']} no incluidos.")
+        return jsonify(response)
+
+    if diff['rows_to_upsert']:
+        custom_headers = {'Prefer': 'resolution=merge-duplicates,return=representation'}
+        result = supabase_request('POST', '?on_conflict=id', diff['rows_to_upsert'],
+                                  use_service_key=True, custom_headers=custom_headers)
+        _sync_catalog(result)
+
+    deleted = 0
+    if prune and diff['removed']:
+        ids = ','.join(str(product_id) for product_id in diff['removed'])
+        supabase_request('DELETE', f"?id=in.({ids})", None, use_service_key=True)
+        catalog.remove(diff['removed'])
+        deleted = len(diff['removed'])
+
+    response['count'] = len(diff['rows_to_upsert'])
+    response['message'] = (f"{summary['inserted']} nuevos y {summary['changed']} actualizados "
+                           f"({summary['unchanged']} sin cambios"
+                           + (f", {deleted} eliminados)." if prune else ")."))
+    return jsonify(response)
+
 def handle_products_post(request):
     """Maneja la lógica para peticiones POST a /api/products (Create, Update, Delete, Import)."""
     
     data = {}
     action = None
+    content_type = request.content_type or ''
+
+    # Importación en streaming: cuerpo NDJSON o CSV crudo
+    stream_format = detect_format(content_type)
+    if stream_format:
+        return handle_streaming_import(request.stream, stream_format)
     
-    if request.content_type.startswith('application/json'):
+    if content_type.startswith('application/json'):
         data = request.json
         action = data.get('action')
-    elif request.content_type.startswith('multipart/form-data'):
+    elif content_type.startswith('multipart/form-data'):
         data = request.form.to_dict()
         action = data.get('action')
+        # Importación en streaming: archivo NDJSON / CSV subido como 'importFile'
+        import_file = request.files.get('importFile')
+        if action == 'import' and import_file and import_file.filename:
+            file_format = detect_format(import_file.mimetype, import_file.filename)
+            if not file_format:
+                return fail("Formato de importación no soportado. Usar NDJSON o CSV.", 415)
+            return handle_streaming_import(import_file.stream, file_format)
     else:
         try:
             data = request.json
@@ -118,10 +373,11 @@ def handle_products_post(request):
             if 'productImageFile' in request.files:
                 file = request.files['productImageFile']
                 if file and file.filename != '':
-                    filename = secure_filename(file.filename)
-                    unique_name = f"prod_{os.urandom(4).hex()}-{filename}"
-                    file.save(os.path.join(Config.UPLOAD_FOLDER, unique_name))
-                    image_url = url_for('static', filename=f'uploads/{unique_name}', _external=True)
+                    # Guardado por hash de contenido: subidas repetidas reutilizan el mismo archivo
+                    key, is_new = store_upload(file, Config.UPLOAD_FOLDER)
+                    print(f"[Media] Imagen {'guardada' if is_new else 'deduplicada'}: {key}")
+                    image_pipeline.submit(image_pipeline.local_path_for_url(f"/media/{key}"))
+                    image_url = url_for('media_handler', filename=key, _external=True)
             
             if not image_url:
                  raise Exception("Debes proporcionar una imagen (subir archivo o URL).")
@@ -138,8 +394,10 @@ def handle_products_post(request):
                 'ingredients': ','.join(ingredients_list),
                 'image': image_url
             }
-            endpoint = '?select=id'
-            result = supabase_request('POST', endpoint, [payload], use_service_key=True)
+            endpoint = '?select=*'
+            custom_headers = {'Prefer': 'return=representation'}
+            result = supabase_request('POST', endpoint, [payload], use_service_key=True, custom_headers=custom_headers)
+            _sync_catalog(result)
             return jsonify({'success': True, 'message': 'Producto creado exitosamente.', 'new_id': result[0]['id']})
         
         elif action == 'update':
@@ -164,7 +422,9 @@ def handle_products_post(request):
                 raise Exception("No se proporcionaron datos para actualizar.")
 
             endpoint = f"?id=eq.{product_id}"
-            supabase_request('PATCH', endpoint, payload, use_service_key=True)
+            custom_headers = {'Prefer': 'return=representation'}
+            result = supabase_request('PATCH', endpoint, payload, use_service_key=True, custom_headers=custom_headers)
+            _sync_catalog(result)
             return jsonify({'success': True, 'message': 'Producto actualizado.'})
 
         elif action == 'delete':
@@ -173,6 +433,7 @@ def handle_products_post(request):
                 raise Exception("Falta ID para eliminar.")
             endpoint = f"?id=eq.{product_id}"
             supabase_request('DELETE', endpoint, None, use_service_key=True)
+            catalog.remove([product_id])
             return jsonify({'success': True, 'message': 'Producto eliminado.'})
         
         elif action == 'import':
@@ -180,23 +441,16 @@ def handle_products_post(request):
             if not products_to_import:
                 raise Exception("No se encontraron productos para importar.")
             
-            payloads = []
-            for product in products_to_import:
-                payloads.append({
-                    'id': product['id'],
-                    'name': product['name'],
-                    'price': float(product['price']),
-                    'category': product['category'],
-                    'stock': int(product.get('stock', 10)),
-                    'featured': bool(product.get('featured', False)),
-                    'description': product['description'],
-                    'ingredients': ','.join(product.get('ingredients', [])),
-                    'image': product['image']
-                })
+            payloads = [build_import_payload(product) for product in products_to_import]
+
+            if data.get('mode') == 'delta':
+                return handle_delta_import(payloads, dry_run=_parse_bool(data.get('dry_run', False)),
+                                           prune=_parse_bool(data.get('prune', False)))
             
             endpoint = '?on_conflict=id'
-            custom_headers = {'Prefer': 'resolution=merge-duplicates'}
-            supabase_request('POST', endpoint, payloads, use_service_key=True, custom_headers=custom_headers)
+            custom_headers = {'Prefer': 'resolution=merge-duplicates,return=representation'}
+            result = supabase_request('POST', endpoint, payloads, use_service_key=True, custom_headers=custom_headers)
+            _sync_catalog(result)
             return jsonify({'success': True, 'message': f"{len(payloads)} productos importados/actualizados.", 'count': len(payloads)})
         
         else:
@@ -210,34 +464,46 @@ def handle_products_post(request):
 # 3. HERRAMIENTAS DE IA (Acceso a BD)
 # ======================================================
 
+# Un resultado entra en la respuesta si su puntaje es al menos este % del mejor
+SEARCH_RELATIVE_CUTOFF = 0.6
+
+def _lookup_product_info(product_name: str):
+    """Búsqueda real de 'get_product_info'. Devuelve (json, ids de los productos mostrados)."""
+    results = search_index.search(product_name, limit=10)
+    
+    if not results:
+        return json.dumps({"action": "info", "message": f"Lo siento, no pude encontrar un producto que coincida con '{product_name}'. ¿Puedes intentarlo de nuevo?"}), ()
+    
+    # Nos quedamos con los resultados cercanos al mejor puntaje
+    best_score = results[0][0]
+    products = [p for score, p in results if score >= best_score * SEARCH_RELATIVE_CUTOFF]
+    product_ids = [p.get('id') for p in products]
+
+    if len(products) > 3:
+         nombres = [p['name'] for p in products[:3]]
+         return json.dumps({"action": "info", "message": f"Encontré varios productos: {', '.join(nombres)}... ¿A cuál te refieres?"}), product_ids
+
+    responses = []
+    for p in products:
+        if (p.get('stock') or 0) > 0:
+            responses.append(f"El producto '{p['name']}' cuesta ${p['price']} y tenemos {p['stock']} unidades disponibles.")
+        else:
+            responses.append(f"El producto '{p['name']}' cuesta ${p['price']} pero está agotado temporalmente.")
+    
+    message = " ".join(responses)
+    return json.dumps({"action": "info", "message": message}), product_ids
+
 def get_product_info(product_name: str) -> str:
     """
-    [HERRAMIENTA DE IA] Consulta Supabase para obtener el stock y precio
-    de un producto específico.
+    [HERRAMIENTA DE IA] Consulta el stock y precio de un producto específico
+    usando el índice de búsqueda en memoria (tolera acentos y errores de tipeo).
     """
     print(f"[Tool Call - DB] Buscando stock para: {product_name}")
+    key = ' '.join(tokenize(product_name)) or str(product_name).strip().casefold()
     try:
-        search_term = product_name.replace(" ", " & ")
-        endpoint = f"?select=name,stock,price&name=fts(es).{search_term}"
-        products = supabase_request('GET', endpoint)
-        
-        if not products:
-            return json.dumps({"action": "info", "message": f"Lo siento, no pude encontrar un producto que coincida con '{product_name}'. ¿Puedes intentarlo de nuevo?"})
-        
-        if len(products) > 3:
-             nombres = [p['name'] for p in products[:3]]
-             return json.dumps({"action": "info", "message": f"Encontré varios productos: {', '.join(nombres)}... ¿A cuál te refieres?"})
-
-        responses = []
-        for p in products:
-            if p['stock'] > 0:
-                responses.append(f"El producto '{p['name']}' cuesta ${p['price']} y tenemos {p['stock']} unidades disponibles.")
-            else:
-                responses.append(f"El producto '{p['name']}' cuesta ${p['price']} pero está agotado temporalmente.")
-        
-        message = " ".join(responses)
-        return json.dumps({"action": "info", "message": message})
-
+        # Primero el catálogo: si toca recargarlo, su listener vacía la caché antes de leerla
+        catalog.get_products()
+        return product_info_cache.get_or_compute(key, lambda: _lookup_product_info(product_name))
     except Exception as e:
         print(f"Error en get_product_info: {e}")
         return json.dumps({"action": "error", "message": "Tuve un problema al consultar la base de datos."})
@@ -250,23 +516,15 @@ def list_products_by_category(category: str) -> str:
     """
     print(f"[Tool Call - DB] Listando productos para: {category}")
     try:
-        endpoint = "?select=name" # Solo necesitamos los nombres
+        catalog.get_products()  # Asegura que el catálogo (y sus tablas) estén cargados
+        category_clean = category_index.resolve(category)
+        product_names = category_index.names(category_clean) if category_clean else []
         
-        category_clean = category.lower().strip()
-        
-        if category_clean != 'all' and category_clean != 'todos':
-            # Filtra por la categoría solicitada (ej. 'jabones')
-            endpoint += f"&category=eq.{category_clean}"
-        
-        products = supabase_request('GET', endpoint)
-        
-        if not products:
+        if not product_names:
             return json.dumps({"action": "info", "message": f"Lo siento, no encontré productos en la categoría '{category}'."})
 
-        product_names = [p['name'] for p in products]
-        
         message_intro = ""
-        if category_clean == 'all' or category_clean == 'todos':
+        if category_clean == 'all':
             message_intro = "Claro, aquí tienes algunos de nuestros productos principales:"
         else:
             message_intro = f"Claro, aquí tienes nuestros productos en la categoría '{category_clean}':"
@@ -281,4 +539,4 @@ def list_products_by_category(category: str) -> str:
 
     except Exception as e:
         print(f"Error en list_products_by_category: {e}")
-        return json.dumps({"action": "error", "message": "Tuve un problema al listar los productos."})
\ No newline at end of file
+        return json.dumps({"action": "error", "message": "Tuve un problema al listar los productos."})
@@ -0,0 +1,76 @@
+# /home/genichurro/Documentos/v2/IA/app/deadline.py
+# --- RESPONSABILIDAD ---
+# 1. Plazo total por petición ('Deadline'): se crea al entrar en el handler del
+#    chat y cada etapa (clasificar, LLM local, Gemini, herramientas, Supabase)
+#    usa solo el tiempo que queda, en lugar de sumar sus timeouts fijos.
+# 2. Propagar el plazo sin cambiar las firmas de las herramientas: viaja en un
+#    'ContextVar' ('deadline_scope') y se copia a los hilos de los pools con
+#    'submit_in_context'.
+# 3. 'stage_timeout': timeout de una etapa = min(su tope, lo que queda); si ya
+#    no queda tiempo útil lanza 'DeadlineExceeded' sin hacer I/O.
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+# Por debajo de esto no merece la pena empezar una llamada de red
+MIN_STAGE_TIMEOUT = 0.05
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Se lanza cuando una etapa ya no tiene tiempo dentro del plazo de la petición."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        super().__init__(f"Plazo de la petición agotado antes de '{stage}'.")
+
+
+class Deadline:
+    """Instante límite (reloj monotónico) de una petición."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        """True si ya no queda tiempo útil para otra etapa."""
+        return self.remaining() < MIN_STAGE_TIMEOUT
+
+
+def current_deadline():
+    """Plazo de la petición en curso (None fuera de una petición con plazo)."""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Activa 'deadline' para el código del bloque (y lo que se lance con 'submit_in_context')."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def stage_timeout(cap, stage):
+    """
+    Timeout para una etapa: 'cap' (None = sin tope propio) recortado a lo que
+    queda del plazo. Sin plazo activo devuelve 'cap'.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return cap
+    if deadline.expired():
+        raise DeadlineExceeded(stage)
+    remaining = deadline.remaining()
+    return remaining if cap is None else min(cap, remaining)
+
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """Como 'executor.submit', pero la tarea ve el contexto (plazo incluido) de quien la lanza."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
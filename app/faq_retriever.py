@@ -0,0 +1,228 @@
+# /home/genichurro/Documentos/v2/IA/app/faq_retriever.py
+# --- RESPONSABILIDAD ---
+# 1. Responder preguntas frecuentes ('simple_question') SIN LLM: un índice BM25
+#    sobre un corpus curado (quiénes somos, contacto, cómo comprar...) y sobre
+#    los productos del catálogo (descripción e ingredientes).
+# 2. Devolver el mejor pasaje solo si la confianza supera un umbral; si no, el
+#    enrutador sigue con el LLM local como hasta ahora.
+# 3. Mantener la parte del catálogo al día como listener de 'CatalogCache'
+#    (mismo contrato que 'search_index' y 'category_index').
+# --- NOTA ---
+# La confianza combina la cobertura (fracción de términos de la pregunta que
+# aparecen en el pasaje) y la separación con el segundo mejor pasaje: una
+# pregunta que encaja igual de bien con dos respuestas se deja al LLM.
+
+import json
+import math
+import threading
+from collections import defaultdict
+
+from app.search_index import FIELD_WEIGHTS, stem, tokenize
+
+# Parámetros BM25 (los mismos que el buscador de productos)
+_K1 = 1.2
+_B = 0.75
+
+# Peso de cada campo de una entrada del FAQ
+FAQ_WEIGHTS = {'questions': 2.0, 'answer': 1.0}
+
+# Interrogativos y verbos de relleno que no aportan al "de qué" trata la pregunta
+QUESTION_WORDS = {stem(w) for w in ('como', 'cual', 'cuales', 'donde', 'cuando', 'quien', 'quienes',
+                                    'tiene', 'tienen', 'lleva', 'llevan', 'contiene', 'contienen')}
+
+# Corpus curado (datos de la propia tienda). Se puede ampliar con FAQ_PATH.
+FAQ_ENTRIES = [
+    {
+        'id': 'herbia',
+        'questions': ["¿Quién eres?", "¿Qué eres?", "¿Cómo te llamas?", "¿Eres un bot?", "¿Qué puedes hacer?"],
+        'answer': "Soy herbIA, el asistente virtual de Bo's Beauty. Puedo ayudarte a encontrar productos, "
+                  "consultar precio y stock, llevarte a cualquier sección de la tienda y gestionar tu carrito.",
+    },
+    {
+        'id': 'empresa',
+        'questions': ["¿Quiénes son?", "¿Qué es Bo's Beauty?", "Sobre nosotros", "¿A qué se dedican?"],
+        'answer': "En Bo's Beauty creemos en el poder de la naturaleza para realzar tu belleza natural. "
+                  "Nuestros productos se elaboran a mano con ingredientes orgánicos de la más alta calidad.",
+    },
+    {
+        'id': 'natural',
+        'questions': ["¿Los productos son naturales?", "¿Son 100% naturales?", "¿Usan ingredientes orgánicos?",
+                      "¿Los ingredientes están certificados?"],
+        'answer': "Sí. Todos nuestros productos son 100% naturales, con ingredientes orgánicos certificados.",
+    },
+    {
+        'id': 'artesanal',
+        'questions': ["¿Son hechos a mano?", "¿Son artesanales?", "¿Cómo elaboran los productos?"],
+        'answer': "Cada producto se elabora artesanalmente, a mano, con amor y dedicación: "
+                  "cada uno es único y respeta tu piel y el medio ambiente.",
+    },
+    {
+        'id': 'cruelty_free',
+        'questions': ["¿Testean en animales?", "¿Son cruelty free?", "¿Prueban los productos en animales?"],
+        'answer': "Somos Cruelty Free: ninguno de nuestros productos se testea en animales.",
+    },
+    {
+        'id': 'contacto',
+        'questions': ["¿Cómo los contacto?", "¿Cuál es su correo?", "¿Tienen email?", "¿Cuál es su teléfono?",
+                      "Número de teléfono"],
+        'answer': "Puedes escribirnos a info@bosbeauty.com, llamarnos al +34 123 456 789 "
+                  "o usar el formulario de la sección Contacto.",
+    },
+    {
+        'id': 'ubicacion',
+        'questions': ["¿Dónde están?", "¿Dónde están ubicados?", "¿Cuál es su dirección?", "¿De dónde son?"],
+        'answer': "Estamos en Barcelona, España.",
+    },
+    {
+        'id': 'comprar',
+        'questions': ["¿Cómo compro?", "¿Cómo hago un pedido?", "¿Cómo funciona el carrito?", "¿Cómo pago?"],
+        'answer': "Añade los productos al carrito desde el catálogo (o pídemelo, por ejemplo: "
+                  "«agrega el jabón de miel al carrito») y pulsa «Proceder al Pago» en el carrito.",
+    },
+]
+
+
+def load_faq_file(path):
+    """Entradas extra del FAQ desde un JSON: [{"id", "questions": [...], "answer"}]."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        return [e for e in entries if e.get('id') and e.get('answer')]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"⚠️ No se pudo leer el FAQ extra '{path}': {e}")
+        return []
+
+
+def product_passage(product):
+    """Texto con el que se responde sobre un producto (descripción + ingredientes)."""
+    name = product.get('name') or 'Este producto'
+    text = f"{name}: {product.get('description')}" if product.get('description') else name
+    ingredients = product.get('ingredients') or []
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(',')
+    ingredients = [str(i).strip() for i in ingredients if str(i).strip()]
+    if ingredients:
+        text = f"{text.rstrip('.')}. Ingredientes: {', '.join(ingredients)}."
+    return text
+
+
+class FAQRetriever:
+    """Índice BM25 de pasajes (FAQ + catálogo) con una medida de confianza."""
+
+    def __init__(self, entries=(), threshold=0.6):
+        self.threshold = threshold
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)   # término -> {id: frecuencia ponderada}
+        self._doc_terms = {}                 # id -> {término: frecuencia ponderada}
+        self._doc_len = {}
+        self._answers = {}                   # id -> texto de la respuesta
+        self._total_len = 0.0
+        for entry in entries:
+            self._index(f"faq:{entry['id']}", {
+                'questions': ' '.join(entry.get('questions', [])),
+                'answer': entry['answer'],
+            }, FAQ_WEIGHTS, entry['answer'])
+
+    # --- Mantenimiento del índice ---
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        self._answers.pop(doc_id, None)
+
+    def _index(self, doc_id, fields, weights, answer):
+        self._remove(doc_id)
+        terms = defaultdict(float)
+        for field, value in fields.items():
+            for term in tokenize(value):
+                terms[term] += weights[field]
+        if not terms:
+            return
+        for term, weight in terms.items():
+            self._postings[term][doc_id] = weight
+        self._doc_terms[doc_id] = dict(terms)
+        self._doc_len[doc_id] = sum(terms.values())
+        self._answers[doc_id] = answer
+        self._total_len += self._doc_len[doc_id]
+
+    def _index_product(self, product):
+        ingredients = product.get('ingredients') or []
+        if isinstance(ingredients, str):
+            ingredients = [ingredients]
+        self._index(f"product:{product.get('id')}", {
+            'name': product.get('name'),
+            'category': product.get('category'),
+            'ingredients': ' '.join(['ingredientes'] + [str(i) for i in ingredients]) if ingredients else '',
+            'description': product.get('description'),
+        }, FIELD_WEIGHTS, product_passage(product))
+
+    def on_catalog_change(self, event, payload):
+        """Listener de CatalogCache: 'replace' (lista), 'upsert' (lista) o 'remove' (ids)."""
+        with self._lock:
+            if event == 'replace':
+                new_ids = {f"product:{p.get('id')}" for p in payload}
+                for doc_id in [d for d in self._doc_terms if d.startswith('product:')]:
+                    if doc_id not in new_ids:
+                        self._remove(doc_id)
+                for product in payload:
+                    self._index_product(product)
+            elif event == 'upsert':
+                for product in payload:
+                    self._index_product(product)
+            elif event == 'remove':
+                for product_id in payload:
+                    self._remove(f"product:{product_id}")
+
+    # --- Búsqueda ---
+
+    def search(self, query, limit=5):
+        """Devuelve [(puntaje, id)] ordenados de mayor a menor (BM25)."""
+        query_terms = [t for t in dict.fromkeys(tokenize(query)) if t not in QUESTION_WORDS]
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not query_terms or not n_docs:
+                return []
+            avg_len = (self._total_len / n_docs) or 1.0
+            scores = defaultdict(float)
+            for term in query_terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = tf + _K1 * (1 - _B + _B * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] += idf * tf * (_K1 + 1) / norm
+        ranked = sorted(((score, doc_id) for doc_id, score in scores.items()), key=lambda sd: -sd[0])
+        return ranked[:limit]
+
+    def answer(self, query, threshold=None):
+        """
+        Mejor pasaje para la pregunta: {'id', 'response', 'score', 'confidence'}.
+        Devuelve None si no hay ninguno por encima del umbral de confianza
+        ('threshold' o, si no se indica, el del índice).
+        """
+        query_terms = [t for t in dict.fromkeys(tokenize(query)) if t not in QUESTION_WORDS]
+        ranked = self.search(query, limit=2)
+        if not ranked:
+            return None
+        best_score, best_id = ranked[0]
+        with self._lock:
+            doc_terms = self._doc_terms.get(best_id, {})
+            response = self._answers.get(best_id)
+        coverage = sum(1 for t in query_terms if t in doc_terms) / len(query_terms)
+        separation = 1.0 - (ranked[1][0] / best_score) if len(ranked) > 1 else 1.0
+        confidence = coverage * (0.5 + 0.5 * separation)
+        if confidence < (self.threshold if threshold is None else threshold) or not response:
+            return None
+        return {'id': best_id, 'response': response,
+                'score': round(best_score, 3), 'confidence': round(confidence, 3)}
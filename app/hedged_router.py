@@ -0,0 +1,389 @@
+# /home/genichurro/Documentos/v2/IA/app/hedged_router.py
+# --- RESPONSABILIDAD ---
+# 1. Enrutar cada mensaje del chat de forma concurrente en lugar de secuencial:
+#    - si el clasificador local duda, se arranca especulativamente el backend
+#      más probable MIENTRAS Gemini clasifica;
+#    - si el LLM local no responde dentro de su percentil de latencia, se lanza
+#      una petición "de cobertura" (hedge) a Gemini y gana la primera respuesta;
+#    - si el LLM local falla, se pasa a Gemini sin esperar a ningún timeout.
+# 2. Descartar (cancelar) las ramas perdedoras y reportar el camino y los tiempos.
+# 3. Antes de ir a un LLM, las preguntas simples prueban una respuesta instantánea
+#    opcional ('answer_instant', ej. el FAQ con BM25).
+# 4. Respetar el plazo de la petición ('deadline'): ninguna espera va más allá de
+#    lo que queda; si se agota, se cancelan las ramas pendientes y se responde
+#    con 'answer_degraded' en lugar de dejar que el proxy corte la conexión.
+# 5. 'AsyncHedgedRouter': la misma política con corrutinas (ruta ASGI); ahí las
+#    ramas perdedoras sí se cancelan de verdad (asyncio.Task.cancel).
+# --- NOTA ---
+# Una rama que ya está haciendo I/O no se puede interrumpir: se marca como
+# cancelada y su resultado se descarta (sí se registra su latencia).
+
+import asyncio
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.deadline import submit_in_context
+
+SIMPLE = 'simple_question'
+COMPLEX = 'complex_action'
+
+
+def is_success(result):
+    """Las funciones de respuesta devuelven un dict o, en errores, una tupla (dict, código)."""
+    return isinstance(result, dict) and bool(result.get('success'))
+
+
+class HedgedRouter:
+    """Clasifica y responde en paralelo con el LLM local y Gemini."""
+
+    def __init__(self, classify_local, classify_remote, answer_local, answer_remote,
+                 latency_tracker, confidence_threshold=0.75, hedge_percentile=0.9,
+                 hedge_default=1.5, hedge_min=0.3, hedge_max=5.0, max_workers=8,
+                 answer_instant=None, answer_degraded=None):
+        self._classify_local = classify_local     # prompt -> (intención, confianza, camino)
+        self._classify_remote = classify_remote   # prompt -> intención (Gemini)
+        self._answer_local = answer_local         # prompt -> dict
+        self._answer_remote = answer_remote       # (prompt, history) -> dict | (dict, código)
+        self._answer_instant = answer_instant     # prompt -> dict | None (sin red, sin LLM)
+        self._answer_degraded = answer_degraded   # (prompt, intención) -> dict (plazo agotado)
+        self.latency = latency_tracker            # LatencyTracker del LLM local
+        self.confidence_threshold = confidence_threshold
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default = hedge_default
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='router')
+
+    def hedge_delay(self):
+        """Segundos a esperar al LLM local antes de lanzar la cobertura a Gemini."""
+        delay = self.latency.percentile(self.hedge_percentile, default=self.hedge_default)
+        return min(self.hedge_max, max(self.hedge_min, delay))
+
+    # --- Ramas ---
+
+    def _run_local(self, prompt):
+        # La latencia se mide desde que la rama sale de la cola del pool, no desde el envío
+        started = time.perf_counter()
+        result = self._answer_local(prompt)
+        self.latency.record(time.perf_counter() - started, ok=is_success(result))
+        return result
+
+    def _start(self, branch, prompt, history, report):
+        started = time.perf_counter()
+        # Las ramas heredan el contexto (el plazo de la petición) de quien enruta
+        if branch == 'local':
+            future = submit_in_context(self._executor, self._run_local, prompt)
+        else:
+            future = submit_in_context(self._executor, self._answer_remote, prompt, history)
+        report['_started'][branch] = started
+        return future
+
+    def _finish(self, branch, report):
+        started = report['_started'].get(branch)
+        if started is not None:
+            report['timings_ms'][branch] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _cancel(self, branch, future, report):
+        if future is not None and not future.done():
+            future.cancel()
+            report['cancelled'].append(branch)
+
+    # --- Plazo ---
+
+    @staticmethod
+    def _time_left(deadline, cap=None):
+        if deadline is None:
+            return cap
+        return deadline.remaining() if cap is None else min(cap, deadline.remaining())
+
+    def _result(self, branch, future, deadline, report):
+        """Resultado de una rama esperando como mucho lo que queda del plazo (None si se agota)."""
+        done, _ = wait([future], timeout=self._time_left(deadline))
+        if not done:
+            self._cancel(branch, future, report)
+            return None
+        self._finish(branch, report)
+        return future.result()
+
+    def _expired(self, prompt, report):
+        print(f"⚠️ [AI Router] Plazo de la petición agotado ({report['intent']}): respuesta degradada.")
+        report['path'] = 'deadline'
+        report['deadline_exceeded'] = True
+        if self._answer_degraded is not None:
+            return self._answer_degraded(prompt, report['intent'])
+        return {'success': False, 'response': 'La respuesta tardó demasiado.'}, 504
+
+    # --- Decisiones compartidas por la versión con hilos y la de asyncio ---
+
+    @staticmethod
+    def _new_report():
+        return {'intent': None, 'intent_path': None, 'path': None, 'hedged': False,
+                'cancelled': [], 'timings_ms': {}, '_started': {}}
+
+    def _close_report(self, report, t0):
+        report['timings_ms']['total'] = round((time.perf_counter() - t0) * 1000, 1)
+        del report['_started']
+        return report
+
+    def _speculate(self, intent, prompt, history, report):
+        """Arranca el backend más probable mientras Gemini clasifica. Devuelve (local, remota)."""
+        if intent == SIMPLE:
+            return self._start('local', prompt, history, report), None
+        return None, self._start('gemini', prompt, history, report)
+
+    @staticmethod
+    def _remote_classify_failed(error, intent):
+        print(f"Error en la clasificación con Gemini: {error}. Se usa la clasificación local.")
+        return intent, 'model_low_confidence'
+
+    def _reconcile(self, intent, remote_intent, local, remote, report):
+        """Si Gemini corrige la intención, la rama especulativa se descarta. Devuelve (intención, local, remota)."""
+        if remote_intent == intent:
+            return intent, local, remote
+        self._cancel('local' if local else 'gemini', local or remote, report)
+        return remote_intent, None, None
+
+    def _instant(self, result, local, report):
+        """True si la respuesta instantánea sirve (y entonces se descarta la rama local)."""
+        if result is None:
+            return False
+        self._cancel('local', local, report)
+        report['path'] = 'instant'
+        return True
+
+    def _local_done(self, result, remote_ready, report):
+        """True si la respuesta del LLM local (ya terminada) es la definitiva; si no, toca Gemini."""
+        if is_success(result) or not remote_ready:
+            report['path'] = 'local'
+            return True
+        # Falló rápido: a Gemini sin esperar más
+        print("⚠️ Fallback a Gemini Cloud...")
+        return False
+
+    def _start_hedge(self, prompt, history, local, delay, report):
+        """El local va lento: cobertura con Gemini. Devuelve las ramas pendientes {rama: nombre}."""
+        print(f"[AI Router] LLM local supera {delay:.2f}s: cobertura con Gemini.")
+        report['hedged'] = True
+        return {local: 'local', self._start('gemini', prompt, history, report): 'gemini'}
+
+    def _cancel_pending(self, pending, report):
+        for other, other_branch in pending.items():
+            self._cancel(other_branch, other, report)
+
+    def _hedge_winner(self, branch, result, pending, report):
+        """True si 'result' (de 'branch') gana la carrera: la primera respuesta correcta."""
+        if not is_success(result):
+            return False
+        self._cancel_pending(pending, report)
+        report['path'] = 'local' if branch == 'local' else 'gemini_hedge'
+        return True
+
+    # --- Enrutado ---
+
+    def route(self, prompt, history, remote_ready=True, deadline=None):
+        """
+        Devuelve (resultado, reporte) con el camino elegido y los tiempos de cada rama.
+        Con 'deadline' (objeto con 'remaining()') ninguna espera supera el plazo.
+        """
+        t0 = time.perf_counter()
+        report = self._new_report()
+
+        intent, confidence, intent_path = self._classify_local(prompt)
+        report['timings_ms']['classify_local'] = round((time.perf_counter() - t0) * 1000, 3)
+
+        local = remote = None
+        if confidence < self.confidence_threshold:
+            if remote_ready:
+                local, remote = self._speculate(intent, prompt, history, report)
+                t1 = time.perf_counter()
+                try:
+                    remote_intent, intent_path = self._classify_remote(prompt), 'gemini'
+                except Exception as e:
+                    remote_intent, intent_path = self._remote_classify_failed(e, intent)
+                report['timings_ms']['classify_gemini'] = round((time.perf_counter() - t1) * 1000, 1)
+                intent, local, remote = self._reconcile(intent, remote_intent, local, remote, report)
+            else:
+                intent_path = 'model_low_confidence'
+        report['intent'], report['intent_path'] = intent, intent_path
+
+        if intent == SIMPLE and self._answer_instant is not None:
+            t2 = time.perf_counter()
+            result = self._answer_instant(prompt)
+            report['timings_ms']['instant'] = round((time.perf_counter() - t2) * 1000, 3)
+            if self._instant(result, local, report):
+                return result, self._close_report(report, t0)
+
+        if intent == COMPLEX:
+            remote = remote or self._start('gemini', prompt, history, report)
+            result = self._result('gemini', remote, deadline, report)
+            if result is None:
+                result = self._expired(prompt, report)
+            else:
+                report['path'] = 'gemini'
+        else:
+            result = self._route_simple(prompt, history, local, remote_ready, deadline, report)
+        return result, self._close_report(report, t0)
+
+    def _route_simple(self, prompt, history, local, remote_ready, deadline, report):
+        local = local or self._start('local', prompt, history, report)
+        delay = self.hedge_delay()
+        report['hedge_after_ms'] = round(delay * 1000, 1)
+
+        done, _ = wait([local], timeout=self._time_left(deadline, delay))
+        if done:
+            self._finish('local', report)
+            result = local.result()
+            if self._local_done(result, remote_ready, report):
+                return result
+            remote = self._start('gemini', prompt, history, report)
+            result = self._result('gemini', remote, deadline, report)
+            if result is None:
+                return self._expired(prompt, report)
+            report['path'] = 'gemini_fallback'
+            return result
+
+        if not remote_ready:
+            result = self._result('local', local, deadline, report)
+            if result is None:
+                return self._expired(prompt, report)
+            report['path'] = 'local'
+            return result
+
+        if deadline is not None and deadline.expired():
+            self._cancel('local', local, report)
+            return self._expired(prompt, report)
+
+        pending = self._start_hedge(prompt, history, local, delay, report)
+        last_result = None
+        while pending:
+            done, _ = wait(list(pending), timeout=self._time_left(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                self._cancel_pending(pending, report)
+                return self._expired(prompt, report)
+            for future in done:
+                branch = pending.pop(future)
+                self._finish(branch, report)
+                last_result = future.result()
+                if self._hedge_winner(branch, last_result, pending, report):
+                    return last_result
+        report['path'] = 'gemini_hedge'
+        return last_result
+
+
+class AsyncHedgedRouter(HedgedRouter):
+    """
+    HedgedRouter para asyncio: 'classify_remote', 'answer_local', 'answer_remote'
+    y 'answer_instant' son corrutinas; 'classify_local' y 'answer_degraded' siguen
+    siendo funciones normales (sin I/O). Las ramas son asyncio.Task.
+    """
+
+    async def _run_local(self, prompt):
+        started = time.perf_counter()
+        result = await self._answer_local(prompt)
+        self.latency.record(time.perf_counter() - started, ok=is_success(result))
+        return result
+
+    def _start(self, branch, prompt, history, report):
+        started = time.perf_counter()
+        # create_task copia el contexto (el plazo de la petición) de quien enruta
+        if branch == 'local':
+            task = asyncio.create_task(self._run_local(prompt))
+        else:
+            task = asyncio.create_task(self._answer_remote(prompt, history))
+        report['_started'][branch] = started
+        return task
+
+    async def _result(self, branch, task, deadline, report):
+        done, _ = await asyncio.wait([task], timeout=self._time_left(deadline))
+        if not done:
+            self._cancel(branch, task, report)
+            return None
+        self._finish(branch, report)
+        return task.result()
+
+    async def route(self, prompt, history, remote_ready=True, deadline=None):
+        """Igual que HedgedRouter.route, pero sin ocupar un hilo mientras espera."""
+        t0 = time.perf_counter()
+        report = self._new_report()
+
+        intent, confidence, intent_path = self._classify_local(prompt)
+        report['timings_ms']['classify_local'] = round((time.perf_counter() - t0) * 1000, 3)
+
+        local = remote = None
+        if confidence < self.confidence_threshold:
+            if remote_ready:
+                local, remote = self._speculate(intent, prompt, history, report)
+                t1 = time.perf_counter()
+                try:
+                    remote_intent, intent_path = await self._classify_remote(prompt), 'gemini'
+                except Exception as e:
+                    remote_intent, intent_path = self._remote_classify_failed(e, intent)
+                report['timings_ms']['classify_gemini'] = round((time.perf_counter() - t1) * 1000, 1)
+                intent, local, remote = self._reconcile(intent, remote_intent, local, remote, report)
+            else:
+                intent_path = 'model_low_confidence'
+        report['intent'], report['intent_path'] = intent, intent_path
+
+        if intent == SIMPLE and self._answer_instant is not None:
+            t2 = time.perf_counter()
+            result = await self._answer_instant(prompt)
+            report['timings_ms']['instant'] = round((time.perf_counter() - t2) * 1000, 3)
+            if self._instant(result, local, report):
+                return result, self._close_report(report, t0)
+
+        if intent == COMPLEX:
+            remote = remote or self._start('gemini', prompt, history, report)
+            result = await self._result('gemini', remote, deadline, report)
+            if result is None:
+                result = self._expired(prompt, report)
+            else:
+                report['path'] = 'gemini'
+        else:
+            result = await self._route_simple(prompt, history, local, remote_ready, deadline, report)
+        return result, self._close_report(report, t0)
+
+    async def _route_simple(self, prompt, history, local, remote_ready, deadline, report):
+        local = local or self._start('local', prompt, history, report)
+        delay = self.hedge_delay()
+        report['hedge_after_ms'] = round(delay * 1000, 1)
+
+        done, _ = await asyncio.wait([local], timeout=self._time_left(deadline, delay))
+        if done:
+            self._finish('local', report)
+            result = local.result()
+            if self._local_done(result, remote_ready, report):
+                return result
+            remote = self._start('gemini', prompt, history, report)
+            result = await self._result('gemini', remote, deadline, report)
+            if result is None:
+                return self._expired(prompt, report)
+            report['path'] = 'gemini_fallback'
+            return result
+
+        if not remote_ready:
+            result = await self._result('local', local, deadline, report)
+            if result is None:
+                return self._expired(prompt, report)
+            report['path'] = 'local'
+            return result
+
+        if deadline is not None and deadline.expired():
+            self._cancel('local', local, report)
+            return self._expired(prompt, report)
+
+        pending = self._start_hedge(prompt, history, local, delay, report)
+        last_result = None
+        while pending:
+            done, _ = await asyncio.wait(list(pending), timeout=self._time_left(deadline),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                self._cancel_pending(pending, report)
+                return self._expired(prompt, report)
+            for task in done:
+                branch = pending.pop(task)
+                self._finish(branch, report)
+                last_result = task.result()
+                if self._hedge_winner(branch, last_result, pending, report):
+                    return last_result
+        report['path'] = 'gemini_hedge'
+        return last_result
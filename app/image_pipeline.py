@@ -0,0 +1,236 @@
+# /home/genichurro/Documentos/v2/IA/app/image_pipeline.py
+# --- RESPONSABILIDAD ---
+# 1. Generar en segundo plano derivados de las imágenes de producto:
+#    miniatura de grilla, detalle y 2x, en formatos modernos (AVIF / WebP).
+# 2. Guardarlos junto a las imágenes por contenido ('uploads/cas/') con un
+#    manifiesto JSON, y servirlos por /media/ (URLs inmutables).
+# 3. Añadir a cada producto del catálogo su 'image_srcset' cuando los
+#    derivados existen; si no existen, programar su generación (bajo demanda).
+# --- NOTA ---
+# Requiere Pillow. Si no está instalado, el pipeline queda deshabilitado y los
+# productos se sirven solo con su 'image' original.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from app.media_storage import CAS_DIR
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow es opcional
+    Image = None
+
+# Derivados: nombre -> ancho máximo en píxeles
+VARIANTS = (('thumb', 320), ('detail', 800), ('2x', 1600))
+
+# Formato -> opciones de guardado (en orden de preferencia para <picture>)
+FORMATS = (('avif', {'quality': 55}), ('webp', {'quality': 80, 'method': 4}))
+
+_HASH_CHUNK = 64 * 1024
+
+
+def available_formats():
+    if Image is None:
+        return []
+    return [(fmt, options) for fmt, options in FORMATS if features.check(fmt)]
+
+
+class ImagePipeline:
+    """Pool de workers que genera derivados y resuelve el 'srcset' de cada imagen local."""
+
+    def __init__(self, upload_folder, max_workers=2, enabled=True):
+        self.upload_folder = upload_folder
+        self.cas_root = os.path.join(upload_folder, CAS_DIR)
+        self.formats = available_formats() if enabled else []
+        self.enabled = bool(self.formats)
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='img') if self.enabled else None
+        self._lock = threading.Lock()
+        self._in_flight = set()      # hashes en proceso
+        self._failed = set()         # hashes que no se pudieron procesar (no se reintentan)
+        self._manifests = {}         # hash -> manifiesto
+        self._hash_cache = {}        # (ruta, mtime) -> hash
+        self._listeners = []         # callables(hash) al terminar un derivado
+
+        if enabled and not self.enabled:
+            print("⚠️ Pipeline de imágenes deshabilitado (Pillow no instalado o sin soporte AVIF/WebP).")
+
+    def subscribe(self, listener):
+        """Registra 'listener(source_hash)', llamado cuando los derivados de una imagen están listos."""
+        self._listeners.append(listener)
+
+    # --- Resolución de rutas y hashes ---
+
+    def local_path_for_url(self, url):
+        """Ruta en disco de una imagen servida por /media/ o /static/uploads/, o None si es externa."""
+        path = urlparse(url or '').path
+        if path.startswith('/media/'):
+            candidate = os.path.join(self.cas_root, path[len('/media/'):])
+        elif path.startswith('/static/uploads/'):
+            candidate = os.path.join(self.upload_folder, path[len('/static/uploads/'):])
+        else:
+            return None
+        candidate = os.path.realpath(candidate)
+        if not candidate.startswith(os.path.realpath(self.upload_folder) + os.sep):
+            return None
+        return candidate if os.path.isfile(candidate) else None
+
+    def content_hash(self, path):
+        """SHA-256 del archivo (el nombre ya lo es en /media/; si no, se calcula y se cachea)."""
+        name = os.path.basename(path)
+        stem = name.split('.')[0]
+        if path.startswith(self.cas_root + os.sep) and len(stem) == 64:
+            return stem
+        cache_key = (path, os.path.getmtime(path))
+        digest = self._hash_cache.get(cache_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            self._hash_cache[cache_key] = digest
+        return digest
+
+    def _manifest_path(self, digest):
+        return os.path.join(self.cas_root, digest[:2], f"{digest}.json")
+
+    def get_manifest(self, digest):
+        manifest = self._manifests.get(digest)
+        if manifest is None:
+            try:
+                with open(self._manifest_path(digest), 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._manifests[digest] = manifest
+        return manifest
+
+    # --- Generación ---
+
+    def submit(self, path):
+        """Programa la generación de derivados para una imagen local (si hace falta)."""
+        if not self.enabled or not path:
+            return None
+        digest = self.content_hash(path)
+        with self._lock:
+            if digest in self._in_flight or digest in self._failed or self.get_manifest(digest):
+                return digest
+            self._in_flight.add(digest)
+        self._pool.submit(self._generate, path, digest)
+        return digest
+
+    def _save_atomic(self, image, final_path, fmt, options):
+        fd, tmp_path = tempfile.mkstemp(prefix='.deriv_', dir=os.path.dirname(final_path))
+        os.close(fd)
+        try:
+            image.save(tmp_path, format=fmt.upper(), **options)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _generate(self, path, digest):
+        try:
+            folder = os.path.join(self.cas_root, digest[:2])
+            os.makedirs(folder, exist_ok=True)
+            with Image.open(path) as original:
+                source = ImageOps.exif_transpose(original)
+                if source.mode not in ('RGB', 'RGBA'):
+                    source = source.convert('RGBA' if 'A' in source.getbands() else 'RGB')
+                manifest = {'source_hash': digest, 'width': source.width, 'height': source.height, 'variants': []}
+                for name, max_width in VARIANTS:
+                    # No se amplían imágenes; el primer derivado siempre se genera
+                    if max_width > source.width and manifest['variants']:
+                        continue
+                    resized = source.copy()
+                    resized.thumbnail((max_width, max_width * 4), Image.LANCZOS)
+                    files = {}
+                    for fmt, options in self.formats:
+                        key = f"{digest[:2]}/{digest}-{name}.{fmt}"
+                        self._save_atomic(resized, os.path.join(self.cas_root, key), fmt, options)
+                        files[fmt] = key
+                    manifest['variants'].append({'name': name, 'width': resized.width,
+                                                 'height': resized.height, 'files': files})
+
+            # El manifiesto se escribe al final: su existencia indica que todo está listo
+            manifest_path = self._manifest_path(digest)
+            fd, tmp_path = tempfile.mkstemp(prefix='.manifest_', dir=folder)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, manifest_path)
+            self._manifests[digest] = manifest
+            print(f"[Media] Derivados generados para {digest[:12]} ({len(manifest['variants'])} tamaños).")
+        except Exception as e:
+            print(f"❌ Error generando derivados de {path}: {e}")
+            with self._lock:
+                self._failed.add(digest)
+            return
+        finally:
+            with self._lock:
+                self._in_flight.discard(digest)
+
+        for listener in self._listeners:
+            try:
+                listener(digest)
+            except Exception as e:
+                print(f"⚠️ Error en listener de imágenes: {e}")
+
+    # --- Integración con el catálogo ---
+
+    def srcset_for(self, digest):
+        """{'avif': 'url 320w, url 800w', 'webp': ...} o None si no hay derivados."""
+        manifest = self.get_manifest(digest)
+        if not manifest:
+            return None
+        srcset = {}
+        for variant in manifest['variants']:
+            for fmt, key in variant['files'].items():
+                srcset.setdefault(fmt, []).append(f"/media/{key} {variant['width']}w")
+        return {fmt: ', '.join(entries) for fmt, entries in srcset.items()}
+
+    def enrich(self, product):
+        """
+        Añade 'image_srcset' al producto si su imagen es local y tiene derivados.
+        Si aún no los tiene, los programa en segundo plano.
+        """
+        if not self.enabled:
+            return product
+        try:
+            path = self.local_path_for_url(product.get('image'))
+            if not path:
+                product.pop('image_srcset', None)
+                return product
+            digest = self.content_hash(path)
+            srcset = self.srcset_for(digest)
+            if srcset:
+                product['image_srcset'] = srcset
+            else:
+                product.pop('image_srcset', None)
+                self.submit(path)
+        except Exception as e:
+            print(f"⚠️ No se pudo resolver derivados para la imagen de '{product.get('name')}': {e}")
+        return product
+
+    def process_all(self, urls):
+        """Programa derivados para una lista de URLs de imagen (uso bajo demanda / CLI)."""
+        scheduled = []
+        for url in urls:
+            path = self.local_path_for_url(url)
+            if path:
+                scheduled.append(self.submit(path))
+        return [digest for digest in scheduled if digest]
+
+    def wait(self):
+        """Espera a que terminen los trabajos en curso (para la CLI)."""
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='img')
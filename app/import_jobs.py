@@ -0,0 +1,284 @@
+# /home/genichurro/Documentos/v2/IA/app/import_jobs.py
+# --- RESPONSABILIDAD ---
+# 1. Importación masiva en streaming de productos (NDJSON o CSV).
+# 2. Volcar la subida a un archivo temporal por bloques (memoria acotada) y
+#    procesarla en segundo plano, fila a fila.
+# 3. Validar cada fila y enviar lotes acotados a Supabase, con varios lotes
+#    en vuelo a la vez.
+# 4. Registrar progreso y errores por fila en un 'job' consultable por su ID.
+# 5. Compartir el estado de los jobs entre workers con un backend SQLite opcional.
+# --- NOTA ---
+# El job se ejecuta en el worker que recibió la subida (el archivo temporal es
+# local). Sin backend, su estado solo se puede consultar en ese mismo worker:
+# con varios workers hay que configurar IMPORT_JOBS_DB_PATH (el mismo archivo
+# para todos) o la consulta de progreso puede responder 404.
+
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Tipos de contenido aceptados para la importación en streaming
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+CSV_TYPES = ('text/csv', 'application/csv')
+
+_CHUNK_SIZE = 64 * 1024
+_MAX_ERRORS_KEPT = 200
+
+
+def detect_format(content_type, filename=None):
+    """Devuelve 'ndjson', 'csv' o None según el Content-Type o la extensión del archivo."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in NDJSON_TYPES:
+        return 'ndjson'
+    if content_type in CSV_TYPES:
+        return 'csv'
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if extension == '.csv':
+        return 'csv'
+    return None
+
+
+def spool_upload(stream, max_bytes):
+    """Copia el cuerpo de la petición a un archivo temporal por bloques. Devuelve la ruta."""
+    fd, path = tempfile.mkstemp(prefix='import_', suffix='.tmp')
+    total = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise Exception(f"El archivo supera el máximo permitido ({max_bytes} bytes).")
+                out.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    if total == 0:
+        os.remove(path)
+        raise Exception("No se recibieron datos para importar.")
+    return path
+
+
+def iter_rows(path, fmt):
+    """Genera (número_de_fila, dict | Exception) leyendo el archivo de forma incremental."""
+    with open(path, 'rb') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        if fmt == 'ndjson':
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError("La línea no es un objeto JSON.")
+                    yield line_number, row
+                except ValueError as e:
+                    yield line_number, e
+        else:
+            reader = csv.DictReader(text)
+            for row in reader:
+                # reader.line_num cuenta la cabecera, igual que una hoja de cálculo
+                yield reader.line_num, {k.strip(): v for k, v in row.items() if k}
+
+
+class ImportJob:
+    """Estado y progreso de una importación."""
+
+    def __init__(self, fmt):
+        self.id = uuid.uuid4().hex
+        self.format = fmt
+        self.status = 'queued'
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_failed = 0
+        self.batches_sent = 0
+        self.batches_failed = 0
+        self.errors = []
+        self.message = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def add_error(self, row, message):
+        with self._lock:
+            self.rows_failed += 1
+            if len(self.errors) < _MAX_ERRORS_KEPT:
+                self.errors.append({'row': row, 'error': str(message)})
+
+    def batch_done(self, size):
+        with self._lock:
+            self.batches_sent += 1
+            self.rows_imported += size
+
+    def batch_failed(self, first_row, last_row, size, message):
+        with self._lock:
+            self.batches_failed += 1
+            self.rows_failed += size
+            if len(self.errors) < _MAX_ERRORS_KEPT:
+                self.errors.append({'rows': [first_row, last_row], 'error': str(message)})
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.id,
+                'format': self.format,
+                'status': self.status,
+                'rows_read': self.rows_read,
+                'rows_imported': self.rows_imported,
+                'rows_failed': self.rows_failed,
+                'batches_sent': self.batches_sent,
+                'batches_failed': self.batches_failed,
+                'errors': list(self.errors),
+                'errors_truncated': self.rows_failed > len(self.errors),
+                'message': self.message,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class SQLiteImportJobBackend:
+    """Estado de los jobs compartido entre workers (una fila JSON por job)."""
+
+    def __init__(self, path, ttl=24 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS import_jobs "
+                               "(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+            self._conn.execute("DELETE FROM import_jobs WHERE updated_at < ?", (time.time() - ttl,))
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data, updated_at FROM import_jobs WHERE id = ?",
+                                     (job_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def save(self, status):
+        data = json.dumps(status, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO import_jobs (id, data, updated_at) VALUES (?, ?, ?)",
+                               (status['job_id'], data, time.time()))
+
+
+class ImportJobRunner:
+    """Ejecuta importaciones en segundo plano y guarda los últimos jobs para consultarlos."""
+
+    def __init__(self, build_payload, upsert_batch, on_finished=None,
+                 batch_size=500, max_in_flight=3, max_jobs_kept=50, backend=None):
+        self._build_payload = build_payload   # dict de fila -> payload (lanza si es inválida)
+        self._upsert_batch = upsert_batch     # lista de payloads -> None (lanza si falla)
+        self._on_finished = on_finished       # callable(job) al terminar (ej. invalidar caché)
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_jobs_kept = max_jobs_kept
+        self._backend = backend               # SQLiteImportJobBackend (opcional)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def status(self, job_id):
+        """Estado del job (dict de 'ImportJob.to_dict') o None si no existe en este worker ni en el backend."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self._backend is not None:
+            try:
+                return self._backend.load(job_id)
+            except Exception as e:
+                print(f"⚠️ No se pudo leer el estado del import {job_id[:8]}: {e}")
+        return None
+
+    def _persist(self, job):
+        if self._backend is None:
+            return
+        try:
+            self._backend.save(job.to_dict())
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el estado del import {job.id[:8]}: {e}")
+
+    def start(self, path, fmt):
+        """Registra un job para el archivo ya volcado a disco y lo lanza en un hilo."""
+        job = ImportJob(fmt)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Conserva solo los jobs más recientes
+            while len(self._jobs) > self.max_jobs_kept:
+                oldest = min(self._jobs.values(), key=lambda j: j.created_at)
+                del self._jobs[oldest.id]
+        self._persist(job)
+        threading.Thread(target=self._run, args=(job, path), daemon=True,
+                         name=f"import-{job.id[:8]}").start()
+        return job
+
+    def _send(self, job, batch, slots):
+        first_row, last_row = batch[0][0], batch[-1][0]
+        payloads = [payload for _, payload in batch]
+        try:
+            self._upsert_batch(payloads)
+            job.batch_done(len(payloads))
+        except Exception as e:
+            print(f"❌ Import {job.id[:8]}: lote filas {first_row}-{last_row} falló: {e}")
+            job.batch_failed(first_row, last_row, len(payloads), e)
+        finally:
+            self._persist(job)
+            slots.release()
+
+    def _run(self, job, path):
+        job.status = 'running'
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                # id -> (fila, payload): un id repetido dentro del lote se queda con la última fila
+                # (PostgreSQL rechaza un upsert que toca dos veces la misma fila).
+                batch = {}
+                for row_number, row in iter_rows(path, job.format):
+                    job.rows_read += 1
+                    if isinstance(row, Exception):
+                        job.add_error(row_number, row)
+                        continue
+                    try:
+                        payload = self._build_payload(row)
+                    except Exception as e:
+                        job.add_error(row_number, e)
+                        continue
+                    batch[payload['id']] = (row_number, payload)
+                    if len(batch) >= self.batch_size:
+                        slots.acquire()  # Bloquea si ya hay 'max_in_flight' lotes enviándose
+                        pool.submit(self._send, job, list(batch.values()), slots)
+                        batch = {}
+                if batch:
+                    slots.acquire()
+                    pool.submit(self._send, job, list(batch.values()), slots)
+            job.status = 'done' if job.rows_failed == 0 else 'done_with_errors'
+            job.message = f"{job.rows_imported} productos importados/actualizados, {job.rows_failed} con errores."
+        except Exception as e:
+            print(f"❌ Import {job.id[:8]} abortado: {e}")
+            job.status = 'failed'
+            job.message = f"Error al procesar el archivo: {e}"
+        finally:
+            job.finished_at = time.time()
+            self._persist(job)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            if self._on_finished:
+                try:
+                    self._on_finished(job)
+                except Exception as e:
+                    print(f"⚠️ Error al finalizar import {job.id[:8]}: {e}")
+            print(f"[Import] Job {job.id[:8]} terminado: {job.status} ({job.message})")
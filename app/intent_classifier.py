@@ -0,0 +1,129 @@
+# /home/genichurro/Documentos/v2/IA/app/intent_classifier.py
+# --- RESPONSABILIDAD ---
+# 1. Clasificar localmente (sin llamar a Gemini) si un mensaje del chat es una
+#    'simple_question' (FAQ, saludo, info de la tienda) o una 'complex_action'
+#    (carrito, navegación, precio/stock, listados de productos).
+# 2. Primero aplica reglas (regex) de alta precisión; si no deciden, usa un
+#    modelo lineal pequeño (regresión logística) entrenado al importar el módulo
+#    con los ejemplos de abajo.
+# 3. Devolver también la confianza, para que el enrutador escale a Gemini solo
+#    cuando el clasificador local no está seguro.
+
+import math
+import re
+
+from app.search_index import fold, stem
+
+SIMPLE = 'simple_question'
+COMPLEX = 'complex_action'
+
+# Reglas de alta precisión (sobre texto sin acentos y en minúsculas)
+COMPLEX_RULES = [re.compile(p) for p in (
+    r'\b(carrito|carro|cesta)\b',
+    r'\b(agrega|agregar|agregame|agregalo|anade|anadir|anademe|anadelo|compra|comprar|pon|ponme)\b',
+    r'\b(llevame|llevarme|navega|ir a|ve a|vamos a)\b',
+    r'\b(muestrame|muestra|mostrar|ensename|lista|listame|listar)\b',
+    r'\bcuanto (cuesta|cuestan|vale|valen|sale|salen)\b',
+    r'\b(precio|precios|stock|existencias|quedan|disponible|disponibles)\b',
+    r'\bque productos (tienes|tienen|hay|venden|vendes)\b',
+)]
+SIMPLE_RULES = [re.compile(p) for p in (
+    r'^(hola|buenas|buenos dias|buenas tardes|buenas noches|hey|gracias|muchas gracias|adios|chao)\W*$',
+    r'\b(quien eres|como te llamas|que eres)\b',
+    r'\b(horario|horarios|envio|envios|devolucion|devoluciones|metodos de pago|formas de pago|direccion|telefono|whatsapp)\b',
+    r'\b(como se usa|como se aplica|para que sirve|para que sirven)\b',
+)]
+
+# Ejemplos de entrenamiento del modelo lineal (verbos y frases del prompt clasificador)
+TRAINING_EXAMPLES = [
+    (SIMPLE, 'hola'), (SIMPLE, 'buenas tardes'), (SIMPLE, 'hola, cómo estás?'),
+    (SIMPLE, 'quién eres'), (SIMPLE, 'qué eres tú'), (SIMPLE, 'cómo te llamas'),
+    (SIMPLE, 'qué es herbIA'), (SIMPLE, 'qué es Bo\'s Beauty'), (SIMPLE, 'háblame de la empresa'),
+    (SIMPLE, 'información de la empresa'), (SIMPLE, 'dónde están ubicados'), (SIMPLE, 'cuál es su horario de atención'),
+    (SIMPLE, 'hacen envíos a todo el país'), (SIMPLE, 'cuánto tarda el envío'), (SIMPLE, 'aceptan tarjeta de crédito'),
+    (SIMPLE, 'cuáles son los métodos de pago'), (SIMPLE, 'puedo devolver un producto'), (SIMPLE, 'cómo se usa el sérum'),
+    (SIMPLE, 'para qué sirve el aceite de argán'), (SIMPLE, 'qué es el karité'), (SIMPLE, 'qué beneficios tiene la miel para la piel'),
+    (SIMPLE, 'los productos son naturales'), (SIMPLE, 'son productos veganos'), (SIMPLE, 'testean en animales'),
+    (SIMPLE, 'sirve para piel grasa'), (SIMPLE, 'es apto para piel sensible'), (SIMPLE, 'cada cuánto debo usar la crema'),
+    (SIMPLE, 'cómo hago un pedido'), (SIMPLE, 'tienen tienda física'), (SIMPLE, 'gracias por la ayuda'),
+    (SIMPLE, 'muchas gracias'), (SIMPLE, 'adiós'), (SIMPLE, 'qué me recomiendas para el cabello seco'),
+    (SIMPLE, 'qué diferencia hay entre el shampoo y el acondicionador'), (SIMPLE, 'cuál es su teléfono'),
+    (SIMPLE, 'de qué está hecho el jabón'), (SIMPLE, 'qué ingredientes usan'), (SIMPLE, 'es seguro para niños'),
+    (SIMPLE, 'cuánto dura un jabón'), (SIMPLE, 'cómo los contacto'),
+    (COMPLEX, 'quiero comprar un jabón'), (COMPLEX, 'agrega el jabón de capuccino al carrito'), (COMPLEX, 'añade dos cremas'),
+    (COMPLEX, 'ponme el aceite de argán en el carrito'), (COMPLEX, 'ver carrito'), (COMPLEX, 'muéstrame mi carrito'),
+    (COMPLEX, 'vacía el carrito'), (COMPLEX, 'limpia mi carrito'), (COMPLEX, 'llévame a contacto'),
+    (COMPLEX, 'ir a productos'), (COMPLEX, 've a sobre nosotros'), (COMPLEX, 'vuelve al inicio'),
+    (COMPLEX, 'muéstrame los aceites'), (COMPLEX, 'quiero ver los jabones'), (COMPLEX, 'enséñame las cremas'),
+    (COMPLEX, 'cuánto cuesta el sérum'), (COMPLEX, 'qué precio tiene la crema de rosas'), (COMPLEX, 'precio del shampoo'),
+    (COMPLEX, 'tienes stock del jabón de miel'), (COMPLEX, 'quedan cremas de miel'), (COMPLEX, 'está disponible el aceite'),
+    (COMPLEX, 'qué productos tienes'), (COMPLEX, 'qué productos venden'), (COMPLEX, 'lista los jabones'),
+    (COMPLEX, 'listame los shampoos'), (COMPLEX, 'qué jabones tienen'), (COMPLEX, 'qué cremas hay'),
+    (COMPLEX, 'quiero el jabón de café'), (COMPLEX, 'me llevo el acondicionador'), (COMPLEX, 'lo quiero'),
+    (COMPLEX, 'cómpralo'), (COMPLEX, 'agrégalo'), (COMPLEX, 'filtra por serums'),
+    (COMPLEX, 'busca el sérum de vitamina c'), (COMPLEX, 'hay jabón de avena'), (COMPLEX, 'cuántos aceites hay'),
+    (COMPLEX, 'dame información del jabón de capuccino'), (COMPLEX, 'quiero dos unidades'), (COMPLEX, 'abre el carrito'),
+    (COMPLEX, 'mostrar todos los productos'),
+]
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def features(text):
+    """Rasgos del mensaje: palabras con stem, bigramas y aciertos de reglas."""
+    folded = fold(text).strip()
+    words = [stem(w) for w in _WORD.findall(folded)]
+    feats = {'__bias__'}
+    feats.update(f"w:{w}" for w in words)
+    feats.update(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+    if folded.endswith('?'):
+        feats.add('__question__')
+    if any(rule.search(folded) for rule in COMPLEX_RULES):
+        feats.add('__rule_complex__')
+    if any(rule.search(folded) for rule in SIMPLE_RULES):
+        feats.add('__rule_simple__')
+    return feats
+
+
+def _sigmoid(z):
+    if z < -30:
+        return 0.0
+    if z > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class IntentClassifier:
+    """Reglas + regresión logística binaria (P(complex_action)) entrenada en memoria."""
+
+    def __init__(self, examples=TRAINING_EXAMPLES, epochs=60, learning_rate=0.3, l2=0.001):
+        self.weights = {}
+        self._train(examples, epochs, learning_rate, l2)
+
+    def _train(self, examples, epochs, learning_rate, l2):
+        data = [(features(text), 1.0 if label == COMPLEX else 0.0) for label, text in examples]
+        for _ in range(epochs):
+            for feats, target in data:
+                error = self._probability(feats) - target
+                for f in feats:
+                    w = self.weights.get(f, 0.0)
+                    self.weights[f] = w - learning_rate * (error + l2 * w)
+
+    def _probability(self, feats):
+        return _sigmoid(sum(self.weights.get(f, 0.0) for f in feats))
+
+    def classify(self, text):
+        """
+        Devuelve (intención, confianza, camino) donde camino es 'rules' o 'model'.
+        La confianza va de 0.5 (duda total) a 1.0.
+        """
+        feats = features(text)
+        rule_complex = '__rule_complex__' in feats
+        rule_simple = '__rule_simple__' in feats
+        if rule_complex != rule_simple:
+            return (COMPLEX if rule_complex else SIMPLE), 1.0, 'rules'
+
+        p_complex = self._probability(feats)
+        if p_complex >= 0.5:
+            return COMPLEX, p_complex, 'model'
+        return SIMPLE, 1.0 - p_complex, 'model'
@@ -0,0 +1,291 @@
+# /home/genichurro/Documentos/v2/IA/app/local_llm_client.py
+# --- RESPONSABILIDAD ---
+# 1. Cliente HTTP dedicado para el LLM local (LOCAL_LLM_URL) con una sesión
+#    keep-alive: no se abre una conexión nueva por cada pregunta.
+# 2. Registrar salud y latencia de las últimas llamadas ('LatencyTracker').
+# 3. Circuit breaker: si el backend está caído, las llamadas fallan al instante
+#    (el enrutador pasa directo a Gemini) en lugar de esperar al timeout.
+# 4. Sonda en segundo plano: mientras el circuito está abierto, un hilo prueba
+#    el backend al pasar a 'half_open' y lo recupera cuando vuelve a responder.
+# 5. 'agenerate': la misma llamada con httpx (asyncio) para la ruta ASGI del chat,
+#    compartiendo breaker y métricas con la versión síncrona.
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import Config
+from app.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay
+
+try:
+    import httpx
+except ImportError:  # httpx es opcional (solo lo usa la ruta ASGI)
+    httpx = None
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class LocalLLMClient:
+    """Cliente con pool keep-alive, métricas de salud y circuit breaker para el LLM local."""
+
+    def __init__(self, url, health_url=None, connect_timeout=2.0, read_timeout=10.0,
+                 pool_maxsize=8, breaker_threshold=3, breaker_reset=15.0):
+        self.url = url
+        self.health_url = health_url or url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker('local_llm', breaker_threshold, breaker_reset)
+        self.health = LatencyTracker(window=200)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._pool_maxsize = pool_maxsize
+        self._async_client = None  # httpx.AsyncClient, se crea en el event loop que lo usa
+        self._prober = None
+        self._prober_lock = threading.Lock()
+
+    # --- Registro de resultados ---
+
+    def _record_success(self, started):
+        self.health.record(time.perf_counter() - started, ok=True)
+        self.breaker.record_success()
+
+    def _record_failure(self, started):
+        self.health.record(time.perf_counter() - started, ok=False)
+        self.breaker.record_failure()
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            self._ensure_prober()
+
+    def _check_breaker(self):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+
+    def _timeouts(self, timeout):
+        """(conexión, lectura) del cliente recortados a 'timeout' (ej. lo que queda del plazo)."""
+        if timeout is None:
+            return self.timeout
+        return (min(self.timeout[0], timeout), min(self.timeout[1], timeout))
+
+    def _clipped_timeout(self, timeouts):
+        """True si un timeout se debe al plazo de la petición y no cuenta como fallo del backend."""
+        return timeouts != self.timeout and self.breaker.state == CircuitBreaker.CLOSED
+
+    def _record_http_error(self, status_code, started):
+        if status_code is not None and status_code < 500:
+            self.breaker.record_success()  # El backend responde; el error es de la petición
+        else:
+            self._record_failure(started)
+
+    def _record_timeout(self, timeouts, started):
+        # Recortado por el plazo de la petición: no cuenta como fallo del backend
+        if not self._clipped_timeout(timeouts):
+            self._record_failure(started)
+
+    @staticmethod
+    def _response_text(data):
+        """Texto de una respuesta JSON completa del LLM local ({"response": "..."})."""
+        text = data.get('response')
+        if not text:
+            raise ValueError("Respuesta vacía.")
+        return text
+
+    # --- Llamadas ---
+
+    def generate(self, prompt, timeout=None):
+        """
+        Respuesta completa del LLM local. 'timeout' (segundos) recorta el de lectura
+        (ej. al plazo que le queda a la petición). Lanza CircuitOpenError o la
+        excepción de 'requests'.
+        """
+        self._check_breaker()
+        started = time.perf_counter()
+        timeouts = self._timeouts(timeout)
+        try:
+            response = self.session.post(self.url, json={'prompt': prompt}, timeout=timeouts)
+            response.raise_for_status()
+            text = self._response_text(response.json())
+        except requests.exceptions.HTTPError as e:
+            self._record_http_error(e.response.status_code if e.response is not None else None, started)
+            raise
+        except requests.exceptions.Timeout:
+            self._record_timeout(timeouts, started)
+            raise
+        except Exception:
+            self._record_failure(started)
+            raise
+        self._record_success(started)
+        return text
+
+    def _async_session(self):
+        if httpx is None:
+            raise RuntimeError("El paquete 'httpx' no está instalado (necesario para la ruta asíncrona).")
+        if self._async_client is None:
+            limits = httpx.Limits(max_connections=self._pool_maxsize, max_keepalive_connections=self._pool_maxsize)
+            self._async_client = httpx.AsyncClient(limits=limits)
+        return self._async_client
+
+    async def agenerate(self, prompt, timeout=None):
+        """Versión asyncio de 'generate' (httpx). Lanza CircuitOpenError o la excepción de 'httpx'."""
+        self._check_breaker()
+        started = time.perf_counter()
+        timeouts = self._timeouts(timeout)
+        try:
+            response = await self._async_session().post(self.url, json={'prompt': prompt},
+                                                        timeout=httpx.Timeout(timeouts[1], connect=timeouts[0]))
+            response.raise_for_status()
+            text = self._response_text(response.json())
+        except httpx.HTTPStatusError as e:
+            self._record_http_error(e.response.status_code, started)
+            raise
+        except httpx.TimeoutException:
+            self._record_timeout(timeouts, started)
+            raise
+        except Exception:
+            self._record_failure(started)
+            raise
+        self._record_success(started)
+        return text
+
+    async def aclose(self):
+        """Cierra el cliente httpx (al apagar el servidor ASGI)."""
+        if self._async_client is not None:
+            client, self._async_client = self._async_client, None
+            await client.aclose()
+
+    def stream(self, prompt, timeout=None):
+        """
+        Genera los fragmentos de texto pidiendo 'stream': True. Acepta NDJSON
+        ({"response": "..."} por línea), texto plano chunked o el JSON completo.
+        'timeout' recorta la conexión y la espera de cada fragmento, como en 'generate'.
+        """
+        self._check_breaker()
+        started = time.perf_counter()
+        timeouts = self._timeouts(timeout)
+        try:
+            response = self.session.post(self.url, json={'prompt': prompt, 'stream': True},
+                                         timeout=timeouts, stream=True)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            self._record_http_error(e.response.status_code if e.response is not None else None, started)
+            raise
+        except requests.exceptions.Timeout:
+            self._record_timeout(timeouts, started)
+            raise
+        except Exception:
+            self._record_failure(started)
+            raise
+
+        produced = False
+        ok = None  # Veredicto sobre el backend: True, False o None (sin veredicto)
+        try:
+            with response:
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if content_type == 'application/json':
+                    text = self._response_text(response.json())
+                    produced = True
+                    yield text
+                elif content_type in NDJSON_TYPES:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line:
+                            piece = json.loads(line).get('response')
+                            if piece:
+                                produced = True
+                                yield piece
+                else:
+                    response.encoding = response.encoding or 'utf-8'
+                    for piece in response.iter_content(chunk_size=None, decode_unicode=True):
+                        if piece:
+                            produced = True
+                            yield piece
+            ok = produced
+        except GeneratorExit:
+            # El cliente SSE cortó la conexión: no es culpa del backend (si ya había
+            # respondido, cuenta como éxito)
+            ok = True if produced else None
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # Siempre hay que cerrar el permiso de prueba de 'half_open'
+            if ok:
+                self._record_success(started)
+            elif ok is False:
+                self._record_failure(started)
+            else:
+                self.breaker.release_probe()
+
+    # --- Sonda en segundo plano ---
+
+    def probe(self):
+        """Comprueba si el backend responde (cualquier respuesta < 500 cuenta como vivo)."""
+        try:
+            response = self.session.get(self.health_url, timeout=self.timeout)
+            response.close()
+            return response.status_code < 500
+        except requests.exceptions.RequestException:
+            return False
+
+    def _ensure_prober(self):
+        with self._prober_lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, daemon=True, name='local-llm-probe')
+            self._prober.start()
+
+    def _probe_loop(self):
+        print(f"[LLM Local] Circuito abierto: sonda en segundo plano activa ({self.health_url}).")
+        busy = 0  # Veces seguidas que otra llamada tenía el permiso de prueba
+        while True:
+            state = self.breaker.state
+            if state == CircuitBreaker.CLOSED:
+                return
+            if state == CircuitBreaker.OPEN:
+                time.sleep(max(0.05, self.breaker.retry_after()))
+                continue
+            # 'half_open': la sonda ocupa el único permiso de prueba
+            if not self.breaker.allow_request():
+                # Lo tiene otra llamada: se espera cada vez más, hasta 'reset_timeout'
+                time.sleep(backoff_delay(busy, base=0.5, cap=self.breaker.reset_timeout))
+                busy += 1
+                continue
+            busy = 0
+            started = time.perf_counter()
+            if self.probe():
+                self.breaker.record_success()
+                print(f"✅ [LLM Local] Backend recuperado ({(time.perf_counter() - started) * 1000:.0f} ms).")
+                return
+            self.breaker.record_failure()
+
+    def snapshot(self):
+        """Estado para operadores (/api/health)."""
+        return {
+            'breaker': self.breaker.snapshot(),
+            'health': self.health.snapshot(),
+            'prober_running': bool(self._prober and self._prober.is_alive()),
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_local_llm_client():
+    """Devuelve el cliente compartido del proceso (se crea en el primer uso)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LocalLLMClient(
+                    Config.LOCAL_LLM_URL,
+                    health_url=Config.LOCAL_LLM_HEALTH_URL,
+                    connect_timeout=Config.LOCAL_LLM_CONNECT_TIMEOUT,
+                    read_timeout=Config.LOCAL_LLM_TIMEOUT,
+                    pool_maxsize=Config.LOCAL_LLM_POOL_MAXSIZE,
+                    breaker_threshold=Config.LOCAL_LLM_BREAKER_THRESHOLD,
+                    breaker_reset=Config.LOCAL_LLM_BREAKER_RESET,
+                )
+    return _client
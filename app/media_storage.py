@@ -0,0 +1,78 @@
+# /home/genichurro/Documentos/v2/IA/app/media_storage.py
+# --- RESPONSABILIDAD ---
+# 1. Guardar las imágenes subidas por contenido (content-addressed): la ruta
+#    se deriva del hash SHA-256 del archivo.
+# 2. Escribir la subida a disco por bloques mientras se calcula el hash
+#    (sin cargar el archivo completo en memoria).
+# 3. Deduplicar: si ya existe un archivo con el mismo hash, se reutiliza.
+# Como el nombre cambia si cambia el contenido, estas URLs son inmutables y
+# se pueden cachear "para siempre" (ver la ruta /media en routes.py).
+
+import hashlib
+import os
+import tempfile
+
+from werkzeug.utils import secure_filename
+
+# Subcarpeta (dentro de UPLOAD_FOLDER) donde viven los archivos por hash
+CAS_DIR = 'cas'
+
+ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif'}
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def _extension(filename):
+    extension = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    if extension == '.jpeg':
+        extension = '.jpg'
+    return extension
+
+
+def media_key(digest, extension):
+    """Clave del archivo dentro de 'cas/' (y de su URL /media/...): 'ab/abcdef....jpg'."""
+    return f"{digest[:2]}/{digest}{extension}"
+
+
+def media_root(upload_folder):
+    return os.path.join(upload_folder, CAS_DIR)
+
+
+def store_upload(file_storage, upload_folder):
+    """
+    Guarda un 'FileStorage' de Flask por su hash. Devuelve (clave, es_nuevo).
+    Lanza una excepción si la extensión no es una imagen permitida.
+    """
+    extension = _extension(file_storage.filename)
+    if extension not in ALLOWED_IMAGE_EXTENSIONS:
+        raise Exception(f"Formato de imagen no soportado: '{extension or file_storage.filename}'.")
+
+    cas_root = media_root(upload_folder)
+    os.makedirs(cas_root, exist_ok=True)
+
+    # El temporal vive en la misma carpeta para que el rename final sea atómico
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload_', dir=cas_root)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        key = media_key(digest.hexdigest(), extension)
+        final_path = os.path.join(cas_root, key)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+            return key, False
+
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.chmod(tmp_path, 0o644)  # mkstemp crea el archivo con 0600
+        os.replace(tmp_path, final_path)
+        return key, True
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
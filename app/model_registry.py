@@ -0,0 +1,62 @@
+# /home/genichurro/Documentos/v2/IA/app/model_registry.py
+# --- RESPONSABILIDAD ---
+# 1. Construir UNA sola vez por proceso cada combinación de modelo Gemini +
+#    system prompt + herramientas (construir un GenerativeModel con tools
+#    introspecciona las funciones Python en cada llamada).
+# 2. Ser seguro entre hilos (varias peticiones de chat a la vez).
+# 3. Reconstruir los modelos solo si cambia la configuración (API key / modelo).
+
+import hashlib
+import threading
+
+import google.generativeai as genai
+
+
+class ModelRegistry:
+    """Caché de 'genai.GenerativeModel' por (modelo, system prompt, herramientas)."""
+
+    def __init__(self, config_source):
+        self._config_source = config_source   # Callable que devuelve la configuración actual (tupla)
+        self._lock = threading.Lock()
+        self._models = {}
+        self._signature = None
+        self.builds = 0
+
+    def _current_signature(self):
+        raw = repr(self._config_source()).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+    def get(self, model_name, system_instruction=None, tools=None):
+        """Devuelve el modelo para la combinación pedida, construyéndolo la primera vez."""
+        signature = self._current_signature()
+        key = (model_name, system_instruction, tuple(tools) if tools else None)
+        model = self._models.get(key) if signature == self._signature else None
+        if model is not None:
+            return model
+
+        with self._lock:
+            if signature != self._signature:
+                if self._signature is not None:
+                    print("[Modelos] La configuración de Gemini cambió: se reconstruyen los modelos.")
+                self._models = {}
+                self._signature = signature
+            model = self._models.get(key)
+            if model is None:
+                kwargs = {'system_instruction': system_instruction}
+                if tools:
+                    kwargs['tools'] = list(tools)
+                model = genai.GenerativeModel(model_name, **kwargs)
+                self._models[key] = model
+                self.builds += 1
+            return model
+
+    def warm(self, specs):
+        """Construye por adelantado una lista de (modelo, system prompt, herramientas)."""
+        for model_name, system_instruction, tools in specs:
+            self.get(model_name, system_instruction, tools)
+        print(f"✅ Modelos Gemini precargados ({len(self._models)}).")
+
+    def clear(self):
+        with self._lock:
+            self._models = {}
+            self._signature = None
@@ -0,0 +1,250 @@
+# /home/genichurro/Documentos/v2/IA/app/rate_limiter.py
+# --- RESPONSABILIDAD ---
+# 1. Limitar las peticiones por cliente con un token bucket: cada cliente tiene
+#    una "cubeta" de 'capacity' fichas que se rellena a 'refill_rate' fichas/s.
+# 2. Identificar al cliente por su IP (la que resuelve ProxyFix) o, si hay
+#    sesión de admin, por su email (varios admins detrás de la misma IP no se
+#    pisan y un admin no gasta el cupo de los clientes). La ruta ASGI del chat
+#    usa la misma regla ('client_key_for') leyendo la cookie de sesión de Flask.
+# 3. Backend en memoria (un dict + lock, O(1) por petición) y backend Redis
+#    opcional para compartir los cupos entre varios workers.
+# 4. Responder 429 con 'Retry-After' y añadir las cabeceras RateLimit-* a cada
+#    respuesta de las rutas limitadas (decorador 'rate_limited').
+# --- NOTA ---
+# Redis es opcional: sin el paquete 'redis' (o sin RATE_LIMIT_REDIS_URL) cada
+# worker aplica el límite por su cuenta. Si Redis falla en una petición, esa
+# petición se cuenta en memoria en lugar de rechazarla.
+
+import functools
+import math
+import threading
+import time
+
+from flask import jsonify, make_response, request, session
+
+from app.config import Config
+
+try:
+    import redis
+except ImportError:  # redis es opcional
+    redis = None
+
+
+class RateLimitResult:
+    """Resultado de consumir fichas: si se permite y los datos de las cabeceras."""
+
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset', 'retry_after')
+
+    def __init__(self, allowed, limit, remaining, reset, retry_after):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining        # Fichas enteras que quedan
+        self.reset = reset                # Segundos hasta tener la cubeta llena
+        self.retry_after = retry_after    # Segundos hasta la próxima ficha (0 si se permite)
+
+    def headers(self):
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
+
+
+def bucket_result(allowed, tokens, capacity, refill_rate, cost):
+    """Convierte el estado de la cubeta (fichas tras consumir) en un RateLimitResult."""
+    missing = capacity - tokens
+    reset = math.ceil(missing / refill_rate) if missing > 0 else 0
+    retry_after = 0 if allowed else max(1, math.ceil((cost - tokens) / refill_rate))
+    return RateLimitResult(allowed, int(capacity), max(0, int(tokens)), reset, retry_after)
+
+
+class MemoryRateLimitBackend:
+    """Token buckets en memoria del proceso: clave -> (fichas, última actualización)."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max(1, max_keys)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _prune(self, now):
+        # Debe llamarse con el lock tomado.
+        # Una cubeta que ya se habría rellenado entera equivale a no tenerla.
+        full = [key for key, (tokens, updated, capacity, rate) in self._buckets.items()
+                if tokens + (now - updated) * rate >= capacity]
+        for key in full:
+            del self._buckets[key]
+        # Todas activas: se expulsa el 10% más antiguo para no recorrer el dict en cada alta
+        if len(self._buckets) >= self.max_keys:
+            for key in list(self._buckets)[:max(1, self.max_keys // 10)]:
+                del self._buckets[key]
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens = float(capacity)
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * refill_rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, capacity, refill_rate)
+        return bucket_result(allowed, tokens, capacity, refill_rate, cost)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'clients': len(self._buckets)}
+
+
+# Rellenar + consumir de forma atómica en Redis (un solo viaje de red)
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitBackend:
+    """Token buckets compartidos entre workers (requiere el paquete 'redis')."""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        # El reloj de pared (y no monotonic) porque lo comparten varios procesos
+        allowed, tokens = self._script(keys=[self.prefix + key],
+                                       args=[capacity, refill_rate, time.time(), cost])
+        return bucket_result(bool(allowed), float(tokens), capacity, refill_rate, cost)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+class RateLimiter:
+    """Reglas con nombre ({nombre: (capacidad, fichas/s)}) sobre un backend intercambiable."""
+
+    def __init__(self, rules, backend=None, enabled=True):
+        self.rules = dict(rules)
+        self.enabled = enabled
+        self._fallback = MemoryRateLimitBackend()
+        self._backend = backend or self._fallback
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    def hit(self, rule, key, cost=1):
+        """Consume 'cost' fichas de la cubeta 'rule' del cliente 'key'."""
+        capacity, refill_rate = self.rules[rule]
+        bucket_key = f"{rule}:{key}"
+        try:
+            result = self._backend.consume(bucket_key, capacity, refill_rate, cost)
+        except Exception as e:
+            with self._lock:
+                self.backend_errors += 1
+            print(f"⚠️ Rate limiter: fallo del backend compartido, se usa memoria local: {e}")
+            result = self._fallback.consume(bucket_key, capacity, refill_rate, cost)
+        with self._lock:
+            if result.allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+        return result
+
+    def stats(self):
+        with self._lock:
+            counters = {'allowed': self.allowed, 'rejected': self.rejected,
+                        'backend_errors': self.backend_errors}
+        return {
+            'enabled': self.enabled,
+            'rules': {name: {'capacity': c, 'refill_per_second': r} for name, (c, r) in self.rules.items()},
+            **self._backend.stats(),
+            **counters,
+        }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Devuelve el rate limiter compartido del proceso (se crea en el primer uso)."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend = None
+                if Config.RATE_LIMIT_REDIS_URL:
+                    if redis is None:
+                        print("⚠️ RATE_LIMIT_REDIS_URL configurada pero falta el paquete 'redis': "
+                              "el límite se aplica por worker.")
+                    else:
+                        backend = RedisRateLimitBackend(Config.RATE_LIMIT_REDIS_URL)
+                _limiter = RateLimiter({
+                    'chat': (Config.RATE_LIMIT_CHAT, Config.RATE_LIMIT_CHAT / Config.RATE_LIMIT_CHAT_WINDOW),
+                    'admin': (Config.RATE_LIMIT_ADMIN, Config.RATE_LIMIT_ADMIN / Config.RATE_LIMIT_ADMIN_WINDOW),
+                }, backend=backend, enabled=Config.RATE_LIMIT_ENABLED)
+    return _limiter
+
+
+def client_key_for(session_data, remote_addr):
+    """
+    Identidad del cliente a partir de los datos de su sesión Flask (dict) y su IP:
+    el admin logueado va por email; el resto, por IP. La usan la ruta WSGI y la ASGI.
+    """
+    if session_data.get('admin_logged_in') and session_data.get('admin_email'):
+        return f"admin:{session_data['admin_email']}"
+    return f"ip:{remote_addr or 'unknown'}"
+
+
+def client_key():
+    """Identidad del cliente de la petición Flask en curso (IP ya resuelta por ProxyFix)."""
+    return client_key_for(session, request.remote_addr)
+
+
+def rate_limited(rule, methods=None):
+    """
+    Decorador de rutas: aplica la regla 'rule' (solo a 'methods', si se indican)
+    a la cubeta de 'client_key()', responde 429 al agotar el cupo y añade las
+    cabeceras RateLimit-* a la respuesta. La ruta ASGI del chat no pasa por aquí:
+    consume la misma regla con 'client_key_for' y la cookie de sesión de Flask.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = get_rate_limiter()
+            if not limiter.enabled or (methods and request.method not in methods):
+                return view(*args, **kwargs)
+            result = limiter.hit(rule, client_key())
+            if not result.allowed:
+                response = jsonify({'success': False,
+                                    'message': 'Demasiadas peticiones. Inténtalo de nuevo en unos segundos.',
+                                    'retry_after': result.retry_after})
+                response.status_code = 429
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.headers.update(result.headers())
+            return response
+        return wrapper
+    return decorator
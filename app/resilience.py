@@ -0,0 +1,316 @@
+# /home/genichurro/Documentos/v2/IA/app/resilience.py
+# --- RESPONSABILIDAD ---
+# 1. Proveer primitivas de resiliencia reutilizables por los clientes HTTP salientes.
+# 2. 'CircuitBreaker': deja de llamar a un backend caído y falla rápido.
+# 3. 'backoff_delay': calcula la espera (exponencial con jitter) entre reintentos.
+# 4. 'LatencyTracker': ventana deslizante de latencias y errores de un backend
+#    (percentiles para decidir cuándo "cubrir" una llamada lenta).
+# 5. 'AdmissionGate': límite de llamadas concurrentes a un backend con una cola
+#    de espera acotada y con plazo; lo que no cabe se rechaza ('OverloadedError',
+#    con un Retry-After estimado) en lugar de acumularse.
+# 6. 'AsyncAdmissionGate': la misma política para corrutinas (ruta ASGI del chat).
+
+import asyncio
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class CircuitOpenError(Exception):
+    """Se lanza cuando el circuito está abierto y la llamada se rechaza sin hacer I/O."""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuito '{name}' abierto. Reintentar en {retry_after:.1f}s.")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados:
+    - 'closed': las llamadas pasan normalmente.
+    - 'open': tras N fallos seguidos, las llamadas se rechazan durante 'reset_timeout'.
+    - 'half_open': pasado ese tiempo se deja pasar UNA llamada de prueba;
+      si funciona se cierra el circuito, si falla se vuelve a abrir.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _current_state(self):
+        # Debe llamarse con el lock tomado.
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self):
+        """Indica si la llamada puede salir. En 'half_open' solo autoriza una sonda a la vez."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self):
+        """Segundos que faltan para que el circuito pase a 'half_open'."""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"✅ Circuito '{self.name}' cerrado de nuevo.")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Libera la sonda de 'half_open' sin veredicto (la llamada no llegó a probar el backend)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            self._probe_in_flight = False
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    print(f"⚠️ Circuito '{self.name}' ABIERTO tras {self._failures} fallos.")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        """Estado actual del circuito (para logs / endpoints de operación)."""
+        with self._lock:
+            state = self._current_state()
+            retry_after = 0.0
+            if state == self.OPEN:
+                retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'name': self.name,
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_after': round(retry_after, 2),
+            }
+
+
+def backoff_delay(attempt, base=0.2, cap=2.0):
+    """Espera exponencial con 'full jitter' para el reintento número 'attempt' (0, 1, 2...)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Últimas N llamadas a un backend: latencias (solo las exitosas) y tasa de error."""
+
+    def __init__(self, window=100):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)   # True = éxito
+
+    def record(self, latency, ok=True):
+        with self._lock:
+            self._outcomes.append(bool(ok))
+            if ok:
+                self._latencies.append(latency)
+
+    def percentile(self, q, default=None, min_samples=5):
+        """Percentil 'q' (0..1) de las latencias; 'default' si aún hay pocas muestras."""
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return default
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def error_rate(self):
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+    def snapshot(self):
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+        with self._lock:
+            samples = len(self._outcomes)
+        return {
+            'samples': samples,
+            'error_rate': round(self.error_rate(), 3),
+            'p50_ms': ms(self.percentile(0.5)),
+            'p90_ms': ms(self.percentile(0.9)),
+            'p99_ms': ms(self.percentile(0.99)),
+        }
+
+
+class OverloadedError(Exception):
+    """Se lanza cuando un backend está saturado: cola llena o plazo de espera agotado."""
+
+    def __init__(self, name, retry_after, reason):
+        self.name = name
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(f"Backend '{name}' saturado ({reason}). Reintentar en {retry_after}s.")
+
+
+class AdmissionGate:
+    """
+    Control de admisión para un backend: como mucho 'max_concurrent' llamadas a la
+    vez, hasta 'max_queue' esperando turno (en orden de llegada) y cada espera
+    limitada a 'queue_timeout' segundos. Uso: 'with gate.admit(): ...'.
+    """
+
+    def __init__(self, name, max_concurrent=4, max_queue=16, queue_timeout=2.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_times = LatencyTracker(window=500)
+        self.service_times = LatencyTracker(window=200)
+
+    def _retry_after(self):
+        # Debe llamarse con el lock tomado. Segundos (enteros) hasta que probablemente haya hueco.
+        service = self.service_times.percentile(0.5, default=1.0)
+        return max(1, math.ceil(service * (self._waiting + 1) / self.max_concurrent))
+
+    # Decisiones compartidas por 'admit' (hilos) y 'AsyncAdmissionGate.admit'.
+    # Deben llamarse con el lock tomado (salvo '_admitted' y '_record_service').
+    def _has_slot(self):
+        return self._in_flight < self.max_concurrent
+
+    def _enqueue(self):
+        """Entra en la cola de espera o, si está llena, rechaza con OverloadedError."""
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(self.name, self._retry_after(), 'cola llena')
+        self._waiting += 1
+
+    def _wait_expired(self):
+        self.timed_out += 1
+        return OverloadedError(self.name, self._retry_after(), 'espera agotada')
+
+    def _enter(self):
+        self._in_flight += 1
+        self.admitted += 1
+
+    def _admitted(self, started):
+        waited = time.perf_counter() - started
+        self.wait_times.record(waited)
+        return waited
+
+    def _record_service(self, started, waited):
+        self.service_times.record(time.perf_counter() - started - waited)
+
+    @contextmanager
+    def admit(self, timeout=None):
+        """Espera turno (como mucho 'timeout' o 'queue_timeout') y ocupa un hueco mientras dura el bloque."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        with self._cond:
+            if not self._has_slot():
+                self._enqueue()
+                try:
+                    deadline = started + timeout
+                    while not self._has_slot():
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            raise self._wait_expired()
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._enter()
+        waited = self._admitted(started)
+        try:
+            yield waited
+        finally:
+            self._record_service(started, waited)
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def snapshot(self):
+        """Ocupación, cola y tiempos de espera (para /api/health)."""
+        with self._cond:
+            state = {
+                'name': self.name,
+                'in_flight': self._in_flight,
+                'max_concurrent': self.max_concurrent,
+                'queue_depth': self._waiting,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+            }
+        wait = self.wait_times.snapshot()
+        state['wait_p50_ms'], state['wait_p90_ms'], state['wait_p99_ms'] = wait['p50_ms'], wait['p90_ms'], wait['p99_ms']
+        return state
+
+
+class AsyncAdmissionGate(AdmissionGate):
+    """
+    AdmissionGate para asyncio: la espera no bloquea el event loop. Mismos
+    límites, contadores y 'snapshot'. Uso: 'async with gate.admit(): ...'.
+    Solo se usa desde el hilo del event loop.
+    """
+
+    def __init__(self, name, max_concurrent=4, max_queue=16, queue_timeout=2.0):
+        super().__init__(name, max_concurrent, max_queue, queue_timeout)
+        self._async_cond = None  # Se crea dentro del event loop (primer uso)
+
+    @asynccontextmanager
+    async def admit(self, timeout=None):
+        """Espera turno (como mucho 'timeout' o 'queue_timeout') y ocupa un hueco mientras dura el bloque."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        cond = self._async_cond
+        started = time.perf_counter()
+        async with cond:
+            if not self._has_slot():
+                self._enqueue()
+                try:
+                    await asyncio.wait_for(cond.wait_for(self._has_slot), timeout)
+                except asyncio.TimeoutError:
+                    raise self._wait_expired() from None
+                finally:
+                    self._waiting -= 1
+            self._enter()
+        waited = self._admitted(started)
+        try:
+            yield waited
+        finally:
+            self._record_service(started, waited)
+            async with cond:
+                self._in_flight -= 1
+                cond.notify()
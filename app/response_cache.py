@@ -0,0 +1,145 @@
+# /home/genichurro/Documentos/v2/IA/app/response_cache.py
+# --- RESPONSABILIDAD ---
+# 1. Guardar en memoria las respuestas del chat a preguntas frecuentes
+#    ('simple_question'): quién eres, envíos, cómo se usa un producto...
+# 2. Clave = prompt normalizado (sin tildes, mayúsculas ni signos, pero con
+#    todas sus palabras) + hash de los últimos mensajes del historial (la
+#    ventana que puede cambiar la respuesta) + intención con la que se guardó.
+# 3. Límite LRU, caducidad por TTL e invalidación explícita.
+# 4. Coincidencia aproximada: una pregunta parafraseada con casi los mismos
+#    palabras (similitud de Jaccard >= umbral) reutiliza la respuesta guardada.
+# 5. Contadores de aciertos / fallos para /api/health.
+# --- NOTA ---
+# La caché es por proceso (igual que la del catálogo).
+# No se usa 'search_index.tokenize': quita "con"/"sin" y reduce a la raíz, así
+# que "jabón con aceite" y "jabón sin aceite" compartirían respuesta.
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.search_index import fold
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_prompt(text):
+    """'¿Hacéis  envíos?' -> 'haceis envios' (sin tildes, signos ni espacios de más)."""
+    return ' '.join(_NON_WORD.sub(' ', fold(text)).split())
+
+
+def jaccard(a, b):
+    """Similitud entre dos conjuntos de términos (0..1)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """Caché LRU + TTL de respuestas del chat con búsqueda por similitud."""
+
+    def __init__(self, max_entries=256, ttl=600, similarity=0.8, history_window=2):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.similarity = similarity          # 1.0 (o más) = solo coincidencias exactas
+        self.history_window = max(0, history_window)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()         # (prompt, hash historial, intención) -> (respuesta, palabras, guardado_en)
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    # --- Claves ---
+
+    def history_fingerprint(self, history):
+        """Hash de los últimos 'history_window' mensajes (remitente + texto normalizado)."""
+        if not self.history_window or not history:
+            return ''
+        window = [(msg.get('sender'), fold(msg.get('text', '')).strip())
+                  for msg in history[-self.history_window:] if isinstance(msg, dict)]
+        raw = json.dumps(window, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()[:16]
+
+    def _key(self, prompt, history, intent):
+        normalized = normalize_prompt(prompt)
+        return (normalized, self.history_fingerprint(history), intent), frozenset(normalized.split())
+
+    def _expired(self, stored_at):
+        return time.monotonic() - stored_at > self.ttl
+
+    # --- Lectura / escritura ---
+
+    def get(self, prompt, history=None, intent=None):
+        """
+        Devuelve (respuesta, 'exact'|'similar') o (None, None). La respuesta es una
+        copia. Solo vale una entrada guardada con la misma 'intent'.
+        """
+        key, terms = self._key(prompt, history, intent)
+        if not key[0]:
+            return None, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2]):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0]), 'exact'
+
+            if self.similarity <= 1.0:
+                best_key, best_score = None, self.similarity
+                for other_key, (_, other_terms, stored_at) in self._entries.items():
+                    if other_key[1:] != key[1:] or self._expired(stored_at):
+                        continue
+                    score = jaccard(terms, other_terms)
+                    if score >= best_score:
+                        best_key, best_score = other_key, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    self.similar_hits += 1
+                    return dict(self._entries[best_key][0]), 'similar'
+
+            self.misses += 1
+            return None, None
+
+    def put(self, prompt, history, response, intent=None):
+        """Guarda la respuesta (dict) para el prompt + ventana de historial + intención."""
+        key, terms = self._key(prompt, history, intent)
+        if not key[0]:
+            return
+        with self._lock:
+            self._entries[key] = (dict(response), terms, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- Invalidación ---
+
+    def invalidate(self, prompt=None, history=None):
+        """Borra las entradas de un prompt (con su ventana de historial, de cualquier intención) o, sin prompt, todas."""
+        with self._lock:
+            if prompt is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            (normalized, fingerprint, _), _ = self._key(prompt, history, None)
+            keys = [key for key in self._entries if key[:2] == (normalized, fingerprint)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -6,10 +6,24 @@
 # --- [MEJORA] ---
 # - Se añadieron las rutas /api/login, /api/logout, /api/check_auth
 #   para manejar la autenticación del panel de administración usando sesiones Flask.
+# - [NUEVO] Ruta /api/categories con el conteo de productos por categoría.
+# - [NUEVO] Ruta /api/products/import/<job_id> para seguir una importación en streaming.
+# - [NUEVO] Ruta /media/<hash> con Cache-Control inmutable para imágenes por contenido.
+# - [NUEVO] Comando 'flask images-derivatives' para generar los derivados de las
+#   imágenes ya existentes.
+# - [NUEVO] Ruta /api/chat/stream (respuestas del chat por Server-Sent Events).
+# - [NUEVO] Ruta /api/health con el estado de los circuit breakers (LLM local, Supabase).
+# - [NUEVO] Ruta DELETE /api/chat/cache para invalidar la caché de respuestas del chat.
+# - [NUEVO] /api/health incluye los contadores de la caché de herramientas y
+#   de las conversaciones guardadas en el servidor, y la cola/ocupación de cada
+#   backend de IA ('admission').
+# - [NUEVO] Límite de peticiones por cliente en /api/chat, /api/chat/stream y
+#   POST /api/products (429 + cabeceras RateLimit-*); su estado en /api/health.
+# - [NUEVO] /api/health incluye la ruta asíncrona del chat ('async_chat') si está montada.
 
 # --- [MODIFICADO] ---
 # Importar 'session' y 'jsonify' de Flask
-from flask import current_app, render_template, request, session, jsonify
+from flask import current_app, render_template, request, session, jsonify, send_from_directory
 
 # Importar la configuración para acceder a las credenciales demo
 from app.config import Config
@@ -17,6 +31,10 @@ from app.config import Config
 # Importar los "handlers" (manejadores de lógica)
 from app import ai_logica 
 from app import db_logic
+from app.media_storage import media_root
+from app.rate_limiter import get_rate_limiter, rate_limited
+from app.local_llm_client import get_local_llm_client
+from app.supabase_client import get_supabase_client
 
 # ======================================================
 # 1. RUTAS DEL FRONTEND (PÁGINAS HTML)
@@ -32,6 +50,19 @@ def serve_admin():
     """Sirve el panel de administración admin.html."""
     return render_template('admin.html')
 
+# --- [NUEVO] Imágenes guardadas por hash de contenido ---
+@current_app.route('/media/<path:filename>')
+def media_handler(filename):
+    """
+    Sirve las imágenes de 'uploads/cas'. El nombre es el hash del contenido,
+    así que nunca cambian: navegadores y CDNs pueden cachearlas sin revalidar.
+    """
+    response = send_from_directory(media_root(Config.UPLOAD_FOLDER), filename,
+                                   max_age=Config.MEDIA_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # ======================================================
 # 2. RUTAS DE AUTENTICACIÓN (LOGIN/LOGOUT ADMIN)
 # ======================================================
@@ -77,13 +108,14 @@ def check_auth():
 # ======================================================
 
 @current_app.route('/api/products', methods=['GET', 'POST'])
+@rate_limited('admin', methods=('POST',))
 def products_handler():
     """
     Ruta unificada para la API de productos.
     Delega el trabajo a los handlers de 'db_logic'.
     """
     if request.method == 'GET':
-        return db_logic.handle_products_get()
+        return db_logic.handle_products_get(request)
     
     elif request.method == 'POST':
         # Requiere autenticación para modificar productos (POST)
@@ -91,10 +123,65 @@ def products_handler():
              return jsonify({'success': False, 'message': 'No autorizado'}), 401
         return db_logic.handle_products_post(request)
 
+@current_app.route('/api/products/import/<job_id>', methods=['GET'])
+def import_status_handler(job_id):
+    """Progreso de una importación en streaming (requiere sesión de admin)."""
+    if not session.get('admin_logged_in'):
+         return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    return db_logic.handle_import_status(job_id)
+
+@current_app.route('/api/categories', methods=['GET'])
+def categories_handler():
+    """Cantidad de productos por categoría (precalculada en el servidor)."""
+    return db_logic.handle_categories_get(request)
+
 @current_app.route('/api/chat', methods=['POST'])
+@rate_limited('chat')
 def chat_handler():
     """
     Ruta para la API del chatbot.
     Delega todo el trabajo al handler de 'ai_logica'.
     """
-    return ai_logica.handle_chat_request(request)
\ No newline at end of file
+    return ai_logica.handle_chat_request(request)
+
+@current_app.route('/api/health', methods=['GET'])
+def health_handler():
+    """Estado de los backends (circuit breakers, latencias) para operadores."""
+    local_llm = get_local_llm_client().snapshot()
+    supabase = {'breaker': get_supabase_client().breaker.snapshot()}
+    healthy = all(b['breaker']['state'] == 'closed' for b in (local_llm, supabase))
+    return jsonify({
+        'success': True,
+        'status': 'ok' if healthy else 'degraded',
+        'gemini_ready': current_app.gemini_is_ready,
+        'local_llm': local_llm,
+        'supabase': supabase,
+        'chat_cache': ai_logica.faq_cache.stats(),
+        'tool_cache': db_logic.product_info_cache.stats(),
+        'conversations': ai_logica.conversation_store.stats(),
+        'admission': {name: gate.snapshot() for name, gate in ai_logica.llm_gates.items()},
+        'rate_limit': get_rate_limiter().stats(),
+        'async_chat': current_app.asgi_app.stats() if getattr(current_app, 'asgi_app', None) else None,
+    })
+
+@current_app.route('/api/chat/stream', methods=['POST'])
+@rate_limited('chat')
+def chat_stream_handler():
+    """Igual que /api/chat, pero transmite la respuesta por Server-Sent Events."""
+    return ai_logica.handle_chat_stream(request)
+
+@current_app.route('/api/chat/cache', methods=['DELETE'])
+def chat_cache_handler():
+    """Invalida la caché de respuestas del chat (requiere sesión de admin)."""
+    if not session.get('admin_logged_in'):
+         return jsonify({'success': False, 'message': 'No autorizado'}), 401
+    return ai_logica.handle_chat_cache_delete(request)
+
+# ======================================================
+# 4. COMANDOS CLI
+# ======================================================
+
+@current_app.cli.command('images-derivatives')
+def images_derivatives_command():
+    """Genera (bajo demanda) los derivados AVIF/WebP de las imágenes del catálogo."""
+    db_logic.generate_image_derivatives()
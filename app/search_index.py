@@ -0,0 +1,205 @@
+# /home/genichurro/Documentos/v2/IA/app/search_index.py
+# --- RESPONSABILIDAD ---
+# 1. Índice invertido en memoria para buscar productos del catálogo.
+# 2. Normalizar texto: minúsculas, sin acentos, sin stopwords y con un
+#    stemmer ligero para español ("jabones" -> "jabon").
+# 3. Tolerar errores de tipeo con similitud por trigramas ("capuchino" -> "capuccino").
+# 4. Ordenar resultados por relevancia (BM25 con peso por campo).
+# 5. Actualizarse de forma incremental cuando cambia el catálogo.
+
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los',
+    'mas', 'me', 'mi', 'para', 'por', 'que', 'se', 'sin', 'su', 'sus', 'tu',
+    'un', 'una', 'uno', 'unos', 'unas', 'y', 'o',
+}
+
+# Peso de cada campo del producto en el puntaje
+FIELD_WEIGHTS = {'name': 3.0, 'category': 1.5, 'ingredients': 1.0, 'description': 0.5}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+# Parámetros BM25
+_K1 = 1.2
+_B = 0.75
+
+
+def fold(text):
+    """Minúsculas y sin acentos: 'Jabón' -> 'jabon'."""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def stem(token):
+    """Stemmer ligero para español: quita plurales y la vocal final."""
+    if len(token) > 4 and token.endswith('es') and token[-3] not in 'aeiou':
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith('s'):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in 'aeo':
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Texto -> lista de términos normalizados (sin acentos, sin stopwords, con stem)."""
+    return [stem(t) for t in _NON_ALNUM.split(fold(text)) if t and t not in STOPWORDS]
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    """Índice invertido de productos con búsqueda difusa por trigramas."""
+
+    def __init__(self, fuzzy_threshold=0.45, max_expansions=3):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_expansions = max_expansions
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)     # término -> {id: frecuencia ponderada}
+        self._doc_terms = {}                   # id -> {término: frecuencia ponderada}
+        self._doc_len = {}                     # id -> longitud ponderada
+        self._doc_fingerprint = {}             # id -> tupla de campos indexados
+        self._docs = {}                        # id -> producto
+        self._trigram_index = defaultdict(set) # trigrama -> {términos}
+        self._total_len = 0.0
+
+    # --- Mantenimiento del índice ---
+
+    @staticmethod
+    def _fingerprint(product):
+        ingredients = product.get('ingredients') or []
+        if isinstance(ingredients, str):
+            ingredients = [ingredients]
+        return (product.get('name'), product.get('category'),
+                tuple(ingredients), product.get('description'))
+
+    def _add_term(self, term):
+        if term not in self._postings or not self._postings[term]:
+            for gram in trigrams(term):
+                self._trigram_index[gram].add(term)
+
+    def _drop_term(self, term):
+        self._postings.pop(term, None)
+        for gram in trigrams(term):
+            terms = self._trigram_index.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._trigram_index[gram]
+
+    def _remove_doc(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    self._drop_term(term)
+        self._total_len -= self._doc_len.pop(doc_id, 0.0)
+        self._doc_fingerprint.pop(doc_id, None)
+        self._docs.pop(doc_id, None)
+
+    def _index_doc(self, product):
+        doc_id = str(product.get('id'))
+        fingerprint = self._fingerprint(product)
+        if self._doc_fingerprint.get(doc_id) == fingerprint:
+            # Campos de búsqueda sin cambios: solo refrescamos el producto (precio, stock...)
+            self._docs[doc_id] = product
+            return
+        self._remove_doc(doc_id)
+
+        name, category, ingredients, description = fingerprint
+        terms = defaultdict(float)
+        for field, value in (('name', name), ('category', category),
+                             ('ingredients', ' '.join(str(i) for i in ingredients)),
+                             ('description', description)):
+            for term in tokenize(value):
+                terms[term] += FIELD_WEIGHTS[field]
+
+        for term, weight in terms.items():
+            self._add_term(term)
+            self._postings[term][doc_id] = weight
+        length = sum(terms.values())
+        self._doc_terms[doc_id] = dict(terms)
+        self._doc_len[doc_id] = length
+        self._doc_fingerprint[doc_id] = fingerprint
+        self._docs[doc_id] = product
+        self._total_len += length
+
+    def on_catalog_change(self, event, payload):
+        """Listener de CatalogCache: 'replace' (lista), 'upsert' (lista) o 'remove' (ids)."""
+        with self._lock:
+            if event == 'replace':
+                new_ids = {str(p.get('id')) for p in payload}
+                for doc_id in list(self._docs):
+                    if doc_id not in new_ids:
+                        self._remove_doc(doc_id)
+                for product in payload:
+                    self._index_doc(product)
+            elif event == 'upsert':
+                for product in payload:
+                    self._index_doc(product)
+            elif event == 'remove':
+                for doc_id in payload:
+                    self._remove_doc(str(doc_id))
+
+    # --- Búsqueda ---
+
+    def _expand(self, term):
+        """Términos del vocabulario que coinciden con 'term' (exacto o difuso) y su similitud."""
+        if self._postings.get(term):
+            return [(term, 1.0)]
+        grams = trigrams(term)
+        counts = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                counts[candidate] += 1
+        scored = []
+        for candidate, shared in counts.items():
+            similarity = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if similarity >= self.fuzzy_threshold:
+                scored.append((candidate, similarity))
+        scored.sort(key=lambda cs: -cs[1])
+        return scored[:self.max_expansions]
+
+    def search(self, query, limit=10):
+        """Devuelve [(puntaje, producto)] ordenados de mayor a menor relevancia."""
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_len = (self._total_len / n_docs) or 1.0
+            scores = defaultdict(float)
+            matched = defaultdict(int)
+            unique_terms = list(dict.fromkeys(query_terms))
+            for term in unique_terms:
+                hit = set()
+                for candidate, similarity in self._expand(term):
+                    posting = self._postings[candidate]
+                    idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for doc_id, tf in posting.items():
+                        norm = tf + _K1 * (1 - _B + _B * self._doc_len[doc_id] / avg_len)
+                        scores[doc_id] += similarity * idf * tf * (_K1 + 1) / norm
+                        hit.add(doc_id)
+                for doc_id in hit:
+                    matched[doc_id] += 1
+            # Premia los productos que cubren más términos de la consulta
+            unique_terms = len(unique_terms)
+            ranked = sorted(
+                ((score * (0.5 + 0.5 * matched[doc_id] / unique_terms), self._docs[doc_id])
+                 for doc_id, score in scores.items()),
+                key=lambda sp: -sp[0])
+            return ranked[:limit]
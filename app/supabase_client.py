@@ -0,0 +1,154 @@
+# /home/genichurro/Documentos/v2/IA/app/supabase_client.py
+# --- RESPONSABILIDAD ---
+# 1. Mantener las conexiones HTTP (keep-alive) hacia la API REST de Supabase.
+# 2. Una 'requests.Session' con pool propio por tipo de clave (anon / service).
+# 3. Reintentar con backoff + jitter las peticiones idempotentes (GET/HEAD).
+# 4. Fallar rápido con un circuit breaker cuando Supabase está caído.
+# 5. Recortar timeouts y reintentos al plazo de la petición en curso ('deadline').
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.config import Config
+from app.deadline import stage_timeout
+from app.resilience import CircuitBreaker, CircuitOpenError, backoff_delay
+
+# Métodos que se pueden reintentar sin riesgo de duplicar escrituras
+IDEMPOTENT_METHODS = {'GET', 'HEAD'}
+# Códigos HTTP que consideramos fallo transitorio del backend
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class SupabaseClient:
+    """Cliente HTTP con pool de conexiones, reintentos y circuit breaker para PostgREST."""
+
+    def __init__(self, base_url, table, anon_key, service_key,
+                 pool_connections=4, pool_maxsize=16, max_retries=2,
+                 connect_timeout=3.05, read_timeout=15.0,
+                 breaker_threshold=5, breaker_reset=30.0):
+        self.base_url = f"{base_url}/rest/v1/{table}"
+        self.keys = {'anon': anon_key, 'service': service_key}
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = CircuitBreaker('supabase', breaker_threshold, breaker_reset)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, key_type):
+        """Devuelve (creándola una sola vez) la sesión asociada a un tipo de clave."""
+        session = self._sessions.get(key_type)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key_type)
+            if session is None:
+                key = self.keys.get(key_type)
+                if not key:
+                    raise Exception("Clave de Supabase (SERVICE o ANON) no disponible.")
+                session = requests.Session()
+                # max_retries=0: los reintentos los controlamos aquí (con jitter y breaker)
+                adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize,
+                                      max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Content-Type': 'application/json',
+                    'apikey': key,
+                    'Authorization': f'Bearer {key}'
+                })
+                self._sessions[key_type] = session
+            return session
+
+    def request(self, method, endpoint, body=None, use_service_key=False, custom_headers=None, timeout=None):
+        """
+        Ejecuta la petición y devuelve el 'requests.Response' final.
+        Lanza CircuitOpenError si el circuito está abierto, DeadlineExceeded si no
+        queda plazo para otro intento, o la excepción de 'requests' si se agotan
+        los reintentos por errores de red.
+        """
+        session = self._session('service' if use_service_key else 'anon')
+        url = f"{self.base_url}{endpoint}"
+        method = method.upper()
+        attempts = 1 + (self.max_retries if method in IDEMPOTENT_METHODS else 0)
+        timeout = timeout or self.timeout
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        kwargs = {'headers': custom_headers}
+        if body and method != 'GET':
+            kwargs['json'] = body
+
+        for attempt in range(attempts):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+
+            last_attempt = attempt == attempts - 1
+            try:
+                # Cada intento usa solo lo que queda del plazo de la petición (si hay)
+                budget = stage_timeout(read_timeout, 'supabase')
+                kwargs['timeout'] = (min(connect_timeout, budget), budget)
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # Un timeout recortado por el plazo no dice nada de la salud de Supabase
+                if not (isinstance(e, requests.exceptions.Timeout) and budget < read_timeout
+                        and self.breaker.state == CircuitBreaker.CLOSED):
+                    self.breaker.record_failure()
+                if last_attempt:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Plazo agotado o error local antes de llegar a Supabase: sin veredicto,
+                # pero la sonda de 'half_open' no puede quedarse ocupada
+                self.breaker.release_probe()
+                raise
+
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+            if response.status_code in RETRYABLE_STATUS and not last_attempt:
+                response.close()
+                time.sleep(backoff_delay(attempt))
+                continue
+            return response
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_supabase_client():
+    """Devuelve el cliente compartido del proceso (se crea en el primer uso)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SupabaseClient(
+                    Config.SUPABASE_URL,
+                    Config.SUPABASE_TABLE,
+                    Config.SUPABASE_ANON_KEY,
+                    Config.SUPABASE_SERVICE_KEY,
+                    pool_connections=Config.SUPABASE_POOL_CONNECTIONS,
+                    pool_maxsize=Config.SUPABASE_POOL_MAXSIZE,
+                    max_retries=Config.SUPABASE_MAX_RETRIES,
+                    connect_timeout=Config.SUPABASE_CONNECT_TIMEOUT,
+                    read_timeout=Config.SUPABASE_TIMEOUT,
+                    breaker_threshold=Config.SUPABASE_BREAKER_THRESHOLD,
+                    breaker_reset=Config.SUPABASE_BREAKER_RESET,
+                )
+    return _client
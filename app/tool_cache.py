@@ -0,0 +1,115 @@
+# /home/genichurro/Documentos/v2/IA/app/tool_cache.py
+# --- RESPONSABILIDAD ---
+# 1. Guardar por unos segundos el resultado de las herramientas de IA
+#    (ej. 'get_product_info'), con la clave de los argumentos normalizados.
+# 2. Single-flight: si varias sesiones piden lo mismo a la vez, solo una hace
+#    la consulta y el resto espera y comparte su resultado.
+# 3. Invalidar por etiqueta (ej. el id de cada producto que aparece en el
+#    resultado) cuando el admin actualiza o elimina ese producto.
+# --- NOTA ---
+# Un resultado calculado mientras se invalidaba la caché se entrega a quien lo
+# pidió pero no se guarda (podría reflejar el estado anterior).
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+
+
+class ToolResultCache:
+    """Caché TTL + single-flight de resultados de herramientas, con invalidación por etiqueta."""
+
+    def __init__(self, ttl=10.0, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()        # clave -> (valor, etiquetas, guardado_en)
+        self._tags = defaultdict(set)        # etiqueta -> {claves}
+        self._inflight = {}                  # clave -> Future del cálculo en curso
+        self._generation = 0                 # sube con cada invalidación
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # Deben llamarse con el lock tomado.
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _store(self, key, value, tags):
+        self._drop(key)
+        self._entries[key] = (value, tags, time.monotonic())
+        for tag in tags:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def get_or_compute(self, key, compute):
+        """
+        Devuelve el valor guardado para 'key' o lo calcula con 'compute()', que
+        debe devolver (valor, etiquetas). Con etiquetas None el valor no se guarda
+        (ej. errores). Las llamadas concurrentes con la misma clave comparten el cálculo.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                generation = self._generation
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            return future.result()
+
+        try:
+            value, tags = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            if tags is not None and generation == self._generation:
+                self._store(key, value, frozenset(str(t) for t in tags))
+        future.set_result(value)
+        return value
+
+    def invalidate(self, tag=None):
+        """Borra las entradas con la etiqueta dada o, sin etiqueta, todas. Devuelve cuántas."""
+        with self._lock:
+            self._generation += 1
+            if tag is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._tags.clear()
+                return removed
+            keys = list(self._tags.get(str(tag), ()))
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+            }
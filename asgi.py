@@ -0,0 +1,17 @@
+# /home/genichurro/Documentos/v2/IA/asgi.py
+# --- RESPONSABILIDAD ---
+# 1. Punto de entrada ASGI: POST /api/chat se atiende con asyncio ('async_chat')
+#    y el resto de rutas con la app Flask de siempre.
+# 2. Uso: uvicorn asgi:application --host 0.0.0.0 --port 5000
+# --- NOTA ---
+# run.py (servidor de desarrollo de Flask) y api/index.py (WSGI) siguen igual.
+
+from app import create_app
+
+app = create_app()
+
+if app.asgi_app is None:
+    raise RuntimeError("La ruta asíncrona del chat no está disponible: instala 'httpx', 'asgiref' y 'uvicorn' "
+                       "(requirements-optional.txt) y revisa ASYNC_CHAT_ENABLED.")
+
+application = app.asgi_app
@@ -5,6 +5,7 @@
 //   para verificar las credenciales y establecer una sesión Flask segura.
 // - handleLogout ahora llama al endpoint /api/logout.
 // - checkAuthentication ahora verifica la sesión del backend en lugar de localStorage.
+// - [NUEVO] importProducts usa la importación 'delta' con vista previa (dry_run).
 
 // ... (convertGoogleDriveUrl function remains the same) ...
 function convertGoogleDriveUrl(url) {
@@ -160,7 +161,8 @@ class AdminPanel {
 
     async loadProducts() {
         try {
-            const data = await apiRequest('products');
+            // 'no-cache': el navegador revalida con If-None-Match y reutiliza su copia si recibe 304
+            const data = await apiRequest('products', { cache: 'no-cache' });
             this.products = data.products || [];
             if (this.products.length > 0) {
                 console.log(`Se cargaron ${this.products.length} productos desde la base de datos.`);
@@ -185,7 +187,7 @@ class AdminPanel {
 
         tbody.innerHTML = this.products.map(product => `
             <tr>
-                <td><img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}" class="product-table-image"></td>
+                <td><picture>${imageSources(product, '64px')}<img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}" class="product-table-image"></picture></td>
                 <td>${escapeHtml(product.name)}</td>
                 <td><span class="category-badge">${escapeHtml(CONFIG.CATEGORIES[product.category] || product.category)}</span></td>
                 <td>${formatPrice(product.price)}</td>
@@ -312,14 +314,25 @@ class AdminPanel {
         }
     }
 
+    // --- [MODIFICADO] Importación 'delta': primero previsualiza el diff y luego aplica ---
     async importProducts() {
-        if (!confirmAction('¿Estás seguro? Esto agregará o actualizará los productos de ejemplo en la base de datos.')) {
-            return;
-        }
         try {
+            const preview = await apiRequest('products', {
+                method: 'POST',
+                body: JSON.stringify({ action: 'import', mode: 'delta', dry_run: true, products: DEFAULT_PRODUCTS })
+            });
+            const s = preview.summary || {};
+            if (!s.inserted && !s.changed) {
+                showToast(`No hay cambios que importar (${s.unchanged || 0} productos sin cambios).`, 'success');
+                return;
+            }
+            if (!confirmAction(`Se agregarán ${s.inserted || 0} productos y se actualizarán ${s.changed || 0} ` +
+                               `(${s.unchanged || 0} sin cambios). ¿Continuar?`)) {
+                return;
+            }
             const data = await apiRequest('products', {
                 method: 'POST',
-                body: JSON.stringify({ action: 'import', products: DEFAULT_PRODUCTS })
+                body: JSON.stringify({ action: 'import', mode: 'delta', products: DEFAULT_PRODUCTS })
             });
             showToast(data.message, 'success');
             await this.loadProducts();
@@ -5,13 +5,28 @@
 // - handleAIResult ahora reconoce la acción 'navigate_and_filter'.
 // - Llama a una nueva función 'filterByCategory' en productManager
 //   (que crearemos en products.js) para aplicar el filtro de categoría.
+// - [NUEVO] Las respuestas llegan por streaming (SSE en /api/chat/stream):
+//   el texto se muestra a medida que se genera y las acciones llegan como
+//   eventos 'action'. Si el streaming no está disponible se usa /api/chat.
+// - [NUEVO] Una respuesta puede traer varias acciones ('actions'): se muestran
+//   todos los mensajes juntos y se ejecutan las acciones en orden.
+// - [NUEVO] El historial vive en el servidor: solo se envía el mensaje nuevo y
+//   el 'conversation_id' (guardado en sessionStorage). El historial local solo
+//   se usa para pintar el chat (y, recortado, como respaldo si el servidor no
+//   conoce el 'conversation_id').
+
+// Mensajes previos que se envían como respaldo junto al 'conversation_id'
+const FALLBACK_HISTORY_MESSAGES = 6;
 
 class HerbIAChat {
     constructor() {
         this.isOpen = false;
         this.messages = this.loadHistory();
+        this.conversationId = sessionStorage.getItem('herbia_conversation_id');
         this.isTyping = false;
+        this.isStreaming = false;
         this.aiEndpoint = CONFIG.API_URL + '/chat';
+        this.streamEndpoint = CONFIG.API_URL + '/chat/stream';
         this.init();
     }
 
@@ -88,6 +103,28 @@ class HerbIAChat {
         sessionStorage.setItem('herbia_chat_history', JSON.stringify(recentMessages));
     }
     
+    // --- [NUEVO] Conversación en el servidor ---
+    setConversationId(conversationId) {
+        if (conversationId && conversationId !== this.conversationId) {
+            this.conversationId = conversationId;
+            sessionStorage.setItem('herbia_conversation_id', conversationId);
+        }
+    }
+
+    buildRequestBody(userMessage) {
+        const body = { prompt: userMessage };
+        if (this.conversationId) {
+            body.conversation_id = this.conversationId;
+            // Respaldo por si el servidor no conoce el ID (otro worker, caducado):
+            // solo lo usa en ese caso y responde con 'conversation_reset'
+            body.history = this.messages.slice(-(FALLBACK_HISTORY_MESSAGES + 1), -1);
+        } else if (this.messages.length > 2) {
+            // Historial de una sesión anterior a este cambio: el servidor lo importa una vez
+            body.history = this.messages.slice(0, -1);
+        }
+        return JSON.stringify(body);
+    }
+
     renderHistory() {
         // ... (sin cambios) ...
         this.elements.messages.innerHTML = '';
@@ -98,19 +135,20 @@ class HerbIAChat {
     async sendMessage() {
         // ... (sin cambios) ...
         const message = this.elements.input.value.trim();
-        if (!message || this.isTyping) return;
+        if (!message || this.isTyping || this.isStreaming) return;
         this.addUserMessage(message);
         this.elements.input.value = '';
         this.showTypingIndicator();
+        this.isStreaming = true;
         try {
-            const result = await this.getAIResponse(message);
-            this.hideTypingIndicator();
-            await this.handleAIResult(result);
+            await this.streamAIResponse(message);
         } catch (error) {
             this.hideTypingIndicator();
             const errorMsg = error.message.includes("JSON") ? "Respuesta inválida servidor." : error.message;
             this.addBotMessage(`Lo siento, ocurrió un error: ${errorMsg}`);
             console.error('Error getting AI response:', error);
+        } finally {
+            this.isStreaming = false;
         }
     }
 
@@ -179,31 +217,152 @@ class HerbIAChat {
     }
 
     async getAIResponse(userMessage) {
-        // ... (sin cambios) ...
         const response = await fetch(this.aiEndpoint, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ prompt: userMessage, history: this.messages })
+            body: this.buildRequestBody(userMessage)
         });
-        if (!response.ok) {
-            try {
-                const errData = await response.json();
-                throw new Error(errData.response || errData.message || `Error HTTP: ${response.status}`);
-            } catch (e) { throw new Error(`Error HTTP: ${response.status} - ${response.statusText}`); }
-        }
-        const data = await response.json();
+        if (!response.ok) throw await this.responseError(response);
+        return this.readChatResult(await response.json());
+    }
+
+    // Respuesta JSON completa del chat (de /api/chat o de un proxy que no deja pasar SSE)
+    readChatResult(data) {
+        this.setConversationId(data.conversation_id);
         if (!data.success) { throw new Error(data.response || 'Error API chat.'); }
         return data;
     }
 
+    // --- [NUEVO] Error HTTP con el mensaje del servidor (429: cuándo reintentar) ---
+    async responseError(response) {
+        let message = `Error HTTP: ${response.status} - ${response.statusText}`;
+        try {
+            const errData = await response.json();
+            message = errData.response || errData.message || message;
+        } catch (e) { /* Cuerpo sin JSON: se queda el código HTTP */ }
+        if (response.status === 429) {
+            const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+            message = retryAfter > 0
+                ? `Demasiados mensajes seguidos. Inténtalo de nuevo en ${retryAfter} s.`
+                : 'Demasiados mensajes seguidos. Inténtalo de nuevo en unos segundos.';
+        }
+        return new Error(message);
+    }
+
+    // --- [NUEVO] Streaming por Server-Sent Events ---
+    async streamAIResponse(userMessage) {
+        const response = await fetch(this.streamEndpoint, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+            body: this.buildRequestBody(userMessage)
+        });
+        // Los errores (4xx/5xx, 429 incluido) se muestran tal cual: repetir la
+        // petición por /api/chat gastaría otro turno del límite
+        if (!response.ok) throw await this.responseError(response);
+        const contentType = response.headers.get('Content-Type') || '';
+        if (contentType.includes('application/json')) {
+            // Respuesta completa en JSON: el turno ya se procesó, no se repite la petición
+            const result = this.readChatResult(await response.json());
+            this.hideTypingIndicator();
+            await this.handleAIResult(result);
+            return;
+        }
+        if (!response.body || !contentType.includes('text/event-stream')) {
+            // Sin streaming (navegador o proxy que no lo soporta): respuesta completa
+            const result = await this.getAIResponse(userMessage);
+            this.hideTypingIndicator();
+            await this.handleAIResult(result);
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let streamed = null;
+        let hadActions = false;
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const event = this.parseSSEEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+                if (!event) continue;
+
+                if (event.type === 'meta') {
+                    this.setConversationId(event.data.conversation_id);
+                } else if (event.type === 'token') {
+                    if (!streamed) {
+                        this.hideTypingIndicator();
+                        streamed = this.startStreamingMessage();
+                    }
+                    streamed.text += event.data.text;
+                    streamed.element.innerHTML = this.formatStreamText(streamed.text);
+                    this.scrollToBottom();
+                } else if (event.type === 'action') {
+                    this.hideTypingIndicator();
+                    hadActions = true;
+                    await this.handleAIResult(event.data);
+                } else if (event.type === 'error') {
+                    if (streamed) this.finishStreamingMessage(streamed);
+                    throw new Error(event.data.response || 'Error API chat.');
+                } else if (event.type === 'done') {
+                    this.hideTypingIndicator();
+                    if (streamed) this.finishStreamingMessage(streamed);
+                    else if (!hadActions) this.addBotMessage(event.data.response || 'No pude generar una respuesta.');
+                    return;
+                }
+            }
+        }
+        this.hideTypingIndicator();
+        if (streamed) this.finishStreamingMessage(streamed);
+    }
+
+    parseSSEEvent(raw) {
+        let type = 'message';
+        const dataLines = [];
+        raw.split('\n').forEach(line => {
+            if (line.startsWith('event:')) type = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+        });
+        if (dataLines.length === 0) return null;
+        try { return { type, data: JSON.parse(dataLines.join('\n')) }; }
+        catch (e) { console.error('Evento SSE inválido:', raw); return null; }
+    }
+
+    startStreamingMessage() {
+        const timestamp = new Date();
+        this.renderMessage('', 'bot', timestamp);
+        const element = this.elements.messages.lastElementChild.querySelector('.message-content p');
+        return { element, text: '', timestamp };
+    }
+
+    finishStreamingMessage(streamed) {
+        this.messages.push({ text: this.formatStreamText(streamed.text), sender: 'bot', timestamp: streamed.timestamp.toISOString() });
+        this.saveHistory();
+        this.scrollToBottom();
+    }
+
+    formatStreamText(text) {
+        return escapeHtml(text).replace(/\n/g, '<br>');
+    }
+
     // --- [MODIFICADO] ---
     async handleAIResult(result) {
         // 1. Muestra SIEMPRE la respuesta de texto
-        this.addBotMessage(result.response); 
+        this.addBotMessage(String(result.response || '').replace(/\n/g, '<br>')); 
         
+        // 2. Ejecuta acciones del lado del cliente (una o varias)
+        const actions = Array.isArray(result.actions) && result.actions.length > 0 ? result.actions : [result];
+        for (const actionResult of actions) {
+            await this.runClientAction(actionResult);
+        }
+    }
+
+    async runClientAction(result) {
         const action = result.action;
         
-        // 2. Ejecuta acciones del lado del cliente
         if (action === "navigate") {
             scrollToElement(result.target);
             showToast(`Listo, te llevé a la sección ${result.target.substring(1).replace('-', ' ')}`, 'success');
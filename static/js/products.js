@@ -3,6 +3,7 @@
 // --- [MEJORA] ---
 // - Se añadió la función 'filterByCategory' para ser llamada externamente (por chat.js).
 // - Esta función simula un clic en el tab de categoría correspondiente.
+// - [NUEVO] Los conteos de las pestañas vienen de /api/categories (calculados en el servidor).
 
 console.log("-> products.js cargado.");
 
@@ -15,6 +16,7 @@ class ProductManager {
         this.minPrice = 0;
         // [IMPORTANTE] Asegúrate que este maxPrice coincida con el 'max' del slider HTML
         this.maxPrice = 500; // Lo ajusté a 500 basado en tu HTML
+        this.categoryCounts = null; // Conteos calculados por el servidor (/api/categories)
         this.init();
     }
 
@@ -32,20 +34,36 @@ class ProductManager {
         const loadingEl = document.querySelector('.products-grid .loading');
         if (loadingEl) console.log("ProductManager: Mostrando spinner.");
         try {
-            const data = await apiRequest('products');
+            // 'no-cache': el navegador revalida con If-None-Match y reutiliza su copia si recibe 304
+            const data = await apiRequest('products', { cache: 'no-cache' });
             this.products = data.products || [];
             console.log(`ProductManager: ✅ Productos cargados: ${this.products.length}`);
             if (this.products.length > 0) console.log("ProductManager: Ejemplo:", this.products[0]);
+            await this.loadCategoryCounts();
         } catch (error) {
             console.error('ProductManager: ❌ Error cargando productos:', error.message);
             console.warn("ProductManager: Usando productos de respaldo.");
             this.products = typeof DEFAULT_PRODUCTS !== 'undefined' ? DEFAULT_PRODUCTS : [];
+            this.categoryCounts = null;
             showToast('Error de conexión. Mostrando productos ejemplo.', 'error');
         } finally {
             if (loadingEl) { loadingEl.remove(); console.log("ProductManager: Spinner ocultado."); }
         }
     }
 
+    // --- [NUEVO] Conteos por categoría precalculados en el servidor ---
+    async loadCategoryCounts() {
+        try {
+            const data = await apiRequest('categories', { cache: 'no-cache' });
+            const counts = { all: data.total || 0 };
+            (data.categories || []).forEach(c => { counts[c.category] = c.count; });
+            this.categoryCounts = counts;
+        } catch (error) {
+            console.warn('ProductManager: No se pudieron cargar los conteos de categorías, se calcularán localmente.');
+            this.categoryCounts = null;
+        }
+    }
+
     setupCategoryTabs() {
         // ... (sin cambios) ...
         const tabButtons = document.querySelectorAll('.tab-button');
@@ -191,11 +209,14 @@ class ProductManager {
     }
 
     updateCategoryCounts() {
-        // ... (sin cambios) ...
         const categories = ['all', ...Object.keys(CONFIG.CATEGORIES)];
-        const counts = {};
-        this.products.forEach(p => { counts[p.category] = (counts[p.category] || 0) + 1; });
-        counts['all'] = this.products.length;
+        // Usa los conteos del servidor; solo calcula localmente con productos de respaldo
+        let counts = this.categoryCounts;
+        if (!counts) {
+            counts = {};
+            this.products.forEach(p => { counts[p.category] = (counts[p.category] || 0) + 1; });
+            counts['all'] = this.products.length;
+        }
         categories.forEach(category => {
             const countElement = document.getElementById(`count-${category}`);
             if (countElement) countElement.textContent = counts[category] || 0;
@@ -210,7 +231,7 @@ class ProductManager {
         const stock = product.stock;
         return `
             <div class="product-card" data-id="${product.id}" data-category="${escapeHtml(product.category)}">
-                <div class="product-image-wrapper"><img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}" class="product-image" loading="lazy" onerror="this.src='https://via.placeholder.com/300?text=No+Imagen';"></div>
+                <div class="product-image-wrapper"><picture>${imageSources(product, '(max-width: 640px) 50vw, 320px')}<img src="${escapeHtml(product.image)}" alt="${escapeHtml(product.name)}" class="product-image" loading="lazy" onerror="this.src='https://via.placeholder.com/300?text=No+Imagen';"></picture></div>
                 <div class="product-info">
                     <h3 class="product-name">${escapeHtml(product.name)}</h3>
                     <p class="product-description">${escapeHtml(truncateText(description, 100))}</p>
@@ -185,6 +185,17 @@ function escapeHtml(text) {
 }
 
 
+// <source> AVIF/WebP a partir de 'image_srcset' (derivados generados por el servidor)
+function imageSources(product, sizes) {
+    const srcset = product && product.image_srcset;
+    if (!srcset) return '';
+    return ['avif', 'webp']
+        .filter(format => srcset[format])
+        .map(format => `<source type="image/${format}" srcset="${escapeHtml(srcset[format])}" sizes="${escapeHtml(sizes)}">`)
+        .join('');
+}
+
+
 // Cargar imagen con preview
 function loadImagePreview(input, previewElement) {
     const file = input.files[0];
@@ -0,0 +1,11 @@
+# /home/genichurro/Documentos/v2/IA/tests/conftest.py
+# --- RESPONSABILIDAD ---
+# 1. Variables de entorno mínimas para importar 'app' sin .env: Config valida
+#    las credenciales al importarse y detiene el proceso si faltan.
+
+import os
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'test-secret-key')
+os.environ.setdefault('SUPABASE_URL', 'http://127.0.0.1:1')
+os.environ.setdefault('SUPABASE_ANON_KEY', 'test-anon-key')
+os.environ.setdefault('SUPABASE_SERVICE_KEY', 'test-service-key')
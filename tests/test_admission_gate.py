@@ -0,0 +1,71 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_admission_gate.py
+# --- RESPONSABILIDAD ---
+# 1. 'AdmissionGate' y 'AsyncAdmissionGate' aplican los mismos límites: hueco
+#    libre, cola con plazo ('espera agotada') y cola llena ('cola llena').
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.resilience import AdmissionGate, AsyncAdmissionGate, OverloadedError
+
+
+def test_gate_queues_times_out_and_rejects():
+    gate = AdmissionGate('test', max_concurrent=1, max_queue=1, queue_timeout=0.1)
+    holding, release = threading.Event(), threading.Event()
+
+    def hold(timeout=None):
+        with gate.admit(timeout=timeout):
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+
+    with pytest.raises(OverloadedError, match='espera agotada'):
+        with gate.admit():
+            pass
+    waiter = threading.Thread(target=hold, args=(5,))  # Ocupa la cola
+    waiter.start()
+    while gate.snapshot()['queue_depth'] < 1:
+        time.sleep(0.01)
+    with pytest.raises(OverloadedError, match='cola llena'):
+        with gate.admit():
+            pass
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    state = gate.snapshot()
+    assert (state['admitted'], state['timed_out'], state['rejected'], state['in_flight']) == (2, 1, 1, 0)
+
+
+def test_async_gate_queues_times_out_and_rejects():
+    gate = AsyncAdmissionGate('test', max_concurrent=1, max_queue=1, queue_timeout=0.1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with gate.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError, match='espera agotada'):
+            async with gate.admit():
+                pass
+        waiter = asyncio.create_task(hold())  # Ocupa la cola
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError, match='cola llena'):
+            async with gate.admit():
+                pass
+        release.set()
+        await asyncio.wait_for(asyncio.gather(holder, waiter), 5)
+
+    asyncio.run(scenario())
+    state = gate.snapshot()
+    assert (state['admitted'], state['timed_out'], state['rejected'], state['in_flight']) == (2, 1, 1, 0)
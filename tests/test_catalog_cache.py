@@ -0,0 +1,77 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_catalog_cache.py
+# --- RESPONSABILIDAD ---
+# 1. El payload cacheado de GET /api/products y su ETag siempre corresponden
+#    al mismo estado del catálogo (también si un upsert llega en medio).
+# 2. ETag / If-None-Match: 304 mientras no cambie el catálogo, 200 después.
+
+import json
+
+import pytest
+from flask import Flask, request
+
+from app import db_logic
+from app.catalog_cache import CatalogCache
+
+ROWS = [
+    {'id': 1, 'name': 'Jabón de avena', 'price': 10, 'category': 'jabones', 'ingredients': 'avena'},
+    {'id': 2, 'name': 'Crema de rosas', 'price': 20, 'category': 'cremas', 'ingredients': 'rosa'},
+]
+
+
+def _catalog():
+    return CatalogCache(lambda: [dict(row) for row in ROWS], ttl=3600)
+
+
+def test_snapshot_reflects_upsert_between_list_and_payload():
+    catalog = _catalog()
+    catalog.get_products()
+    original_get_products = catalog.get_products
+
+    def get_products_then_write():
+        # Un upsert que llega justo después de leer la lista de productos
+        products = original_get_products()
+        catalog.upsert([{'id': 1, 'price': 99}])
+        return products
+
+    catalog.get_products = get_products_then_write
+    payload, etag, _ = catalog.get_snapshot()
+    catalog.get_products = original_get_products
+
+    # El payload cacheado (y su ETag) describen el catálogo actual, no uno anterior
+    current = json.dumps({'success': True, 'products': catalog.get_products()},
+                         ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    assert catalog.get_snapshot()[:2] == (payload, etag)
+    assert payload == current
+
+
+def test_snapshot_changes_etag_only_when_content_changes():
+    catalog = _catalog()
+    payload, etag, _ = catalog.get_snapshot()
+
+    catalog.replace([dict(row) for row in ROWS])  # Recarga con el mismo contenido
+    assert catalog.get_snapshot()[1] == etag
+
+    catalog.upsert([{'id': 2, 'stock': 3}])
+    new_payload, new_etag, _ = catalog.get_snapshot()
+    assert new_etag != etag and new_payload != payload
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(db_logic, 'catalog', _catalog())
+    app = Flask(__name__)
+    app.add_url_rule('/api/products', 'products', lambda: db_logic.handle_products_get(request))
+    return app.test_client()
+
+
+def test_products_etag_revalidation(client):
+    first = client.get('/api/products')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    assert client.get('/api/products', headers={'If-None-Match': etag}).status_code == 304
+
+    db_logic.catalog.upsert([{'id': 1, 'price': 11}])
+    changed = client.get('/api/products', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
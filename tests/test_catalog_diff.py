@@ -0,0 +1,54 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_catalog_diff.py
+# --- RESPONSABILIDAD ---
+# 1. 'diff_catalog' clasifica insertados / cambiados / sin cambios / eliminados
+#    y solo envía las filas nuevas o cambiadas.
+# 2. Las diferencias de formato (ingredientes en texto o lista, id numérico o
+#    texto, precio) no cuentan como cambios.
+# 3. Con ids repetidos gana la última aparición, como en el upsert por lotes.
+
+from app.catalog_diff import canonical_ingredients, diff_catalog
+
+CURRENT = [
+    {'id': 1, 'name': 'Jabón de avena', 'price': 10, 'category': 'jabones', 'stock': 3,
+     'featured': False, 'description': 'Suave', 'ingredients': 'avena, miel', 'image': None},
+    {'id': 2, 'name': 'Crema de rosas', 'price': 20.5, 'category': 'cremas', 'stock': 0,
+     'featured': True, 'description': None, 'ingredients': ['rosa'], 'image': None},
+]
+
+
+def _row(base, **changes):
+    row = dict(base)
+    row.update(changes)
+    return row
+
+
+def test_ingredients_are_compared_in_canonical_form():
+    assert canonical_ingredients('a, b,,c ') == 'a,b,c'
+    assert canonical_ingredients([' a', 'b', '', 'c']) == 'a,b,c'
+    assert canonical_ingredients(None) == ''
+
+
+def test_format_only_differences_are_unchanged():
+    incoming = [
+        _row(CURRENT[0], id='1', price='10.00', ingredients=['avena', ' miel ']),
+        _row(CURRENT[1], ingredients='rosa'),
+    ]
+    diff = diff_catalog(incoming, CURRENT)
+    assert diff['unchanged'] == ['1', 2]
+    assert diff['rows_to_upsert'] == [] and diff['removed'] == []
+
+
+def test_classifies_inserted_changed_and_removed():
+    incoming = [_row(CURRENT[0], stock=7), _row(CURRENT[0], id=3, name='Nuevo')]
+    diff = diff_catalog(incoming, CURRENT)
+    assert diff['changed'] == [1]
+    assert diff['inserted'] == [3]
+    assert diff['removed'] == [2]
+    assert [row['id'] for row in diff['rows_to_upsert']] == [1, 3]
+
+
+def test_duplicate_ids_keep_the_last_row():
+    incoming = [_row(CURRENT[0], stock=7), _row(CURRENT[0], stock=3)]
+    diff = diff_catalog(incoming, CURRENT[:1])
+    assert diff['unchanged'] == [1]
+    assert diff['rows_to_upsert'] == []
@@ -0,0 +1,59 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_catalog_query.py
+# --- RESPONSABILIDAD ---
+# 1. Paginación por cursor de GET /api/products: recorre todo el catálogo sin
+#    repetir ni saltar productos, en ambos sentidos.
+# 2. Un cursor mal formado (o con tipos que no corresponden al orden) es un
+#    ValueError (400), nunca un error interno.
+
+import base64
+import json
+
+import pytest
+
+from app import catalog_query
+from app.catalog_cache import CatalogCache
+
+ROWS = [{'id': i, 'name': f'Producto {i:02d}', 'price': (i * 7) % 10, 'category': 'jabones'}
+        for i in range(1, 12)]
+
+
+def _walk(catalog, sort, limit=4):
+    seen, cursor = [], None
+    while True:
+        args = {'sort': sort, 'limit': str(limit)}
+        if cursor:
+            args['cursor'] = cursor
+        page, cursor = catalog_query.query_products(catalog, catalog_query.parse_query(args))
+        seen.extend(p['id'] for p in page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize('sort', list(catalog_query.SORTS))
+def test_cursor_walk_covers_catalog_once(sort):
+    catalog = CatalogCache(lambda: [dict(row) for row in ROWS], ttl=3600)
+    seen = _walk(catalog, sort)
+    assert sorted(seen) == [row['id'] for row in ROWS]
+
+
+def _cursor(data):
+    raw = json.dumps(data).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('sort, data', [
+    ('price-asc', {'s': 'price-asc', 'k': ['x', 1]}),
+    ('price-asc', {'s': 'price-asc', 'k': [1.0, 'a']}),
+    ('name-asc', {'s': 'name-asc', 'k': ['a', 'b', 'c']}),
+    ('name-asc', {'s': 'name-asc', 'k': [True, '1']}),
+    ('name-asc', {'s': 'name-asc', 'k': 5}),
+])
+def test_malformed_cursor_is_value_error(sort, data):
+    with pytest.raises(ValueError, match='Cursor inválido'):
+        catalog_query.parse_query({'sort': sort, 'cursor': _cursor(data)})
+
+
+def test_cursor_for_other_sort_is_rejected():
+    cursor = catalog_query.encode_cursor('name-asc', ('a', '1'))
+    with pytest.raises(ValueError):
+        catalog_query.parse_query({'sort': 'price-asc', 'cursor': cursor})
@@ -0,0 +1,46 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_category_index.py
+# --- RESPONSABILIDAD ---
+# 1. Regresión: names('all') debe reflejar los 'upsert' y 'remove' del catálogo
+#    aunque ya estuviera calculado (y cacheado) antes del cambio.
+# 2. Categorías con tildes o mayúsculas caen en la misma clave que usa el
+#    filtro de categoría de GET /api/products.
+
+from app.category_index import CategoryIndex
+
+
+def _product(product_id, name, category):
+    return {'id': product_id, 'name': name, 'category': category}
+
+
+def test_names_all_tracks_upsert_and_remove():
+    index = CategoryIndex()
+    index.on_catalog_change('replace', [_product(1, 'Jabón de avena', 'jabones')])
+    assert index.names('all') == ['Jabón de avena']
+
+    index.on_catalog_change('upsert', [_product(2, 'Crema de karité', 'cremas')])
+    assert sorted(index.names('all')) == ['Crema de karité', 'Jabón de avena']
+
+    index.on_catalog_change('remove', [1])
+    assert index.names('all') == ['Crema de karité']
+
+
+def test_names_all_tracks_rename_in_place():
+    index = CategoryIndex()
+    index.on_catalog_change('replace', [_product(1, 'Jabón de avena', 'jabones')])
+    assert index.names('all') == ['Jabón de avena']
+
+    index.on_catalog_change('upsert', [_product(1, 'Jabón de avena y miel', 'jabones')])
+    assert index.names('all') == ['Jabón de avena y miel']
+
+
+def test_accented_category_shares_key_with_catalog_filter():
+    from app import catalog_query
+
+    index = CategoryIndex()
+    index.on_catalog_change('replace', [_product(1, 'Té verde', 'Té'), _product(2, 'Té rojo', 'te')])
+
+    assert index.counts() == {'te': 2}
+    assert index.resolve('TÉ') == 'te'
+    query = catalog_query.parse_query({'category': 'Té'})
+    assert query['category'] == 'te'
+    assert all(catalog_query._matches(p, query) for p in (_product(1, 'Té verde', 'Té'), _product(2, 'Té rojo', 'te')))
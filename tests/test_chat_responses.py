@@ -0,0 +1,51 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_chat_responses.py
+# --- RESPONSABILIDAD ---
+# 1. Traducción compartida por /api/chat, la ruta ASGI y el SSE: errores del
+#    LLM local y de Gemini a respuestas del chat, y resultado enrutado a
+#    (cuerpo, código, cabeceras).
+
+import pytest
+import requests
+from google.api_core import exceptions as api_exceptions
+
+from app import ai_logica
+from app.deadline import DeadlineExceeded
+from app.resilience import CircuitOpenError, OverloadedError
+
+ROUTING = {'intent': 'complex_action', 'intent_path': 'rules', 'path': 'gemini'}
+
+
+@pytest.mark.parametrize('error, response', [
+    (DeadlineExceeded('local_llm'), 'Asistente local tardó.'),
+    (CircuitOpenError('local_llm', 3), 'Asistente local no disponible.'),
+    (requests.exceptions.ReadTimeout(), 'Asistente local tardó.'),
+    (requests.exceptions.ConnectionError(), 'Error de conexión local.'),
+    (ValueError('Respuesta vacía.'), 'Error local: Respuesta vacía.'),
+])
+def test_local_llm_errors(error, response):
+    assert ai_logica.local_llm_error_response(error) == {'success': False, 'response': response}
+
+
+@pytest.mark.parametrize('error, code', [
+    (OverloadedError('gemini', 2, 'cola llena'), 429),
+    (DeadlineExceeded('gemini'), 504),
+    (api_exceptions.PermissionDenied('clave'), 403),
+    (api_exceptions.InternalServerError('caído'), 500),
+    (RuntimeError('otro'), 500),
+])
+def test_gemini_error_codes(error, code):
+    body, status = ai_logica.gemini_error_response(error, 'test')
+    assert status == code and body['success'] is False
+
+
+def test_routed_response_maps_backend_codes():
+    ok, code, headers = ai_logica.routed_response('p', [], {'success': True, 'response': 'r'}, dict(ROUTING))
+    assert (code, headers, ok['intent']) == (200, {}, 'complex_action')
+
+    body, code, headers = ai_logica.routed_response(
+        'p', [], ({'success': False, 'response': 'tarde'}, 504), dict(ROUTING))
+    assert (code, headers) == (504, {})
+
+    overloaded = ai_logica.overloaded_response(OverloadedError('gemini', 3, 'cola llena'))
+    body, code, headers = ai_logica.routed_response('p', [], overloaded, dict(ROUTING))
+    assert (code, headers) == (429, {'Retry-After': '3'})
@@ -0,0 +1,54 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_conversation_store.py
+# --- RESPONSABILIDAD ---
+# 1. Varios workers sobre el mismo SQLite no se pisan los turnos (escritura
+#    optimista) y cada uno lee siempre la última versión.
+# 2. Un ID desconocido crea una conversación nueva a partir del historial del
+#    cliente y lo indica ('reiniciada').
+
+from app.conversation_store import ConversationStore, SQLiteConversationBackend
+
+
+def _texts(store, conversation_id):
+    return [m['text'] for m in store.history(conversation_id)]
+
+
+def test_workers_sharing_sqlite_see_each_others_turns(tmp_path):
+    path = str(tmp_path / 'conversations.db')
+    worker_a = ConversationStore(backend=SQLiteConversationBackend(path))
+    worker_b = ConversationStore(backend=SQLiteConversationBackend(path))
+
+    conversation_id, reset = worker_a.open()
+    assert reset is False
+    worker_a.history(conversation_id)  # Deja una copia en la memoria de A
+    worker_b.append(conversation_id, 'user', 'hola')
+    worker_a.append(conversation_id, 'bot', 'qué tal')
+    worker_b.append(conversation_id, 'user', 'precio del jabón')
+
+    assert _texts(worker_a, conversation_id) == ['hola', 'qué tal', 'precio del jabón']
+    assert _texts(worker_b, conversation_id) == ['hola', 'qué tal', 'precio del jabón']
+
+
+def test_stale_save_is_rejected(tmp_path):
+    backend = SQLiteConversationBackend(str(tmp_path / 'conversations.db'))
+    store = ConversationStore(backend=backend)
+    conversation_id, _ = store.open()
+
+    first = backend.load(conversation_id)
+    second = backend.load(conversation_id)
+    first['messages'].append({'sender': 'user', 'text': 'a'})
+    assert backend.save(first) is True
+    second['messages'].append({'sender': 'user', 'text': 'b'})
+    assert backend.save(second) is False
+    assert [m['text'] for m in backend.load(conversation_id)['messages']] == ['a']
+
+
+def test_unknown_id_is_seeded_from_client_history():
+    store = ConversationStore()
+    seed = [{'sender': 'user', 'text': 'hola'}, {'sender': 'bot', 'text': 'qué tal'}]
+
+    conversation_id, reset = store.open('desconocido', seed_history=seed)
+
+    assert reset is True
+    assert conversation_id != 'desconocido'
+    assert _texts(store, conversation_id) == ['hola', 'qué tal']
+    assert store.open(conversation_id) == (conversation_id, False)
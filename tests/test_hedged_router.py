@@ -0,0 +1,96 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_hedged_router.py
+# --- RESPONSABILIDAD ---
+# 1. La latencia del LLM local que alimenta el percentil de cobertura se mide
+#    desde que la rama empieza a ejecutarse, no desde que se encola en el pool.
+# 2. Cada camino del enrutado (local, fallback, cobertura, Gemini, instantáneo,
+#    plazo agotado) en 'HedgedRouter' y en 'AsyncHedgedRouter'.
+
+import asyncio
+import time
+
+import pytest
+
+from app.deadline import Deadline
+from app.hedged_router import COMPLEX, SIMPLE, AsyncHedgedRouter, HedgedRouter
+from app.resilience import LatencyTracker
+
+
+def test_local_latency_excludes_pool_queue_wait():
+    latency = LatencyTracker(window=10)
+    router = HedgedRouter(
+        classify_local=lambda prompt: (SIMPLE, 1.0, 'model'),
+        classify_remote=lambda prompt: COMPLEX,
+        answer_local=lambda prompt: {'success': True, 'response': 'ok'},
+        answer_remote=lambda prompt, history: {'success': True, 'response': 'gemini'},
+        latency_tracker=latency,
+        max_workers=1,
+    )
+    # Ocupa el único hilo del pool: la rama local queda encolada ~0.3 s
+    router._executor.submit(time.sleep, 0.3)
+
+    result, report = router.route('hola', [], remote_ready=False)
+
+    assert result['response'] == 'ok'
+    assert report['path'] == 'local'
+    assert report['timings_ms']['local'] >= 250  # El reporte sí incluye la espera
+    assert latency.percentile(1.0, min_samples=1) < 0.1
+
+
+# --- Caminos del enrutado: la versión con hilos y la de asyncio deciden igual ---
+
+def _router(asynchronous, local_delay=0.0, local_ok=True, remote_delay=0.0, intent=SIMPLE, confidence=1.0,
+            remote_intent=None, instant=None):
+    def answer_local(prompt):
+        time.sleep(local_delay)
+        return {'success': local_ok, 'response': 'local'}
+
+    def answer_remote(prompt, history):
+        time.sleep(remote_delay)
+        return {'success': True, 'response': 'gemini'}
+
+    def classify_remote(prompt):
+        return remote_intent or intent
+
+    functions = [classify_remote, answer_local, answer_remote, lambda prompt: instant]
+    if asynchronous:
+        def as_coroutine(fn):
+            async def call(*args):
+                return await asyncio.to_thread(fn, *args)
+            return call
+        functions = [as_coroutine(fn) for fn in functions]
+    classify_remote, answer_local, answer_remote, answer_instant = functions
+    cls = AsyncHedgedRouter if asynchronous else HedgedRouter
+    return cls(classify_local=lambda prompt: (intent, confidence, 'model'), classify_remote=classify_remote,
+               answer_local=answer_local, answer_remote=answer_remote, latency_tracker=LatencyTracker(window=10),
+               hedge_default=0.1, hedge_min=0.05, answer_instant=answer_instant,
+               answer_degraded=lambda prompt, intent: {'success': True, 'degraded': True, 'response': 'degradada'})
+
+
+def _route(router, deadline=None):
+    if isinstance(router, AsyncHedgedRouter):
+        return asyncio.run(router.route('hola', [], deadline=deadline))
+    return router.route('hola', [], deadline=deadline)
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+@pytest.mark.parametrize('options, path, response', [
+    ({}, 'local', 'local'),
+    ({'local_ok': False}, 'gemini_fallback', 'gemini'),
+    ({'local_delay': 0.4}, 'gemini_hedge', 'gemini'),
+    ({'intent': COMPLEX}, 'gemini', 'gemini'),
+    ({'confidence': 0.1, 'remote_intent': COMPLEX}, 'gemini', 'gemini'),
+    ({'instant': {'success': True, 'response': 'faq'}}, 'instant', 'faq'),
+])
+def test_route_paths(asynchronous, options, path, response):
+    result, report = _route(_router(asynchronous, **options))
+    assert report['path'] == path
+    assert result['response'] == response
+    assert '_started' not in report
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_route_degrades_when_the_deadline_runs_out(asynchronous):
+    router = _router(asynchronous, remote_delay=0.5, intent=COMPLEX)
+    result, report = _route(router, deadline=Deadline(0.2))
+    assert report['path'] == 'deadline'
+    assert result['degraded']
@@ -0,0 +1,73 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_local_llm_client.py
+# --- RESPONSABILIDAD ---
+# 1. 'LocalLLMClient.stream' siempre da un veredicto sobre la sonda de
+#    'half_open': un stream cortado por el cliente tras recibir texto cuenta
+#    como éxito; uno vacío o roto, como fallo. La sonda nunca queda ocupada.
+
+import pytest
+
+from app.local_llm_client import LocalLLMClient
+from app.resilience import CircuitBreaker
+
+
+class FakeStreamResponse:
+    headers = {'Content-Type': 'application/x-ndjson'}
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        for line in self.lines:
+            if isinstance(line, BaseException):
+                raise line
+            yield line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def post(self, url, **kwargs):
+        return FakeStreamResponse(self.lines)
+
+
+def _half_open_client(lines):
+    client = LocalLLMClient('http://llm.test/generate', breaker_threshold=1, breaker_reset=0.0)
+    client.session = FakeSession(lines)
+    client._ensure_prober = lambda: None  # Sin sonda en segundo plano
+    client.breaker.record_failure()
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    return client
+
+
+def test_stream_closed_after_text_counts_as_success():
+    client = _half_open_client(['{"response": "Hola"}', '{"response": " mundo"}'])
+    stream = client.stream('hola')
+    assert next(stream) == 'Hola'
+    stream.close()  # El cliente SSE se desconecta
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_empty_stream_reopens_the_circuit():
+    client = _half_open_client([])
+    client.breaker.reset_timeout = 60
+    assert list(client.stream('hola')) == []
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_broken_stream_reopens_the_circuit():
+    client = _half_open_client(['{"response": "Ho"}', ConnectionError('cortado')])
+    client.breaker.reset_timeout = 60
+    with pytest.raises(ConnectionError):
+        list(client.stream('hola'))
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert not client.breaker.allow_request()
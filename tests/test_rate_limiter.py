@@ -0,0 +1,66 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_rate_limiter.py
+# --- RESPONSABILIDAD ---
+# 1. Token bucket en memoria: ráfaga de 'capacity' peticiones y 429 después,
+#    con las cabeceras RateLimit-* y Retry-After.
+# 2. Identidad del cliente: el admin de la sesión va por email (también en la
+#    ruta ASGI, que lee la cookie de sesión de Flask) y el resto por IP.
+
+import pytest
+from flask import Flask
+
+from app import rate_limiter
+from app.rate_limiter import MemoryRateLimitBackend, RateLimiter, client_key_for, rate_limited
+
+
+def test_memory_bucket_allows_a_burst_then_rejects():
+    limiter = RateLimiter({'chat': (2, 0.5)}, backend=MemoryRateLimitBackend())
+    first, second, third = (limiter.hit('chat', 'ip:1.2.3.4') for _ in range(3))
+
+    assert first.allowed and second.allowed and not third.allowed
+    assert second.headers()['RateLimit-Remaining'] == '0'
+    assert third.headers()['Retry-After'] == '2'
+    assert limiter.hit('chat', 'ip:5.6.7.8').allowed  # Otra cubeta
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_rate_limited_route_returns_429_with_headers(monkeypatch):
+    monkeypatch.setattr(rate_limiter, '_limiter', RateLimiter({'chat': (1, 0.01)}))
+    app = Flask(__name__)
+
+    @app.route('/limitada')
+    @rate_limited('chat')
+    def limitada():
+        return {'success': True}
+
+    client = app.test_client()
+    ok, rejected = client.get('/limitada'), client.get('/limitada')
+
+    assert ok.status_code == 200 and ok.headers['RateLimit-Limit'] == '1'
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert rejected.json['retry_after'] == int(rejected.headers['Retry-After'])
+
+
+def test_client_key_prefers_the_logged_in_admin():
+    admin = {'admin_logged_in': True, 'admin_email': 'a@b.c'}
+    assert client_key_for(admin, '1.2.3.4') == 'admin:a@b.c'
+    assert client_key_for({}, '1.2.3.4') == 'ip:1.2.3.4'
+    assert client_key_for({'admin_email': 'a@b.c'}, None) == 'ip:unknown'
+
+
+def test_asgi_route_reads_the_flask_session_cookie():
+    pytest.importorskip('asgiref')
+    from app.async_chat import ChatASGIApp
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    signed = app.session_interface.get_signing_serializer(app).dumps(
+        {'admin_logged_in': True, 'admin_email': 'a@b.c'})
+    asgi = ChatASGIApp(app)
+
+    def scope(cookie):
+        return {'headers': [(b'cookie', f"{app.config['SESSION_COOKIE_NAME']}={cookie}".encode())]}
+
+    assert client_key_for(asgi._session(scope(signed)), '1.2.3.4') == 'admin:a@b.c'
+    assert asgi._session(scope(signed + 'x')) == {}
+    assert asgi._session({'headers': []}) == {}
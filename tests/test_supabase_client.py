@@ -0,0 +1,71 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_supabase_client.py
+# --- RESPONSABILIDAD ---
+# 1. 'SupabaseClient.request' nunca deja ocupada la sonda de 'half_open': si la
+#    llamada no llega a Supabase (plazo agotado, error local) la libera, y una
+#    respuesta correcta cierra el circuito.
+
+import pytest
+
+from app.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.resilience import CircuitBreaker
+from app.supabase_client import SupabaseClient
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return FakeResponse(self.outcome)
+
+
+def _half_open_client(outcome):
+    # reset 0: el circuito abierto pasa a 'half_open' en la siguiente consulta
+    client = SupabaseClient('http://supabase.test', 'products', 'anon', 'service',
+                            max_retries=0, breaker_threshold=1, breaker_reset=0.0)
+    session = FakeSession(outcome)
+    client._session = lambda key_type: session
+    client.breaker.record_failure()
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    return client, session
+
+
+def test_expired_deadline_releases_the_probe():
+    client, session = _half_open_client(200)
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            client.request('GET', '?select=*')
+    assert session.calls == 0
+    assert client.breaker.allow_request()  # La sonda sigue disponible
+
+
+def test_local_error_releases_the_probe():
+    client, session = _half_open_client(RuntimeError('bug local'))
+    with pytest.raises(RuntimeError):
+        client.request('GET', '?select=*')
+    assert client.breaker.allow_request()
+
+
+def test_successful_probe_closes_the_circuit():
+    client, _ = _half_open_client(200)
+    assert client.request('GET', '?select=*').status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_the_circuit():
+    client, _ = _half_open_client(503)
+    client.breaker.reset_timeout = 60
+    assert client.request('GET', '?select=*').status_code == 503
+    assert client.breaker.state == CircuitBreaker.OPEN
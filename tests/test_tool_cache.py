@@ -0,0 +1,76 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_tool_cache.py
+# --- RESPONSABILIDAD ---
+# 1. 'ToolResultCache': reutiliza resultados, agrupa cálculos simultáneos y
+#    no guarda un resultado calculado mientras se invalidaba.
+# 2. 'get_product_info': los cambios del catálogo invalidan la caché por sus
+#    listeners (sin llamadas manuales desde las rutas).
+
+import json
+import threading
+
+from app import db_logic
+from app.catalog_cache import CatalogCache
+from app.tool_cache import ToolResultCache
+
+
+def test_concurrent_misses_share_one_compute():
+    cache = ToolResultCache(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'valor', ['1']
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ['valor', 'valor']
+    assert len(calls) == 1
+    assert cache.get_or_compute('k', compute) == 'valor'
+    assert len(calls) == 1
+
+
+def test_result_computed_during_invalidation_is_not_stored():
+    cache = ToolResultCache(ttl=60)
+
+    def compute():
+        cache.invalidate()
+        return 'viejo', ['1']
+
+    assert cache.get_or_compute('k', compute) == 'viejo'
+    assert cache.stats()['entries'] == 0
+
+
+def test_invalidate_by_tag_only_drops_tagged_entries():
+    cache = ToolResultCache(ttl=60)
+    cache.get_or_compute('a', lambda: ('A', ['1']))
+    cache.get_or_compute('b', lambda: ('B', ['2']))
+    assert cache.invalidate('1') == 1
+    assert cache.stats()['entries'] == 1
+
+
+def test_catalog_changes_reach_product_info_cache(monkeypatch):
+    rows = [{'id': 1, 'name': 'Jabón de avena', 'price': 10, 'stock': 3, 'category': 'jabones'}]
+    catalog = CatalogCache(lambda: [dict(row) for row in rows], ttl=3600)
+    catalog.subscribe(db_logic.search_index.on_catalog_change)
+    catalog.subscribe(db_logic._invalidate_tool_cache)
+    monkeypatch.setattr(db_logic, 'catalog', catalog)
+    monkeypatch.setattr(db_logic, 'product_info_cache', ToolResultCache(ttl=60))
+
+    assert '3 unidades' in json.loads(db_logic.get_product_info('jabon avena'))['message']
+
+    catalog.upsert([{'id': 1, 'name': 'Jabón de avena', 'price': 10, 'stock': 7, 'category': 'jabones'}])
+    assert '7 unidades' in json.loads(db_logic.get_product_info('jabon avena'))['message']
+
+    catalog.remove([1])
+    assert 'no pude encontrar' in json.loads(db_logic.get_product_info('jabon avena'))['message']
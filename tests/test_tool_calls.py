@@ -0,0 +1,48 @@
+# /home/genichurro/Documentos/v2/IA/tests/test_tool_calls.py
+# --- RESPONSABILIDAD ---
+# 1. 'run_tool_calls' corre cada herramienta con un plazo propio (TOOL_TIMEOUT
+#    recortado al de la petición) que sus llamadas a Supabase respetan.
+# 2. Una herramienta lenta se reporta como 'error' sin frenar al resto.
+
+import json
+import time
+
+from app import ai_logica
+from app.config import Config
+from app.deadline import Deadline, current_deadline, deadline_scope
+
+
+def _tool(message):
+    return json.dumps({'action': 'info', 'message': message})
+
+
+def test_each_tool_runs_under_the_tool_deadline(monkeypatch):
+    seen = []
+
+    def probe():
+        deadline = current_deadline()
+        seen.append(None if deadline is None else deadline.remaining())
+        return _tool('ok')
+
+    monkeypatch.setattr(Config, 'TOOL_TIMEOUT', 0.5)
+    monkeypatch.setitem(ai_logica.tools, 'probe', probe)
+    ai_logica.run_tool_calls([('probe', {})])  # Sin plazo de petición: manda TOOL_TIMEOUT
+    with deadline_scope(Deadline(0.3)):
+        results = ai_logica.run_tool_calls([('probe', {})])
+
+    assert results[0]['response'] == 'ok'
+    assert seen[0] is not None and 0 < seen[0] <= 0.5
+    assert 0 < seen[1] <= 0.3  # El plazo de la petición manda sobre TOOL_TIMEOUT
+
+
+def test_slow_tool_is_reported_without_blocking_the_rest(monkeypatch):
+    monkeypatch.setattr(Config, 'TOOL_TIMEOUT', 0.2)
+    monkeypatch.setitem(ai_logica.tools, 'slow', lambda: (time.sleep(0.6), _tool('tarde'))[1])
+    monkeypatch.setitem(ai_logica.tools, 'fast', lambda: _tool('rápido'))
+
+    started = time.perf_counter()
+    results = ai_logica.run_tool_calls([('slow', {}), ('fast', {})])
+
+    assert time.perf_counter() - started < 0.5
+    assert results[0]['action'] == 'error'
+    assert results[1]['response'] == 'rápido'